@@ -0,0 +1,76 @@
+import sys
+
+from utilities import epoch_to_xwiki_timestamp
+from utilities import xwiki_timestamp_to_epoch
+
+
+class ArticleRecord:
+    """
+    Compact record of one article, used from the space listing through rendering.
+    Timestamps are integer epoch seconds and creator and modifier names are interned, as the same few authors
+    appear in thousands of records. Only the two hrefs needed to fetch the metadata of the article
+    are kept from its listing entry.
+    """
+    __slots__ = ('title', 'page_url', 'version', 'metadata_href', 'history_href', 'created', 'modified', 'creator',
+                 'modifier')
+
+    def __init__(self, title, page_url, version=None, metadata_href=None, history_href=None,
+                 created=0, modified=0, creator='', modifier=''):
+        self.title = title
+        self.page_url = page_url
+        self.version = version
+        self.metadata_href = metadata_href
+        self.history_href = history_href
+        self.created = created
+        self.modified = modified
+        self.creator = sys.intern(creator) if creator else creator
+        self.modifier = sys.intern(modifier) if modifier else modifier
+
+    def set_metadata(self, created, modified, creator, modifier=''):
+        """
+        Sets the creation and modification data of the article.
+
+        Args:
+            created (int): Epoch of the creation of the article.
+            modified (int): Epoch of the latest modification of the article.
+            creator (str): The name of the user who created the article, without the "XWiki." or "xwiki:" prefix.
+            modifier (str): The name of the user who last modified the article, without prefix either.
+        """
+        self.created = created
+        self.modified = modified
+        self.creator = sys.intern(creator) if creator else creator
+        self.modifier = sys.intern(modifier) if modifier else modifier
+        return self
+
+    def metadata(self):
+        """Returns the creation and modification data of the article as stored in the metadata cache"""
+        return {"created": self.created, "modified": self.modified, "creator": self.creator,
+                "modifier": self.modifier}
+
+    def to_json_item(self):
+        """Returns the [title, metadata] pair written to the articles JSON files"""
+        return [self.title, {"page_url": self.page_url,
+                             "version": self.version,
+                             "created": epoch_to_xwiki_timestamp(self.created),
+                             "latest_modified": epoch_to_xwiki_timestamp(self.modified),
+                             "creator_without_prefix": self.creator,
+                             "modifier_without_prefix": self.modifier}]
+
+    @classmethod
+    def from_json_item(cls, item):
+        """Creates a record from a [title, metadata] pair read from an articles JSON file"""
+        title, metadata = item
+        # files written before the version and the modifier were recorded lack them
+        return cls(title, metadata["page_url"], version=metadata.get("version"),
+                   created=xwiki_timestamp_to_epoch(metadata["created"]),
+                   modified=xwiki_timestamp_to_epoch(metadata["latest_modified"]),
+                   creator=metadata["creator_without_prefix"],
+                   modifier=metadata.get("modifier_without_prefix", ''))
+
+    @classmethod
+    def from_json_items(cls, items):
+        """Creates records from a whole list of [title, metadata] pairs read from an articles JSON file"""
+        return [cls.from_json_item(item) for item in items]
+
+    def __repr__(self):
+        return f"ArticleRecord({self.title!r}, {self.page_url!r}, created={self.created}, modified={self.modified})"
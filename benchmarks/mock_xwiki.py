@@ -0,0 +1,355 @@
+"""
+Stand-in XWiki REST server for the benchmarks.
+Serves synthetic spaces with the same pageSummary, page, historySummary and searchResult XML shapes as XWiki,
+with configurable article counts, history depth, latency and error injection, e.g.
+    python benchmarks/mock_xwiki.py --articles 500 --history-depth 5 --latency 0.02 --error-rate 0.01
+GET /modifications serves the latest revision of every article as the wiki modifications feed.
+GET /_stats returns the number of requests served so far as JSON, GET /_stats?reset=1 also resets the counters.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAIN_SPACE = "VB365"
+# the spaces XWikiAPIFetcher.space_urls crawls, with the api_secret.json key of their children pages URL
+SPACES = {
+    "General-Knowledge": "gk_children_pages_url",
+    "How-to": "how_to_children_pages_url",
+    "How-to-configure-VBO365": "configure_children_pages_url",
+}
+
+CHILDREN_PATH = re.compile(rf"/xwiki/rest/wikis/xwiki/spaces/{MAIN_SPACE}/spaces/([^/]+)/pages/WebHome/children$")
+# an article, or a page nested below one, with its history or children
+PAGE_PATH = re.compile(rf"/xwiki/rest/wikis/xwiki/spaces/{MAIN_SPACE}/spaces/([^/]+)((?:/spaces/[^/]+)+)"
+                       rf"/pages/WebHome(/history|/children)?$")
+QUERY_PATH = "/xwiki/rest/wikis/xwiki/query"
+MODIFICATIONS_PATH = "/xwiki/rest/wikis/xwiki/modifications"
+QUERY_SPACE = re.compile(rf"like '{MAIN_SPACE}\.([^.]+)\.%\.WebHome'")
+
+
+class SyntheticWiki:
+    def __init__(self, base_url, articles=200, history_depth=3, restricted_every=50, nested_depth=1, fanout=3,
+                 nested_every=10):
+        """
+        Generates the XML documents of the synthetic spaces on the fly, nothing is held in memory.
+
+        Args:
+            base_url (str): The base URL of the server, e.g. http://127.0.0.1:8765/xwiki.
+            articles (int): The number of articles of every space.
+            history_depth (int): Articles have 1 to history_depth revisions.
+            restricted_every (int): Every restricted_every-th article has a %5B in its name and is skipped
+                                    by the fetcher, 0 disables it.
+            nested_depth (int): Levels of pages of a space, 1 serves the articles of the spaces only.
+            fanout (int): Children of every page with children.
+            nested_every (int): Every nested_every-th page of a level above nested_depth has children.
+
+        Returns:
+            None
+        """
+        self.base_url = base_url
+        self.articles = articles
+        self.history_depth = max(1, history_depth)
+        self.restricted_every = restricted_every
+        self.nested_depth = max(1, nested_depth)
+        self.fanout = fanout
+        self.nested_every = max(1, nested_every)
+
+    def article_name(self, i):
+        if self.restricted_every and i % self.restricted_every == self.restricted_every - 1:
+            return f"Article-{i}%5Bdraft%5D"
+        return f"Article-{i}"
+
+    def article_index(self, name):
+        return int(name.split('-', 1)[1].split('%', 1)[0])
+
+    def revisions(self, i):
+        return 1 + i % self.history_depth
+
+    @staticmethod
+    def modifier(i, revision):
+        """Author of a revision, the first revision is by the creator"""
+        return f"author{i % 5}" if revision == 1 else f"editor{(i + revision) % 7}"
+
+    @staticmethod
+    def epoch(i, revision):
+        """Creation (revision 1) and modification epochs, increasing with i and revision"""
+        return 1577836800 + i * 3600 + (revision - 1) * 86400 * 7
+
+    def timestamp(self, i, revision):
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.epoch(i, revision)))
+
+    def page_href(self, space, path):
+        """The REST URL of a page, given its name or the path of page names below the space"""
+        path = [path] if isinstance(path, str) else path
+        return (f"{self.base_url}/rest/wikis/xwiki/spaces/{MAIN_SPACE}/spaces/{space}"
+                f"{''.join(f'/spaces/{name}' for name in path)}/pages/WebHome")
+
+    def children(self, space, start, number, parent=()):
+        out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?><pages xmlns="http://www.xwiki.org">']
+        for i in self.child_indices(parent)[start:start + number]:
+            name = self.article_name(i)
+            path = list(parent) + [name]
+            revisions = self.revisions(i)
+            href = self.page_href(space, path)
+            full_name = '.'.join([MAIN_SPACE, space] + path)
+            out.append(f'<pageSummary>'
+                       f'<link href="{href.rsplit("/pages/", 1)[0]}" rel="http://www.xwiki.org/rel/space"/>'
+                       f'<link href="{href}" rel="http://www.xwiki.org/rel/page"/>'
+                       f'<link href="{href}/history" rel="http://www.xwiki.org/rel/history"/>'
+                       f'<id>xwiki:{full_name}.WebHome</id>'
+                       f'<fullName>{full_name}.WebHome</fullName>'
+                       f'<wiki>xwiki</wiki><space>{full_name}</space><name>WebHome</name>'
+                       f'<title>{space} article {i}</title><parent></parent>'
+                       f'<parentId></parentId><version>{revisions}.1</version>'
+                       f'<author>XWiki.{self.modifier(i, revisions)}</author>'
+                       f'<xwikiRelativeUrl>{self.base_url}/bin/view/{MAIN_SPACE}/{space}/{"/".join(path)}/'
+                       f'</xwikiRelativeUrl>'
+                       f'<xwikiAbsoluteUrl>{self.base_url}/bin/view/{MAIN_SPACE}/{space}/{"/".join(path)}/'
+                       f'</xwikiAbsoluteUrl>'
+                       f'<translations/><syntax>xwiki/2.1</syntax></pageSummary>')
+        out.append('</pages>')
+        return ''.join(out)
+
+    def child_indices(self, parent):
+        """The indices of the pages below the parent path of page names, the articles of the space for ()"""
+        if not parent:
+            return range(self.articles)
+        level = len(parent)
+        i = self.article_index(parent[-1])
+        if level >= self.nested_depth or i % self.nested_every:
+            return range(0)
+        first = self.articles * level + i * self.fanout
+        return range(first, first + self.fanout)
+
+    def has_page(self, path):
+        return all(self.article_index(name) in self.child_indices(path[:level]) and
+                   name == self.article_name(self.article_index(name)) for level, name in enumerate(path))
+
+    def page(self, space, path):
+        i = self.article_index(path[-1])
+        revisions = self.revisions(i)
+        return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><page xmlns="http://www.xwiki.org">'
+                f'<link href="{self.page_href(space, path)}/history" rel="http://www.xwiki.org/rel/history"/>'
+                f'<id>xwiki:{".".join([MAIN_SPACE, space] + path)}.WebHome</id><title>{space} article {i}</title>'
+                f'<version>{revisions}.1</version>'
+                f'<majorVersion>{revisions}</majorVersion><minorVersion>1</minorVersion>'
+                f'<created>{self.timestamp(i, 1)}</created><creator>XWiki.author{i % 5}</creator>'
+                f'<modified>{self.timestamp(i, revisions)}</modified>'
+                f'<modifier>XWiki.{self.modifier(i, revisions)}</modifier>'
+                f'<content>{"Synthetic article content. " * 20}</content></page>')
+
+    def history(self, space, path):
+        i = self.article_index(path[-1])
+        out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?><history xmlns="http://www.xwiki.org">']
+        # newest revision first
+        for revision in range(self.revisions(i), 0, -1):
+            out.append(f'<historySummary><link href="{self.page_href(space, path)}/history/{revision}.1" '
+                       f'rel="http://www.xwiki.org/rel/page"/><version>{revision}.1</version>'
+                       f'<majorVersion>{revision}</majorVersion><minorVersion>1</minorVersion>'
+                       f'<modified>{self.timestamp(i, revision)}</modified>'
+                       f'<modifier>XWiki.{self.modifier(i, revision)}</modifier></historySummary>')
+        out.append('</history>')
+        return ''.join(out)
+
+    def modifications(self, since, start, number):
+        """The latest revision of every article modified after the since epoch, newest first, as the wiki feed"""
+        epochs = [self.epoch(i, self.revisions(i)) for i in range(self.articles)]
+        entries = sorted(((epochs[i], space, i) for space in SPACES for i in range(self.articles)
+                          if epochs[i] > since), reverse=True)
+        out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?><history xmlns="http://www.xwiki.org">']
+        for _, space, i in entries[start:start + number]:
+            name = self.article_name(i)
+            revisions = self.revisions(i)
+            out.append(f'<historySummary>'
+                       f'<link href="{self.page_href(space, name)}/history/{revisions}.1" '
+                       f'rel="http://www.xwiki.org/rel/page"/>'
+                       f'<pageId>xwiki:{MAIN_SPACE}.{space}.{name}.WebHome</pageId><wiki>xwiki</wiki>'
+                       f'<space>{MAIN_SPACE}.{space}.{name}</space><name>WebHome</name>'
+                       f'<version>{revisions}.1</version><majorVersion>{revisions}</majorVersion>'
+                       f'<minorVersion>1</minorVersion><modified>{self.timestamp(i, revisions)}</modified>'
+                       f'<modifier>XWiki.{self.modifier(i, revisions)}</modifier></historySummary>')
+        out.append('</history>')
+        return ''.join(out)
+
+    def query(self, space, start, number):
+        out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<searchResults xmlns="http://www.xwiki.org">']
+        for i in range(start, min(self.articles, start + number)):
+            name = self.article_name(i)
+            revisions = self.revisions(i)
+            out.append(f'<searchResult>'
+                       f'<link href="{self.page_href(space, name)}" rel="http://www.xwiki.org/rel/page"/>'
+                       f'<type>page</type><id>xwiki:{MAIN_SPACE}.{space}.{name}.WebHome</id>'
+                       f'<pageFullName>{MAIN_SPACE}.{space}.{name}.WebHome</pageFullName>'
+                       f'<title>{space} article {i}</title><wiki>xwiki</wiki>'
+                       f'<space>{MAIN_SPACE}.{space}.{name}</space><pageName>WebHome</pageName>'
+                       f'<modified>{self.timestamp(i, revisions)}</modified>'
+                       f'<author>XWiki.{self.modifier(i, revisions)}</author>'
+                       f'<version>{revisions}.1</version></searchResult>')
+        out.append('</searchResults>')
+        return ''.join(out)
+
+
+class MockXWikiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, status=200, content_type="application/xml"):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        return len(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+    def _count(self, status, sent):
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes"] += sent
+            self.server.stats["statuses"][str(status)] = self.server.stats["statuses"].get(str(status), 0) + 1
+
+    def do_PUT(self):
+        self._read_body()
+        time.sleep(self.server.latency)
+        self._count(202, self._send("", 202))
+
+    def do_GET(self):
+        self._read_body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/_stats":
+            with self.server.stats_lock:
+                stats = json.dumps(self.server.stats)
+                if "reset" in query:
+                    self.server.reset_stats()
+            self._send(stats, content_type="application/json")
+            return
+
+        time.sleep(self.server.latency)
+        if self.server.error_rate and self.server.random.random() < self.server.error_rate:
+            self._count(503, self._send("Service Unavailable", 503, "text/plain"))
+            return
+
+        wiki = self.server.wiki
+        start = int(query.get("start", ["0"])[0])
+        number = int(query.get("number", ["-1"])[0])
+        if number < 0:
+            number = wiki.articles
+        status = 200
+        if url.path == QUERY_PATH and QUERY_SPACE.search(query.get("q", [""])[0]):
+            body = wiki.query(QUERY_SPACE.search(query["q"][0]).group(1), start, number)
+        elif url.path == MODIFICATIONS_PATH:
+            body = wiki.modifications(int(query.get("date", ["0"])[0]) / 1000, start, number)
+        elif CHILDREN_PATH.search(url.path):
+            body = wiki.children(CHILDREN_PATH.search(url.path).group(1), start, number)
+        elif PAGE_PATH.search(url.path):
+            space, path, suffix = PAGE_PATH.search(url.path).groups()
+            path = path.split('/spaces/')[1:]
+            if not wiki.has_page(path):
+                body, status = "Not Found", 404
+            elif suffix == "/children":
+                body = wiki.children(space, start, number, path)
+            else:
+                body = wiki.history(space, path) if suffix else wiki.page(space, path)
+        else:
+            body, status = "Not Found", 404
+        self._count(status, self._send(body, status))
+
+
+class MockXWikiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=8765, articles=200, history_depth=3, latency=0.0, error_rate=0.0, seed=0,
+                 restricted_every=50, nested_depth=1):
+        """
+        Threaded HTTP server serving a SyntheticWiki.
+
+        Args:
+            port (int): The port to listen on, 0 picks a free one.
+            articles (int): The number of articles of every space.
+            history_depth (int): Articles have 1 to history_depth revisions.
+            latency (float): Seconds every request is delayed by.
+            error_rate (float): Share of the requests answered with 503 Service Unavailable.
+            seed (int): Seed of the error injection.
+            restricted_every (int): See SyntheticWiki.
+            nested_depth (int): See SyntheticWiki.
+
+        Returns:
+            None
+        """
+        super().__init__(("127.0.0.1", port), MockXWikiHandler)
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}/xwiki"
+        self.wiki = SyntheticWiki(self.base_url, articles, history_depth, restricted_every, nested_depth)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"requests": 0, "bytes": 0, "statuses": {}}
+
+
+def api_secret(base_url, settings=None):
+    """Returns the configs/api_secret.json content pointing XWikiAPIFetcher at the mock server"""
+    rest_root = f"{base_url}/rest/wikis/xwiki/spaces/{MAIN_SPACE}"
+    rest = {key: f"{rest_root}/spaces/{space}/pages/WebHome/children" for space, key in SPACES.items()}
+    rest.update({
+        "vb365_main_space_url": f"{rest_root}/pages/WebHome",
+        "gk_space_url": f"{rest_root}/spaces/General-Knowledge/pages/WebHome",
+        "bugs_url": f"{rest_root}/spaces/Bugs/pages/WebHome",
+        "test_page_in_gk_history_space_url": f"{rest_root}/spaces/General-Knowledge/spaces/Article-0/pages/WebHome"
+                                             f"/history",
+        "inventory_resulting_article": f"{rest_root}/pages/Inventory",
+    })
+    view_root = f"{base_url}/bin/view/{MAIN_SPACE}"
+    return {
+        "base_url": base_url,
+        "bin": {"main_url": f"{view_root}/", "internal_technical_docs_url": f"{view_root}/Internal/",
+                "vbm_url": f"{view_root}/VBM/", "bad_article_url": f"{view_root}/General-Knowledge/Missing/"},
+        "rest": rest,
+        "settings": settings or {},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic XWiki spaces over the XWiki REST API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--articles", type=int, default=200, help="articles per space")
+    parser.add_argument("--history-depth", type=int, default=3, help="max revisions per article")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--nested-depth", type=int, default=1,
+                        help="levels of pages of a space, every 10th page of a level has 3 children")
+    args = parser.parse_args(argv)
+
+    server = MockXWikiServer(args.port, args.articles, args.history_depth, args.latency, args.error_rate, args.seed,
+                             nested_depth=args.nested_depth)
+    # the benchmark harness waits for this line
+    print(f"Serving {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
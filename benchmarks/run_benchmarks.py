@@ -0,0 +1,222 @@
+"""
+Throughput benchmarks of the fetcher against the local stand-in XWiki server of mock_xwiki.py, e.g.
+    python benchmarks/run_benchmarks.py --articles 500 --latency 0.02
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/20230510T080312Z_1a2b3c4.json
+Every benchmark runs in a fresh working directory (cold caches unless its setup warms them up), measures wall time,
+requests served per second and, unless --no-memory is given, peak Python memory in a second traced run.
+The results are written as JSON to benchmarks/results, named after the time and the commit, so regressions can be
+compared across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import main as inventorizer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+
+
+def bench_fetch_space(fetcher):
+    """fetch_and_process_xwiki_data of a single space, cold metadata cache"""
+    return len(fetcher.fetch_and_process_xwiki_data(fetcher.how_to_children_pages_url))
+
+
+def bench_fetch_space_incremental(fetcher):
+    """fetch_and_process_xwiki_data of a single space in incremental mode, metadata cache warmed up beforehand"""
+    return len(fetcher.fetch_and_process_xwiki_data(fetcher.how_to_children_pages_url, incremental=True))
+
+
+def bench_fetch_space_query(fetcher):
+    """fetch_and_process_xwiki_data of a single space with the query backend, cold metadata cache"""
+    return len(fetcher.fetch_and_process_xwiki_data(fetcher.how_to_children_pages_url, backend="query"))
+
+
+def bench_create_html_for_all_spaces(fetcher):
+    """create_html_for_all_spaces, crawling every space and rendering the inventory page"""
+    fetcher.create_html_for_all_spaces()
+    return sum(len(articles) for articles in fetcher.last_inventory.values())
+
+
+def bench_workers(fetcher, spaces_articles):
+    """process_space with every sink for all spaces, from articles fetched beforehand, no network"""
+    for space_url, articles in zip(fetcher.space_urls(), spaces_articles):
+        inventorizer.process_space(space_url, fetcher._space_name_from_url(space_url), fetcher, articles)
+    return sum(len(articles) for articles in spaces_articles)
+
+
+def warm_up_metadata_cache(fetcher):
+    fetcher.fetch_and_process_xwiki_data(fetcher.how_to_children_pages_url)
+    return ()
+
+
+def fetch_all_spaces(fetcher):
+    return (fetcher.fetch_all_spaces(fetcher.space_urls()),)
+
+
+# name: (benchmark, untimed setup returning the extra arguments of the benchmark)
+BENCHMARKS = {
+    "fetch_space": (bench_fetch_space, None),
+    "fetch_space_incremental": (bench_fetch_space_incremental, warm_up_metadata_cache),
+    "fetch_space_query": (bench_fetch_space_query, None),
+    "create_html_for_all_spaces": (bench_create_html_for_all_spaces, None),
+    "workers": (bench_workers, fetch_all_spaces),
+}
+
+
+class MockServer:
+    def __init__(self, args):
+        """Runs mock_xwiki.py in a subprocess, so that the server does not compete with the fetcher for the GIL"""
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BENCHMARKS_DIR, 'mock_xwiki.py'), '--port', str(args.port),
+             '--articles', str(args.articles), '--history-depth', str(args.history_depth),
+             '--latency', str(args.latency), '--error-rate', str(args.error_rate), '--seed', str(args.seed)],
+            stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line.startswith("Serving "):
+            self.process.kill()
+            raise RuntimeError(f"Mock XWiki server failed to start: {line}")
+        self.base_url = line.split()[1]
+
+    def stats(self, reset=False):
+        url = f"{self.base_url.rsplit('/xwiki', 1)[0]}/_stats" + ("?reset=1" if reset else "")
+        with urllib.request.urlopen(url) as response:
+            return json.load(response)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+@contextlib.contextmanager
+def working_directory(base_url, settings):
+    """A fresh working directory with the configs of the mock server, removed afterwards"""
+    previous = os.getcwd()
+    directory = tempfile.mkdtemp(prefix='xwiki-bench-')
+    try:
+        os.makedirs(os.path.join(directory, 'configs'))
+        os.makedirs(os.path.join(directory, 'outputs'))
+        with open(os.path.join(directory, 'configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(base_url, settings), f)
+        with open(os.path.join(directory, 'configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"username": "bench", "password": "bench", "bearer_token": "Bearer bench"}, f)
+        os.chdir(directory)
+        yield directory
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_benchmark(name, server, settings, trace_memory=False):
+    """Runs one benchmark in a fresh working directory and returns its measurements"""
+    benchmark, setup = BENCHMARKS[name]
+    with working_directory(server.base_url, settings):
+        # the fetcher prints a line per article
+        with contextlib.redirect_stdout(io.StringIO()):
+            fetcher = inventorizer.XWikiAPIFetcher()
+            try:
+                arguments = (fetcher,) + (setup(fetcher) if setup else ())
+                server.stats(reset=True)
+                if trace_memory:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                articles = benchmark(*arguments)
+                wall_time = time.perf_counter() - started
+                peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+                if trace_memory:
+                    tracemalloc.stop()
+                stats = server.stats()
+            finally:
+                fetcher.close()
+    result = {"wall_time_s": round(wall_time, 4), "articles": articles, "requests": stats["requests"],
+              "requests_per_s": round(stats["requests"] / wall_time, 1) if wall_time else None,
+              "bytes": stats["bytes"], "statuses": stats["statuses"]}
+    if peak_memory is not None:
+        result["peak_memory_mb"] = round(peak_memory / 2 ** 20, 2)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_file):
+    """Prints the wall time and peak memory of every benchmark relative to a previous results file"""
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    print(f"\nCompared to {baseline.get('commit')} ({baseline_file}):")
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        line = f"  {name}: wall time x{result['wall_time_s'] / before['wall_time_s']:.2f}"
+        if result.get("peak_memory_mb") and before.get("peak_memory_mb"):
+            line += f", peak memory x{result['peak_memory_mb'] / before['peak_memory_mb']:.2f}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the XWiki fetcher against a local mock server")
+    parser.add_argument("--port", type=int, default=0, help="port of the mock server, defaults to a free one")
+    parser.add_argument("--articles", type=int, default=200, help="articles per space")
+    parser.add_argument("--history-depth", type=int, default=3, help="max revisions per article")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history-mode", choices=["lean", "deep"], default="lean")
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced runs measuring peak memory")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIR, 'results'),
+                        help="directory the results JSON is written to")
+    parser.add_argument("--compare", help="results JSON of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    settings = {"history_mode": args.history_mode, "max_retries": 5, "breaker_cooldown": 1}
+    server = MockServer(args)
+    results = {}
+    try:
+        for name in args.benchmarks:
+            results[name] = run_benchmark(name, server, settings)
+            if not args.no_memory:
+                results[name]["peak_memory_mb"] = run_benchmark(name, server, settings,
+                                                                trace_memory=True)["peak_memory_mb"]
+            result = results[name]
+            print(f"{name}: {result['wall_time_s']:.3f}s, {result['articles']} articles, "
+                  f"{result['requests']} requests, {result['requests_per_s']} requests/s"
+                  + (f", peak {result['peak_memory_mb']} MB" if "peak_memory_mb" in result else ""))
+    finally:
+        server.stop()
+
+    commit = git_commit()
+    report = {"commit": commit, "taken_at": int(time.time()), "python": platform.python_version(),
+              "platform": platform.platform(), "parameters": vars(args), "results": results}
+    os.makedirs(args.output, exist_ok=True)
+    results_file = os.path.join(args.output,
+                                f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(report['taken_at']))}_{commit}.json")
+    with open(results_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {results_file}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,53 @@
-import json
 import os
 from datetime import datetime, timezone
 
+import markdown_worker
+import renderer
+
+
+class HtmlSink:
+    def __init__(self, space_name):
+        """
+        Streams the HTML table of a space to articles_in_<space>_as_of_<date>.html, one article at a time.
+        Used by main.process_space to render all outputs of a space in a single pass over its articles.
+
+        Args:
+            space_name (str): The name of the XWiki space.
+
+        Returns:
+            None
+        """
+        self.str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
+        self.space_name = space_name
+        self.filename = f"articles_in_{space_name}_as_of_{self.str_now}.html"
+        self._file = None
+
+    def begin(self):
+        """Opens the HTML file and writes the table header, returns False if the file already exists"""
+        if os.path.exists(self.filename):
+            print("HTML file already exists: " + self.filename)
+            return False
+        self._file = open(self.filename, 'w')
+        self._file.write("<body>\n")
+        renderer.write_html_table_head(self._file, f"{self.space_name} articles space as of {self.str_now}",
+                                       user_column="Modifier")
+        return True
+
+    def write(self, article):
+        """Writes the row of one ArticleRecord"""
+        if self._file is not None:
+            renderer.write_html_row(self._file, article, user_field="modifier")
+
+    def end(self):
+        """Closes the table and the file and returns the name of the HTML file"""
+        if self._file is not None:
+            renderer.write_html_table_end(self._file)
+            self._file.write("</body>\n")
+            self._file.close()
+            self._file = None
+            print(f"Created HTML file: {self.filename}\n")
+        return self.filename
+
 
 def create_html_for_single_space(space_name, articles_json_file):
     """
@@ -17,52 +63,8 @@ def create_html_for_single_space(space_name, articles_json_file):
     Raises:
         FileNotFoundError: If the articles_json_file does not exist.
     """
-    str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
-    resulting_html = f"""<body>
-        <h1>{space_name} articles space as of {str_now}</h1>
-        <table>
-            <tr>
-                <th><b>Article</b></th>
-                <th><b>Created</b></th>
-                <th><b>Modified</b></th>
-                <th><b>Modifier</b></th>
-            </tr>
-    """
-
-    with open(articles_json_file, 'r') as f:
-        articles_data = json.load(f)
-
-    for article in articles_data:
-        article_name = article[0]
-        article_metadata = article[1]
-        page_url = article_metadata['page_url']
-        created = article_metadata['created']
-        latest_modified = article_metadata['latest_modified']
-        modifier = article_metadata['modifier_without_prefix']
-
-        created_date = datetime.strptime(created, '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')
-        latest_modified_date = datetime.strptime(latest_modified, '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')
-
-        resulting_html += f"""<tr>
-            <td><a href="{page_url}">{article_name}</a></td>
-            <td>{created_date}</td>
-            <td>{latest_modified_date}</td>
-            <td>{modifier}</td>
-        </tr>
-        """
-
-    resulting_html += """
-        </table>
-    </body>
-    """
-
-    html_filename = f"articles_in_{space_name}_as_of_{str_now}.html"
-
-    if not os.path.exists(html_filename):
-        with open(html_filename, 'w') as f:
-            f.write(resulting_html)
-        print(f"Created HTML file: {html_filename}\n")
-    else:
-        print("HTML file already exists: " + html_filename)
-
-    return html_filename
+    sink = HtmlSink(space_name)
+    if sink.begin():
+        for article in markdown_worker.load_articles_json_file(articles_json_file):
+            sink.write(article)
+    return sink.end()
@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    request_key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    elapsed REAL NOT NULL,
+    recorded_at INTEGER NOT NULL
+);
+"""
+
+# headers describing the transfer of the recorded body rather than the body itself, and the session cookies,
+# which are not stored in the capture
+TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive',
+                    'set-cookie'}
+
+
+class CaptureMiss(requests.RequestException):
+    """A request replayed from a capture that does not hold it, never worth a retry"""
+
+
+class _ReplayedBody(io.BytesIO):
+    # callers streaming a response set raw.decode_content, see XWikiAPIFetcher._iter_page_summaries
+    decode_content = True
+
+
+class HttpCapture:
+    def __init__(self, capture_file, mode, simulate_timing=False):
+        """
+        Records the responses of a real run, or serves a run entirely from such a recording.
+        Bodies are stored zlib-compressed in an SQLite file keyed by method and full URL, query string included,
+        so a replay needs the same settings affecting the requested URLs (e.g. listing_page_size) as the recording.
+
+        Args:
+            capture_file (str): Path to the SQLite capture, created if missing.
+            mode (str): "record" stores every response received, "replay" serves responses from the capture
+                        and never touches the network.
+            simulate_timing (bool): In replay mode, delay every response by the time it originally took.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If mode is neither "record" nor "replay".
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown capture mode {mode}, expected record or replay")
+        if mode == "replay" and not os.path.exists(capture_file):
+            print(f"Capture {capture_file} does not exist, every request will fail")
+        os.makedirs(os.path.dirname(capture_file) or '.', exist_ok=True)
+        self.capture_file = capture_file
+        self.mode = mode
+        self.simulate_timing = simulate_timing
+        self._connection = sqlite3.connect(capture_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def request_key(method, url, params=None):
+        """Returns the key of a request: its method and its URL with the encoded params"""
+        return f"{method} {requests.Request(method, url, params=params).prepare().url}"
+
+    def record(self, method, url, params, response, started):
+        """
+        Stores a response. Its body is read in full first and the response is made streamable again,
+        so callers reading response.raw see the same bytes.
+
+        Args:
+            method (str): The HTTP method of the request.
+            url (str): The URL of the request, without params.
+            params (dict): The query params of the request.
+            response (Response): The response received.
+            started (float): time.monotonic() when the request was sent.
+
+        Returns:
+            Response: The same response.
+        """
+        body = response.content
+        response.raw = _ReplayedBody(body)
+        elapsed = time.monotonic() - started
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in TRANSFER_HEADERS}
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                                     (self.request_key(method, url, params), response.status_code,
+                                      json.dumps(headers), zlib.compress(body), elapsed, int(time.time())))
+        return response
+
+    def replay(self, method, url, params=None):
+        """
+        Returns the recorded response of a request as a requests.Response.
+
+        Raises:
+            CaptureMiss: If the request was not recorded.
+        """
+        key = self.request_key(method, url, params)
+        with self._lock:
+            row = self._connection.execute("SELECT status, headers, body, elapsed FROM responses "
+                                           "WHERE request_key = ?", (key,)).fetchone()
+        if row is None:
+            raise CaptureMiss(f"{key} is not in the capture {self.capture_file}")
+        status, headers, body, elapsed = row
+        if self.simulate_timing:
+            time.sleep(elapsed)
+        body = zlib.decompress(body)
+        response = requests.Response()
+        response.status_code = status
+        response.url = key.split(' ', 1)[1]
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = _ReplayedBody(body)
+        response._content = body
+        return response
+
+    def close(self):
+        self._connection.close()
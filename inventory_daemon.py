@@ -0,0 +1,278 @@
+import argparse
+import io
+import json
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import renderer
+from main import XWikiAPIFetcher
+from utilities import transform_datetime
+
+
+def _article_item(space, article):
+    """Returns an article as served in inventory.json, the same fields inventory_store.py returns"""
+    return {"space": space, "page_url": article.page_url, "title": article.title, "version": article.version,
+            "created": article.created, "modified": article.modified, "creator": article.creator,
+            "modifier": article.modifier}
+
+
+class InventoryDaemon:
+    def __init__(self, fetcher, interval=3600, space_intervals=None, jitter=0.1, publish=True, feed=False):
+        """
+        Keeps one XWikiAPIFetcher, its connection pool, metadata cache and the current inventory warm in a long
+        running process. Every space is refreshed on its own schedule, interval seconds apart give or take jitter,
+        and the inventory is served from memory by a local HTTP endpoint, see serve(). Requests are answered
+        from payloads rendered once per refresh and never trigger a crawl, POST /refresh only moves refreshes
+        forward. Until the first refresh the latest snapshot of the inventory store is served.
+
+        Args:
+            fetcher (XWikiAPIFetcher): The fetcher to keep, closed by stop().
+            interval (float): Seconds between two refreshes of a space.
+            space_intervals (dict): Per-space interval overrides, keyed by space name (e.g. "How-to").
+            jitter (float): Every interval is stretched or shrunk at random by up to this fraction, so that
+                            the spaces, and the daemons of several wikis, spread their refreshes.
+            publish (bool): Publish the inventory page after every refresh, see XWikiAPIFetcher.publish.
+            feed (bool): Refresh all spaces at once from the wiki modifications feed, reconciling them when due,
+                         see XWikiAPIFetcher.update_from_feed. Every refresh then follows interval and
+                         space_intervals are ignored.
+
+        Returns:
+            None
+        """
+        self.fetcher = fetcher
+        self.interval = interval
+        self.space_intervals = space_intervals or {}
+        self.jitter = jitter
+        self.publish = publish
+        self.feed = feed
+        self.space_urls = {fetcher._space_name_from_url(space_url): space_url for space_url in fetcher.space_urls()}
+        # every space is due right away
+        self._next_due = dict.fromkeys(self.space_urls, 0.0)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._scheduler = None
+        self._server = None
+        self.status = {"started_at": int(time.time()), "refreshes": 0, "failures": 0, "last_refresh": None}
+        self.inventory = {}
+        # (content type, body) of every served document keyed by (path, space), swapped as a whole on refresh
+        self._payloads = {}
+        stored = {space: fetcher.articles_from_store(space) for space in self.space_urls}
+        self._set_inventory({space: articles for space, articles in stored.items() if articles is not None}, None)
+
+    def _set_inventory(self, articles_by_space, refreshed_at):
+        as_of = transform_datetime(datetime.now(timezone.utc).strftime("%Y_%m_%d"))
+        payloads = {}
+        for space in [None] + list(articles_by_space):
+            spaces = articles_by_space if space is None else {space: articles_by_space[space]}
+            document = {"refreshed_at": refreshed_at,
+                        "spaces": {name: [_article_item(name, article) for article in articles]
+                                   for name, articles in spaces.items()}}
+            payloads[("/inventory.json", space)] = ("application/json", json.dumps(document).encode())
+            out = io.StringIO()
+            out.write(renderer.HTML_STYLE)
+            out.write("<body>\n")
+            for name, articles in spaces.items():
+                renderer.write_html_table(out, f"Articles in {name.replace('-', ' ')} space as of {as_of}", articles,
+                                          format_date=renderer.long_datetime)
+            out.write("</body>")
+            payloads[("/inventory.html", space)] = ("text/html; charset=utf-8", out.getvalue().encode())
+        self.inventory = articles_by_space
+        self._payloads = payloads
+
+    def payload(self, path, space=None):
+        """Returns the (content type, body) of a served document, None if there is no such document"""
+        if path == "/":
+            path = "/inventory.html"
+        if path == "/status":
+            return "application/json", json.dumps(self.report()).encode()
+        return self._payloads.get((path, space))
+
+    def report(self):
+        """Returns the status of the daemon: refresh counts, last refresh, next refresh and articles per space"""
+        with self._lock:
+            return {**self.status,
+                    "spaces": {space: {"articles": len(self.inventory.get(space) or ()),
+                                       "next_refresh": int(self._next_due[space])} for space in self.space_urls}}
+
+    def request_refresh(self, spaces=None):
+        """
+        Makes the given spaces, all of them by default, due right away.
+
+        Raises:
+            ValueError: If a space is not one of the configured spaces.
+        """
+        spaces = list(self.space_urls) if not spaces else spaces
+        unknown = [space for space in spaces if space not in self.space_urls]
+        if unknown:
+            raise ValueError(f"Unknown space {', '.join(unknown)}, expected one of {', '.join(self.space_urls)}")
+        with self._lock:
+            for space in spaces:
+                self._next_due[space] = 0.0
+        self._wake.set()
+        return spaces
+
+    def _schedule(self, space):
+        interval = self.interval if self.feed else self.space_intervals.get(space, self.interval)
+        return time.time() + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def refresh(self, spaces):
+        """
+        Refreshes the given spaces with the warm fetcher, keeping the other spaces as they are in memory,
+        publishes the result and swaps the served inventory. Every refresh is one run of the fetcher metrics,
+        written after it. A failed refresh is reported and the previous inventory is kept.
+        """
+        started = time.time()
+        if self.feed:
+            spaces = list(self.space_urls)
+        print(f"Refreshing {', '.join(spaces)}")
+        self.fetcher.metrics.reset()
+        error = None
+        try:
+            if self.feed:
+                articles_by_space = self.fetcher.update_from_feed(known=self.inventory)
+            else:
+                articles_by_space = self.fetcher.refresh([self.space_urls[space] for space in spaces],
+                                                         known=self.inventory)
+            if self.publish:
+                self.fetcher.publish(articles_by_space)
+            self._set_inventory(articles_by_space, int(time.time()))
+        except Exception as exception:
+            # the daemon outlives a failed refresh, the spaces are retried on their next schedule
+            traceback.print_exc()
+            error = f"{type(exception).__name__}: {exception}"
+        with self._lock:
+            for space in spaces:
+                self._next_due[space] = self._schedule(space)
+            self.status["refreshes" if error is None else "failures"] += 1
+            self.status["last_refresh"] = {"spaces": spaces, "started_at": int(started),
+                                           "duration_s": round(time.time() - started, 3), "error": error}
+        self.fetcher.write_metrics()
+
+    def _run_scheduler(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                now = time.time()
+                due = [space for space, next_due in self._next_due.items() if next_due <= now]
+                wait = min(self._next_due.values()) - now
+            if due:
+                self.refresh(due)
+            else:
+                self._wake.wait(wait)
+                self._wake.clear()
+
+    def serve(self, host='127.0.0.1', port=8642):
+        """
+        Starts the scheduler and the HTTP endpoint in background threads:
+            GET /inventory.json[?space=NAME]  the articles of every space, or of one, as JSON
+            GET /inventory.html[?space=NAME]  the same as HTML tables, also served at /
+            GET /status                       refresh counts, last and next refreshes and articles per space
+            POST /refresh[?space=NAME]        refresh all spaces, or the given ones, right away
+
+        Returns:
+            str: The base URL of the endpoint.
+        """
+        self._server = ThreadingHTTPServer((host, port), _InventoryRequestHandler)
+        self._server.daemon_threads = True
+        self._server.inventory_daemon = self
+        threading.Thread(target=self._server.serve_forever, name="inventory-http", daemon=True).start()
+        self._scheduler = threading.Thread(target=self._run_scheduler, name="inventory-scheduler", daemon=True)
+        self._scheduler.start()
+        return f"http://{self._server.server_address[0]}:{self._server.server_address[1]}"
+
+    def stop(self):
+        """Stops the endpoint, waits for the refresh in progress if any, and closes the fetcher"""
+        self._stopping.set()
+        self._wake.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._scheduler is not None:
+            self._scheduler.join()
+        self.fetcher.close()
+
+
+class _InventoryRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, document):
+        self._send(status, "application/json", json.dumps(document).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        space = parse_qs(url.query).get("space", [None])[0]
+        payload = self.server.inventory_daemon.payload(url.path, space)
+        if payload is None:
+            self._send_json(404, {"error": f"No document {url.path}" + (f" for space {space}" if space else "")})
+        else:
+            self._send(200, *payload)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/refresh":
+            self._send_json(404, {"error": f"No action {url.path}"})
+            return
+        try:
+            spaces = self.server.inventory_daemon.request_refresh(parse_qs(url.query).get("space"))
+        except ValueError as error:
+            self._send_json(404, {"error": str(error)})
+            return
+        self._send_json(202, {"refreshing": spaces})
+
+
+def main(argv=None):
+    """
+    Runs the inventory daemon until interrupted, e.g.
+        python inventory_daemon.py --port 8642 --interval 3600
+        curl localhost:8642/inventory.json?space=How-to
+        curl -X POST localhost:8642/refresh?space=How-to
+    The defaults come from the daemon_* settings of configs/api_secret.json.
+    """
+    fetcher = XWikiAPIFetcher()
+    settings = fetcher.settings
+    parser = argparse.ArgumentParser(description="Keep the XWiki inventory warm and serve it over HTTP")
+    parser.add_argument("--host", default=settings.get("daemon_host", '127.0.0.1'))
+    parser.add_argument("--port", type=int, default=settings.get("daemon_port", 8642))
+    parser.add_argument("--interval", type=float, default=settings.get("daemon_interval", 3600),
+                        help="seconds between two refreshes of a space")
+    parser.add_argument("--jitter", type=float, default=settings.get("daemon_jitter", 0.1),
+                        help="random share of the interval added or removed")
+    parser.add_argument("--no-publish", dest="publish", action="store_false",
+                        default=settings.get("daemon_publish", True),
+                        help="do not publish the inventory page after a refresh")
+    parser.add_argument("--feed", action="store_true", default=settings.get("daemon_feed", False),
+                        help="refresh from the wiki modifications feed instead of crawling the spaces")
+    args = parser.parse_args(argv)
+
+    daemon = InventoryDaemon(fetcher, interval=args.interval, space_intervals=settings.get("daemon_space_intervals"),
+                             jitter=args.jitter, publish=args.publish, feed=args.feed)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    print(f"Serving the inventory on {daemon.serve(args.host, args.port)}", flush=True)
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("Stopping, waiting for the refresh in progress")
+    daemon.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from renderer import iso_date
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    taken_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS articles (
+    space TEXT NOT NULL,
+    page_url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    version TEXT,
+    created INTEGER NOT NULL,
+    modified INTEGER NOT NULL,
+    creator TEXT,
+    modifier TEXT,
+    first_snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    last_snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    PRIMARY KEY (space, page_url)
+);
+CREATE TABLE IF NOT EXISTS snapshot_articles (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    space TEXT NOT NULL,
+    page_url TEXT NOT NULL,
+    PRIMARY KEY (snapshot, space, page_url)
+);
+DROP INDEX IF EXISTS articles_space;
+CREATE INDEX IF NOT EXISTS articles_space_last_snapshot ON articles (space, last_snapshot);
+CREATE INDEX IF NOT EXISTS articles_creator ON articles (creator);
+CREATE INDEX IF NOT EXISTS articles_modifier ON articles (modifier);
+CREATE INDEX IF NOT EXISTS articles_created ON articles (created);
+CREATE INDEX IF NOT EXISTS articles_modified ON articles (modified);
+"""
+
+UPSERT_ARTICLE = """
+INSERT INTO articles (space, page_url, title, version, created, modified, creator, modifier,
+                      first_snapshot, last_snapshot)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (space, page_url) DO UPDATE SET
+    title = excluded.title,
+    version = excluded.version,
+    created = excluded.created,
+    modified = excluded.modified,
+    creator = excluded.creator,
+    modifier = excluded.modifier,
+    last_snapshot = excluded.last_snapshot
+"""
+
+
+class InventoryStore:
+    def __init__(self, db_file):
+        """
+        Embedded SQLite store of the inventory.
+        Every run is recorded as a snapshot, the articles of its spaces are bulk-upserted and indexed on space
+        (with their last snapshot), creator, modifier, created and modified, so reports are answered from local data
+        without a crawl.
+
+        Args:
+            db_file (str): Path to the SQLite database, created if missing.
+
+        Returns:
+            None
+        """
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self.db_file = db_file
+        # the daemon records snapshots from its scheduler thread and answers queries from the HTTP threads
+        self._connection = sqlite3.connect(db_file, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def record_snapshot(self, articles_by_space, taken_at=None):
+        """
+        Records a new snapshot and bulk-upserts the articles of every space in a single transaction.
+
+        Args:
+            articles_by_space (dict): Lists of ArticleRecord keyed by space name.
+            taken_at (int): Epoch of the snapshot, defaults to now.
+
+        Returns:
+            int: The id of the new snapshot.
+        """
+        with self._lock, self._connection:
+            snapshot = self._connection.execute("INSERT INTO snapshots (taken_at) VALUES (?)",
+                                                (int(taken_at or time.time()),)).lastrowid
+            for space, articles in articles_by_space.items():
+                self._connection.executemany(UPSERT_ARTICLE, (
+                    (space, article.page_url, article.title, article.version, article.created, article.modified,
+                     article.creator, article.modifier, snapshot, snapshot) for article in articles))
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO snapshot_articles (snapshot, space, page_url) VALUES (?, ?, ?)",
+                    ((snapshot, space, article.page_url) for article in articles))
+        return snapshot
+
+    def snapshots(self):
+        """Returns the recorded snapshots, newest first, as dicts with id, taken_at and articles (count)"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT s.id, s.taken_at, COUNT(sa.page_url) AS articles FROM snapshots s "
+                "LEFT JOIN snapshot_articles sa ON sa.snapshot = s.id GROUP BY s.id ORDER BY s.id DESC").fetchall()
+        return [dict(row) for row in rows]
+
+    def find_articles(self, space=None, creator=None, modifier=None, created_before=None, created_after=None,
+                      modified_before=None, modified_after=None, snapshot=None, limit=None):
+        """
+        Returns the articles matching every given filter, oldest first.
+
+        Args:
+            space (str): Space name, e.g. "How-to".
+            creator (str): Creator name, without the "XWiki." prefix.
+            modifier (str): Last modifier name, without the "XWiki." prefix.
+            created_before (int): Only articles created before this epoch.
+            created_after (int): Only articles created at or after this epoch.
+            modified_before (int): Only articles not modified since this epoch.
+            modified_after (int): Only articles modified at or after this epoch.
+            snapshot (int): Only articles present in this snapshot, defaults to the articles of the latest snapshot
+                            of their space. Pass 0 to include articles that have disappeared since.
+            limit (int): Max number of articles returned.
+
+        Returns:
+            list: Dicts with space, page_url, title, version, created, modified, creator and modifier.
+        """
+        conditions = []
+        parameters = []
+        for clause, value in (("a.space = ?", space), ("a.creator = ?", creator), ("a.modifier = ?", modifier),
+                              ("a.created < ?", created_before), ("a.created >= ?", created_after),
+                              ("a.modified < ?", modified_before), ("a.modified >= ?", modified_after)):
+            if value is not None:
+                conditions.append(clause)
+                parameters.append(value)
+        joins = ""
+        if snapshot is None:
+            # the latest snapshot of every space in one pass over the (space, last_snapshot) index
+            joins = (" JOIN (SELECT space, MAX(last_snapshot) AS last_snapshot FROM articles GROUP BY space) latest"
+                     " ON latest.space = a.space AND latest.last_snapshot = a.last_snapshot")
+        elif snapshot:
+            conditions.append("EXISTS (SELECT 1 FROM snapshot_articles sa WHERE sa.snapshot = ? "
+                              "AND sa.space = a.space AND sa.page_url = a.page_url)")
+            parameters.append(snapshot)
+        query = ("SELECT a.space, a.page_url, a.title, a.version, a.created, a.modified, a.creator, a.modifier "
+                 "FROM articles a" + joins)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY a.created"
+        if limit:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self._connection.close()
+
+
+def _days_ago(days):
+    return None if days is None else int(time.time()) - days * 86400
+
+
+def main(argv=None):
+    """
+    Command line access to the inventory store, e.g.
+        python inventory_store.py query --modifier jdoe --unchanged-days 365
+        python inventory_store.py snapshots
+    """
+    parser = argparse.ArgumentParser(description="Query the local XWiki inventory store")
+    parser.add_argument("--db", default=os.path.join(os.getcwd(), 'cache', 'inventory.sqlite3'),
+                        help="path to the SQLite inventory store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshots", help="list the recorded snapshots")
+    query = commands.add_parser("query", help="list the articles matching every given filter")
+    query.add_argument("--space")
+    query.add_argument("--creator")
+    query.add_argument("--modifier")
+    query.add_argument("--created-days", type=int, help="created within the last N days")
+    query.add_argument("--older-than-days", type=int, help="created more than N days ago")
+    query.add_argument("--modified-days", type=int, help="modified within the last N days")
+    query.add_argument("--unchanged-days", type=int, help="not modified for N days")
+    query.add_argument("--snapshot", type=int, help="articles of this snapshot instead of the latest one")
+    query.add_argument("--limit", type=int)
+    query.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    store = InventoryStore(args.db)
+    try:
+        if args.command == "snapshots":
+            for snapshot in store.snapshots():
+                print(f"{snapshot['id']}\t{iso_date(snapshot['taken_at'])}\t{snapshot['articles']} articles")
+            return 0
+        articles = store.find_articles(space=args.space, creator=args.creator, modifier=args.modifier,
+                                       created_after=_days_ago(args.created_days),
+                                       created_before=_days_ago(args.older_than_days),
+                                       modified_after=_days_ago(args.modified_days),
+                                       modified_before=_days_ago(args.unchanged_days),
+                                       snapshot=args.snapshot, limit=args.limit)
+        if args.json:
+            json.dump(articles, sys.stdout, indent=2)
+            print()
+        else:
+            for article in articles:
+                print(f"{article['space']}\t{iso_date(article['created'])}\t{iso_date(article['modified'])}\t"
+                      f"{article['creator']}\t{article['modifier']}\t{article['title']}\t{article['page_url']}")
+            print(f"{len(articles)} articles")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,40 +1,80 @@
+import argparse
+import fnmatch
+import io
 import json
 import os
 import re
+import sys
+import time
 import warnings
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from urllib.parse import urlparse
+from operator import attrgetter
+from urllib.parse import unquote, urlparse
 
-import requests
 import urllib3
 
 import html_worker
 import markdown_worker
-from utilities import get_value_from_secret_file_json
+import renderer
+from article_record import ArticleRecord
+from http_capture import HttpCapture
+from inventory_store import InventoryStore
+from metadata_cache import ArticleMetadataCache
+from modifications_feed import FeedState
+from profiling import Profiler
+from publish_state import PublishState
+from publish_state import content_hash
+from publish_state import inventory_delta
+from publish_state import inventory_of
+from run_metrics import RunMetrics
+from snapshot_archive import SnapshotArchive
+from url_classifier import UrlClassifier
 from utilities import transform_datetime
+from utilities import xwiki_timestamp_to_epoch
+from xwiki_transport import TransportError
+from xwiki_transport import XWikiTransport
 
 
-def process_space(pages_url, space_name):
+# output formats process_space can render a space to
+SPACE_SINKS = {
+    "json": markdown_worker.JsonSink,
+    "md": markdown_worker.MarkdownSink,
+    "html": html_worker.HtmlSink,
+}
+
+
+def process_space(pages_url, space_name, fetcher=None, articles_in_space=None, sinks=None):
     """
-    This function calls two functions from the XWikiAPIFetcher and markdown_worker classes to process the XWiki data
-    and create markdown files for a given space.
+    Fetches the articles of a given space once and renders them to every requested output format
+    in a single pass: every article is handed to all the sinks in turn, nothing is re-read from disk.
 
     Arguments:
     pages_url (string): the URL of the XWiki space to process.
     space_name (string): the name of the space to be created.
+    fetcher (XWikiAPIFetcher): optional fetcher to reuse, so that its config and connection pool are shared.
+    articles_in_space (list): optional articles already fetched for the space, e.g. by XWikiAPIFetcher.refresh.
+    sinks (list): names of the output formats from SPACE_SINKS, defaults to the "space_sinks" setting.
 
     Returns:
-    This function does not return anything. Instead, it calls two functions:
+    list: the names of the files of every sink.
     """
-    articles_in_space = XWikiAPIFetcher().fetch_and_process_xwiki_data(pages_url)
-    articles_json_file = markdown_worker.create_articles_json_file(space_name, articles_in_space)
-    markdown_worker.create_md(space_name, articles_json_file)
-    html_worker.create_html_for_single_space(space_name, articles_json_file)
+    fetcher = fetcher or XWikiAPIFetcher()
+    if articles_in_space is None:
+        articles_in_space = fetcher.fetch_and_process_xwiki_data(pages_url)
+    all_sinks = [SPACE_SINKS[name](space_name) for name in (sinks or fetcher.space_sinks)]
+    with fetcher.metrics.timer("render"), fetcher.profiler.phase("render"):
+        # sinks whose file already exists are skipped
+        active_sinks = [sink for sink in all_sinks if sink.begin()]
+        for article in articles_in_space:
+            for sink in active_sinks:
+                sink.write(article)
+        return [sink.end() for sink in all_sinks]
 
 
 class XWikiAPIFetcher:
-    def __init__(self):
+    def __init__(self, settings=None):
         """
         Set up the required variables and configuration data.
         This function creates pointers to the necessary secret files, loads the required
@@ -42,6 +82,7 @@ class XWikiAPIFetcher:
 
         Args:
             self (object): The object containing the setUp method
+            settings (dict): Optional tuning knobs overriding the "settings" of api_secret.json, see main().
 
         Returns:
             None
@@ -79,25 +120,121 @@ class XWikiAPIFetcher:
         self.bad_article_url = api_secrets["bin"]["bad_article_url"]
         self.ns = {'xwiki': 'http://www.xwiki.org'}
 
-    def _send_authenticated_response(self, url):
+        # optional tuning knobs, all of them have sane defaults
+        self.settings = {**api_secrets.get("settings", {}), **(settings or {})}
+        # requests in flight across all spaces crawled at the same time, at start when adaptive
+        self.max_in_flight = self.settings.get("max_in_flight", 8)
+        # the in flight budget grows up to this value while the server stays healthy and shrinks on errors,
+        # set it to max_in_flight for a fixed budget
+        self.max_in_flight_ceiling = self.settings.get("max_in_flight_ceiling", 4 * self.max_in_flight)
+        # threads per space fetching article metadata, the in flight budget is what bounds the requests
+        self.max_workers = self.settings.get("max_workers", self.max_in_flight_ceiling)
+        # keep-alive connections kept per host, one per request in flight is enough
+        self.pool_size = self.settings.get("pool_size", max(self.max_in_flight_ceiling, 10))
+        # crawl all spaces at the same time in create_html_for_all_spaces
+        self.parallel_spaces = self.settings.get("parallel_spaces", True)
+
+        # "record" stores every response of the run in capture_file, "replay" serves the whole run from it
+        # without any network access, optionally delayed by the original response times
+        capture_mode = self.settings.get("capture_mode")
+        capture_file = self.settings.get("capture_file", os.path.join(cwd, 'cache', 'http_capture.sqlite3'))
+        capture = HttpCapture(capture_file, capture_mode,
+                              simulate_timing=self.settings.get("replay_timing", False)) if capture_mode else None
+        # the inventory store, archive, publish and feed states of a replayed run are kept next to the capture,
+        # so that a replay never passes for a real run of the wiki in the next real one
+        state_dir = os.path.join(cwd, 'cache')
+        if capture_mode == "replay":
+            state_dir = os.path.splitext(capture_file)[0] + '_replay'
+            # the HTML file too, the one of a real run is neither published from nor removed by a replay
+            self.html_file = os.path.join(state_dir, 'articles_in_all_spaces.html')
+
+        # per-phase timing and request metrics of the run, written by close() as a JSON report to metrics_report
+        # (null disables it) and, when metrics_textfile is set, in the Prometheus textfile format
+        self.metrics = RunMetrics()
+        self.metrics_report = self.settings.get("metrics_report", os.path.join(cwd, 'cache', 'run_report.json'))
+        self.metrics_textfile = self.settings.get("metrics_textfile")
+
+        # opt-in cProfile and tracemalloc profiling of the pipeline phases, written by close() to outputs/profile_*
+        self.profiler = Profiler(enabled=self.settings.get("profile", False)
+                                 or os.environ.get("XWIKI_PROFILE", "") not in ("", "0"),
+                                 output_dir=os.path.join(cwd, 'outputs'))
+
+        # shared pooled session used by every fetch and by update_article
+        self.transport = XWikiTransport(self.secret_creds_file, pool_size=self.pool_size,
+                                        cookie_file=os.path.join(cwd, 'configs', 'session_cookies.json'),
+                                        max_in_flight=self.max_in_flight,
+                                        max_in_flight_ceiling=self.max_in_flight_ceiling,
+                                        timeout=self.settings.get("request_timeout", 30),
+                                        max_retries=self.settings.get("max_retries", 3),
+                                        breaker_threshold=self.settings.get("breaker_threshold", 5),
+                                        breaker_cooldown=self.settings.get("breaker_cooldown", 30),
+                                        capture=capture,
+                                        metrics=self.metrics)
+
+        # refetch only the articles whose version differs from the cached one
+        self.incremental = self.settings.get("incremental", False)
+        # per-article metadata persisted between runs
+        self.metadata_cache = ArticleMetadataCache(os.path.join(cwd, 'cache', 'articles_metadata.json'))
+
+        # "rest" fetches every article page, "query" pulls a whole space from the query endpoint
+        self.backend = self.settings.get("backend", "rest")
+        # per-space override of the backend, keyed by space name (e.g. "General-Knowledge")
+        self.space_backends = self.settings.get("space_backends", {})
+        # number of search results requested per query page
+        self.query_page_size = self.settings.get("query_page_size", 500)
+        # number of page summaries requested per space listing page
+        self.listing_page_size = self.settings.get("listing_page_size", 500)
+        # levels of nested pages crawled below every space, 1 lists the articles of the space only, 0 has no limit
+        self.crawl_depth = self.settings.get("crawl_depth", 1)
+        # "lean" takes article metadata from its page only, "deep" also walks the whole article history
+        self.history_mode = self.settings.get("history_mode", "lean")
+        # output formats of process_space, see SPACE_SINKS
+        self.space_sinks = self.settings.get("space_sinks", ["json", "md", "html"])
+        # space splitters and restricted URL sequences of the articles, see UrlClassifier
+        self.url_classifier = UrlClassifier.from_settings(
+            self.settings, [self._space_name_from_url(space_url) for space_url in self.space_urls()])
+        # every full run of fetch_all_spaces is recorded as a snapshot in this SQLite store, null disables it
+        inventory_db = self.settings.get("inventory_db", os.path.join(state_dir, 'inventory.sqlite3'))
+        self.inventory_store = InventoryStore(inventory_db) if inventory_db else None
+        # the inventory of every published run is archived here, null disables the archive
+        archive_dir = self.settings.get("archive_dir", os.path.join(state_dir, 'archive'))
+        self.archive = SnapshotArchive(archive_dir,
+                                       chunk_rows=self.settings.get("archive_chunk_rows", 64),
+                                       keep_last=self.settings.get("archive_keep_last", 30),
+                                       keep_daily=self.settings.get("archive_keep_daily", 90)) if archive_dir else None
+        # hash and inventory of the content last published to every page
+        self.publish_state = PublishState(os.path.join(state_dir, 'publish_state.json'))
+        # "single" publishes the whole inventory to one page, "sharded" publishes one child page per space
+        # (and per shard_rows articles of a space) below an index page, see publish_sharded
+        self.publish_mode = self.settings.get("publish_mode", "single")
+        self.shard_rows = self.settings.get("shard_rows", 500)
+        # progress of update_from_feed through the wiki modifications feed: modifications are read again from
+        # feed_overlap seconds before the high-water mark, to tolerate clock skew and late commits, and every space
+        # is listed again every reconcile_interval seconds to catch what the feed misses
+        self.feed_state = FeedState(os.path.join(state_dir, 'feed_state.json'))
+        self.feed_page_size = self.settings.get("feed_page_size", 500)
+        self.feed_overlap = self.settings.get("feed_overlap", 300)
+        self.reconcile_interval = self.settings.get("reconcile_interval", 86400)
+        # articles of every space crawled by create_html_for_all_spaces or publish_sharded, keyed by space name
+        self.last_inventory = None
+
+    def _send_authenticated_response(self, url, phase="request"):
         """
-        Sends an authenticated GET request to the specified URL using the secret credentials
-        loaded from the secret file, and returns the response object.
+        Sends an authenticated GET request to the specified URL over the shared pooled transport,
+        and returns the response object.
 
         Args:
             self (object): The object containing the _send_authenticated_response method
             url (str): The URL to which the authenticated GET request should be sent
+            phase (str): The phase the request is recorded under in the run metrics.
 
         Returns:
             response (Response): A Response object containing the server's response to the request
 
         Raises:
-            N/A
+            TransportError: If the request failed for good, see XWikiTransport.get.
         """
-        with open(self.secret_creds_file) as secret_file:
-            data = json.load(secret_file)
-        response = requests.get(url, data=data, verify=False)
-        return response
+        return self.transport.get(url, phase=phase)
 
     def suppress_insecure_and_resource_warnings(func):
         """
@@ -123,23 +260,97 @@ class XWikiAPIFetcher:
 
         return wrapper
 
-    def _get_xml(self, url):
+    def _get_xml(self, url, phase="request"):
         """
         A helper function that sends an authenticated request to the specified URL and returns the XML text.
 
         Args:
             self: The object instance of the class
             url (str): The URL to which the authenticated request is to be sent.
+            phase (str): The phase the request is recorded under in the run metrics.
 
         Returns:
             str: The XML text received from the server.
 
         Raises:
-            None
+            TransportError: If the request failed for good, see XWikiTransport.get.
         """
-        response = self._send_authenticated_response(url)
+        response = self._send_authenticated_response(url, phase)
         return response.text
 
+    def _get_xml_root(self, url, phase):
+        """Returns the parsed XML of _get_xml, the parsing time is recorded as the "parse" phase"""
+        xml = self._get_xml(url, phase)
+        with self.metrics.timer("parse"):
+            return ET.fromstring(xml)
+
+    def _report_failure(self, phase, space_url, url, error):
+        """Reports a page or listing left out of the run after its requests failed for good, see XWikiTransport.get"""
+        print(f"Skipping {url}: {error}")
+        self.metrics.observe_failure(phase, self.transport.space_key(space_url), url, str(error))
+
+    def _iter_page_summaries(self, url):
+        """
+        Streams the page summaries of a pages listing (e.g. WebHome/children) page by page.
+        The listing is requested with the REST start/number pagination, listing_page_size summaries per request,
+        and every response is parsed incrementally with iterparse. Parsed elements are cleared right away,
+        so memory stays flat whatever the size of the space. The parsing, including the reads of the streamed
+        body it drives, is timed as the "parse" phase, the time spent by the caller between summaries is not.
+
+        Args:
+            url (str): The URL of the pages listing.
+
+        Yields:
+            dict: A page summary with the keys title, page_url (xwikiRelativeUrl), version and links
+                  (list of the href of every link of the page).
+        """
+        page_summary_tag = f"{{{self.ns['xwiki']}}}pageSummary"
+        link_tag = f"{{{self.ns['xwiki']}}}link"
+        start = 0
+        previous_first_url = None
+        while True:
+            summaries_in_page = 0
+            first_url = None
+            with self.transport.get(url, phase="listing", params={'start': start, 'number': self.listing_page_size},
+                                    stream=True) as response:
+                if response.status_code == 404:
+                    # the page was removed since its parent was listed
+                    return
+                response.raw.decode_content = True
+                root = None
+                parse_time = 0.0
+                started = time.perf_counter()
+                try:
+                    for event, element in ET.iterparse(response.raw, events=('start', 'end')):
+                        if root is None:
+                            root = element
+                        if event != 'end' or element.tag != page_summary_tag:
+                            continue
+                        summary = {'title': element.findtext('xwiki:title', None, self.ns),
+                                   'page_url': element.findtext('xwiki:xwikiRelativeUrl', None, self.ns),
+                                   'version': element.findtext('xwiki:version', None, self.ns),
+                                   'links': [link.get('href') for link in element.iter(link_tag)]}
+                        # drop the parsed summary, only the extracted values are kept
+                        element.clear()
+                        root.clear()
+                        if first_url is None:
+                            first_url = summary['page_url']
+                            # a server ignoring start/number serves the same page again
+                            if first_url == previous_first_url:
+                                return
+                        summaries_in_page += 1
+                        parse_time += time.perf_counter() - started
+                        yield summary
+                        started = time.perf_counter()
+                    parse_time += time.perf_counter() - started
+                finally:
+                    self.metrics.observe_time("parse", None, parse_time)
+                self.metrics.observe_bytes("listing", self.transport.space_key(url), response.raw.tell())
+            if summaries_in_page < self.listing_page_size:
+                return
+            previous_first_url = first_url
+            start += self.listing_page_size
+
     def _return_pages_list(self, url):
         """
         Returns a list of page summaries for a given XWiki URL.
@@ -148,7 +359,8 @@ class XWikiAPIFetcher:
         url (str): The URL of the XWiki instance.
 
         Returns:
-        pages_list (list): A list of page summaries, each of which is represented as an Element object.
+        pages_list (list): A list of page summaries, each of which is represented as a dictionary
+        (see _iter_page_summaries).
 
         Raises:
         None.
@@ -156,224 +368,1185 @@ class XWikiAPIFetcher:
         Usage:
         pages_list = _return_pages_list('https://myxwiki.org')
         """
-        text_to_parse = self._get_xml(url)
-        root = ET.fromstring(text_to_parse)
         pages_list = []
         # iterate over each pageSummary element and extract the desired elements
-        for page in root.findall('.//xwiki:pageSummary', self.ns):
+        for page in self._iter_page_summaries(url):
             pages_list.append(page)
-            title = page.find('xwiki:title', self.ns).text
-            xwiki_relative_url = page.find('xwiki:xwikiRelativeUrl', self.ns).text
 
             # print the extracted elements
-            print(f'Title: {title}')
-            print(f'xwikiRelativeUrl: {xwiki_relative_url}\n')
+            print(f'Title: {page["title"]}')
+            print(f'xwikiRelativeUrl: {page["page_url"]}\n')
         return pages_list
 
-    def _create_articles_dictionaries_to_process(self, space_url) -> list:
+    def _create_articles_dictionaries_to_process(self, space_url):
         """
-        Returns a list of dictionaries, where each dictionary represents a page in a given XWiki space.
+        Yields an ArticleRecord for every page in a given XWiki space, as soon as its summary is parsed
+        from the streamed space listing.
 
         Parameters:
         space_url (str): The URL of the XWiki space to process.
 
-        Returns:
-        articles_dictionaries (list): A list of dictionaries, where each dictionary contains information about a page,
-        including its title, URL, and links.
+        Yields:
+        record (ArticleRecord): The title, URL and version of a page and the hrefs of its metadata and history.
 
         Raises:
         None.
 
         Usage:
-        articles_dictionaries = _create_articles_dictionaries_to_process('https://myxwiki.org/spaces/MySpace')
-        """
-        text_to_parse = self._get_xml(space_url)
-        root = ET.fromstring(text_to_parse)
-        articles_list = []
-        article_url_leaf = ""
-        for page in root.findall('.//xwiki:pageSummary', self.ns):
-            page_url = page.find('xwiki:xwikiRelativeUrl', self.ns).text
-
-            if "/How-to/" in page_url:
-                base_url, article_url_leaf = page_url.split("/How-to/", 1)
-            elif "/General-Knowledge/" in page_url:
-                base_url, article_url_leaf = page_url.split("/General-Knowledge/", 1)
-            elif "/How-to-configure-VBO365/" in page_url:
-                base_url, article_url_leaf = page_url.split("/How-to-configure-VBO365/", 1)
-            elif "/Patch-notes/" in page_url:
-                base_url, article_url_leaf = page_url.split("/Patch-notes/", 1)
-
-            # problematic_units.json: article-with-%5B
-            if "%5B" in article_url_leaf:
-                print(f"Skipping {page_url} due to the restricted symbols in URL")
-                page_url = page_url.replace("xwiki", "xwiki-sup")
-
-            # problematic_units.json: article-with-%3A
-            if "%3A" in article_url_leaf:
-                print(f"Skipping {page_url} due to the restricted symbols in URL")
-                page_url = page_url.replace("xwiki", "xwiki-sup")
-
-            # problematic_units.json: article-with-%60
-            if "%60" in article_url_leaf:
-                print(f"Skipping {page_url} due to the restricted symbols in URL")
-                page_url = page_url.replace("xwiki", "xwiki-sup")
-
-            else:
-                title = page.find('xwiki:title', self.ns).text
-                links = page.findall('xwiki:link', self.ns)
-                page_data = {'title': title, 'page_url': page_url, 'links': links}
-                articles_list.append(page_data)
+        for record in _create_articles_dictionaries_to_process('https://myxwiki.org/spaces/MySpace'): ...
+        """
+        for page in self._iter_page_summaries(space_url):
+            # restricted URLs are marked with xwiki-sup and skipped by the callers
+            record = ArticleRecord(page['title'], self.url_classifier.clear_page_url(page['page_url']),
+                                   page['version'])
+            for href in page['links']:
+                # find metadata page for an article
+                if href.endswith('pages/WebHome'):
+                    record.metadata_href = href
+                # find history page for an article
+                if "WebHome/history" in href:
+                    record.history_href = href
+            yield record
 
         print(f"Links for {space_url} are created")
-        return articles_list
+
+    def _crawl_space(self, space_url, depth):
+        """
+        Yields an ArticleRecord for every page of a space down to depth levels of nested pages, level by level.
+        The listing of the space is streamed, the pages of a level are then the frontier of the next one and
+        their children listings are all requested in parallel, so the crawl takes about depth round trips
+        rather than one per page. Pages are visited once, keyed by their REST URL, and restricted pages,
+        marked with xwiki-sup, are not expanded. A nested listing that fails is reported and left out
+        with the pages below it, only a failure of the listing of the space itself is raised.
+
+        Args:
+            space_url (str): The children pages URL of the XWiki space.
+            depth (int): Levels of pages yielded, 1 only lists the space, 0 has no limit.
+
+        Yields:
+            ArticleRecord: See _create_articles_dictionaries_to_process.
+
+        Raises:
+            TransportError: If the listing of the space failed.
+        """
+        space_name = self._space_name_from_url(space_url)
+        visited = set()
+        frontier = [space_url]
+        level = 1
+
+        def expand(children_url):
+            with self.profiler.phase("listing"):
+                try:
+                    return list(self._create_articles_dictionaries_to_process(children_url))
+                except TransportError as error:
+                    self._report_failure("listing", space_url, children_url, error)
+                    return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while frontier:
+                if level == 1:
+                    listings = [self._create_articles_dictionaries_to_process(space_url)]
+                else:
+                    listings = executor.map(expand, frontier)
+                next_frontier = []
+                found = 0
+                for listing in listings:
+                    for record in listing:
+                        key = record.metadata_href or record.page_url
+                        if key in visited:
+                            continue
+                        visited.add(key)
+                        found += 1
+                        if ((not depth or level < depth) and record.metadata_href is not None
+                                and "xwiki-sup" not in record.page_url):
+                            next_frontier.append(record.metadata_href + "/children")
+                        yield record
+                if depth != 1:
+                    print(f"{space_name} level {level}: {len(frontier)} listings, {found} pages, "
+                          f"{len(next_frontier)} to expand")
+                frontier = next_frontier
+                level += 1
+
+    def _fetch_article_created(self, href):
+        """
+        Fetches the metadata page of an article and returns its creation timestamp.
+
+        Args:
+            href (str): The URL of the article metadata page (ends with pages/WebHome).
+
+        Returns:
+            int: Epoch of when the article was created.
+        """
+        with self.profiler.phase("metadata"):
+            metadata_root = self._get_xml_root(href, "metadata")
+            return xwiki_timestamp_to_epoch(metadata_root.find('xwiki:created', self.ns).text)
+
+    def _fetch_article_page_metadata(self, href):
+        """
+        Fetches the metadata page of an article and returns everything the inventory needs from it,
+        the page resource carries the creation and the latest modification data, so no history is required.
+
+        Args:
+            href (str): The URL of the article metadata page (ends with pages/WebHome).
+
+        Returns:
+            tuple: (created, modified, creator, modifier) as expected by ArticleRecord.set_metadata.
+        """
+        with self.profiler.phase("metadata"):
+            return self._page_metadata(self._get_xml_root(href, "metadata"))
+
+    def _page_metadata(self, metadata_root):
+        """Returns the (created, modified, creator, modifier) tuple of a parsed page resource"""
+        creator = metadata_root.find('xwiki:creator', self.ns).text
+        modifier = metadata_root.findtext('xwiki:modifier', '', self.ns)
+        return (xwiki_timestamp_to_epoch(metadata_root.find('xwiki:created', self.ns).text),
+                xwiki_timestamp_to_epoch(metadata_root.find('xwiki:modified', self.ns).text),
+                creator.replace("XWiki.", "").replace("xwiki:", ""),
+                modifier.replace("XWiki.", "").replace("xwiki:", ""))
+
+    def _fetch_article_record(self, page_url):
+        """
+        Fetches a single article by its xwikiRelativeUrl, without listing its space, and stores its metadata
+        in the metadata cache.
+
+        Args:
+            page_url (str): The xwikiRelativeUrl of the article, e.g. .../bin/view/VB365/How-to/Article/
+
+        Returns:
+            ArticleRecord: The article with its title, version and metadata, or None if there is no such page.
+        """
+        metadata_href = self._view_url_to_rest_page(page_url)
+        with self.profiler.phase("metadata"):
+            response = self._send_authenticated_response(metadata_href, "metadata")
+            if response.status_code == 404:
+                return None
+            with self.metrics.timer("parse"):
+                metadata_root = ET.fromstring(response.text)
+            record = ArticleRecord(metadata_root.findtext('xwiki:title', None, self.ns), page_url,
+                                   metadata_root.findtext('xwiki:version', None, self.ns),
+                                   metadata_href=metadata_href)
+            record.set_metadata(*self._page_metadata(metadata_root))
+        self.metadata_cache.put(record.page_url, record.version, record.metadata())
+        return record
+
+    def _try_fetch_article_record(self, page_url):
+        """Returns _fetch_article_record(page_url), or the TransportError it raised once reported"""
+        try:
+            return self._fetch_article_record(page_url)
+        except TransportError as error:
+            self._report_failure("metadata", self._view_url_to_rest_page(page_url), page_url, error)
+            return error
+
+    def _fetch_article_history(self, href):
+        """
+        Fetches the history page of an article and returns the latest modification timestamp, the creator
+        and the latest modifier.
+
+        Args:
+            href (str): The URL of the article history page.
+
+        Returns:
+            tuple: (modified, creator, modifier) with modified as epoch, or None if the history is empty.
+        """
+        with self.profiler.phase("history"):
+            history_root = self._get_xml_root(href, "history")
+            modified_timestamps = []
+            modifiers = []
+            for history_record in history_root.findall('.//xwiki:historySummary', self.ns):
+                modified_timestamps.append(history_record.find('xwiki:modified', self.ns).text)
+                modifier = history_record.find('xwiki:modifier', self.ns).text
+                modifiers.append(modifier.replace("XWiki.", "").replace("xwiki:", ""))
+            if not modified_timestamps:
+                return None
+            # newest revision first: the last modifier of the history is the creator
+            return xwiki_timestamp_to_epoch(modified_timestamps[0]), modifiers[-1], modifiers[0]
 
     @suppress_insecure_and_resource_warnings
-    def fetch_and_process_xwiki_data(self, space_url) -> list:
+    def fetch_and_process_xwiki_data(self, space_url, max_workers=None, incremental=None, backend=None,
+                                     history_mode=None, depth=None) -> list:
         """
-        Fetches XWiki data from the given space URL and processes it into a JSON object.
+        Fetches XWiki data from the given space URL and processes it into a list of article records.
+        Article pages are requested concurrently, with at most max_workers requests in flight.
+        In incremental mode an article is only refetched when its version in the space listing differs
+        from the one stored in the metadata cache.
 
         Args:
             space_url (str): The URL of the XWiki space to fetch data from.
+            max_workers (int): Max number of concurrent requests, defaults to the "max_workers" setting.
+            incremental (bool): Reuse cached metadata of unchanged articles, defaults to the "incremental" setting.
+            backend (str): "rest" or "query", defaults to the "space_backends" entry of the space or the
+                           "backend" setting. See _fetch_space_with_query for the "query" backend.
+            history_mode (str): "lean" reads everything from the single metadata page of an article,
+                                "deep" also downloads and walks its whole history. Defaults to the
+                                "history_mode" setting.
+            depth (int): Levels of nested pages crawled, 1 lists the articles of the space only, 0 has no limit.
+                         Defaults to the "crawl_depth" setting, see _crawl_space.
 
         Returns:
-            A sorted list of dictionaries containing historical data for each article in the XWiki space.
-            Each dictionary contains the following keys:
+            A list of ArticleRecord sorted by creation date, one per article in the XWiki space, with:
             - title: The title of the article.
             - page_url: The URL of the article.
-            - created: The timestamp of when the article was created.
-            - latest_modified: The timestamp of the latest modification made to the article.
-            - creator_without_prefix: The name of the user who created the article, without the
-                                        "XWiki." or "xwiki:" prefix.
+            - created: Epoch of when the article was created.
+            - modified: Epoch of the latest modification made to the article.
+            - creator: The name of the user who created the article, without the "XWiki." or "xwiki:" prefix.
+            - modifier: The name of the user who last modified the article, without prefix either.
+        """
+        # the wall time of the whole space, regressions of fetch_and_process_xwiki_data show up here
+        with self.metrics.timer("crawl", self.transport.space_key(space_url)):
+            if backend is None:
+                backend = self.space_backends.get(self._space_name_from_url(space_url), self.backend)
+            if depth is None:
+                depth = self.crawl_depth
+            if backend == "query":
+                return self._fetch_space_with_query(space_url, max_workers, depth=depth)
+            if incremental is None:
+                incremental = self.incremental
+            if history_mode is None:
+                history_mode = self.history_mode
+            articles_in_space = {}
+            with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+                pending = []
+                for record in self.profiler.iterate("listing", self._crawl_space(space_url, depth)):
+                    print(f"Processing {record.page_url}")
+                    if "xwiki-sup" in record.page_url:
+                        print(f"Skipping {record.page_url} due to the broken link")
+                        continue
+                    cached = self.metadata_cache.get(record.page_url, record.version) if incremental else None
+                    if cached is not None:
+                        record.set_metadata(cached["created"], cached["modified"], cached["creator"],
+                                            cached.get("modifier", ""))
+                        pending.append((record, None, None))
+                    elif history_mode == "deep":
+                        if record.metadata_href is not None and record.history_href is not None:
+                            pending.append((record,
+                                            executor.submit(self._fetch_article_created, record.metadata_href),
+                                            executor.submit(self._fetch_article_history, record.history_href)))
+                    elif record.metadata_href is not None:
+                        pending.append((record,
+                                        executor.submit(self._fetch_article_page_metadata, record.metadata_href),
+                                        None))
+
+                # collect in listing order so that duplicate titles resolve exactly as in a serial run
+                for record, metadata_future, history_future in pending:
+                    try:
+                        if history_future is not None:
+                            history = history_future.result()
+                            if history is None:
+                                continue
+                            record.set_metadata(metadata_future.result(), *history)
+                        elif metadata_future is not None:
+                            record.set_metadata(*metadata_future.result())
+                    except TransportError as error:
+                        # only this article is left out of the run
+                        self._report_failure("metadata", space_url, record.page_url, error)
+                        continue
+                    if metadata_future is not None:
+                        self.metadata_cache.put(record.page_url, record.version, record.metadata())
+                    # nested pages often share titles (e.g. "Overview"), a recursive crawl keys them by URL
+                    articles_in_space[record.title if depth == 1 else record.page_url] = record
+            self.metadata_cache.save()
+            # Sort by created
+            return sorted(articles_in_space.values(), key=attrgetter('created'))
+
+    @staticmethod
+    def _space_name_from_url(space_url):
+        """Returns the space name (e.g. "General-Knowledge") of a children pages URL ending with pages/WebHome/children"""
+        return urlparse(space_url).path.split('/')[-4]
+
+    @staticmethod
+    def _rest_page_to_view_url(page_href):
+        """
+        Converts the REST URL of a page to its xwikiRelativeUrl, e.g.
+        .../rest/wikis/xwiki/spaces/A/spaces/B/pages/WebHome -> .../bin/view/A/B/
+        """
+        rest_root, page_path = page_href.split('/rest/wikis/', 1)
+        segments = page_path.split('/')
+        spaces = [segments[i + 1] for i, segment in enumerate(segments[:-1]) if segment == 'spaces']
+        view_url = f"{rest_root}/bin/view/{'/'.join(spaces)}/"
+        if segments[-1] != 'WebHome':
+            view_url += segments[-1]
+        return view_url
+
+    def _view_url_to_rest_page(self, page_url):
+        """
+        Converts the xwikiRelativeUrl of a page to its REST URL, the reverse of _rest_page_to_view_url, e.g.
+        .../bin/view/A/B/ -> .../rest/wikis/xwiki/spaces/A/spaces/B/pages/WebHome
+        """
+        # the REST root and wiki of the configured spaces, e.g. .../rest/wikis/xwiki
+        wiki_root = self.gk_children_pages_url.split('/spaces/', 1)[0]
+        segments = page_url.split('/bin/view/', 1)[1].split('/')
+        page = segments.pop() or 'WebHome'
+        return wiki_root + ''.join(f"/spaces/{space}" for space in segments) + f"/pages/{page}"
+
+    def _query_space_pages(self, space_url, since=None, depth=1):
+        """
+        Lists the articles directly below the space of a children pages URL with the XWiki query endpoint,
+        or down to depth levels of nested pages, page_size results per request.
+
+        Args:
+            space_url (str): The children pages URL of the XWiki space, e.g.
+                             .../rest/wikis/xwiki/spaces/VB365/spaces/How-to/pages/WebHome/children
+            since (int): Only list the articles modified at or after this epoch. The date is compared
+                         in UTC, so a server storing local dates may list a few hours more than asked.
+            depth (int): Levels of nested pages listed, 0 has no limit.
+
+        Returns:
+            list: A list of searchResult elements ordered by creation date.
+        """
+        rest_root, space_path = space_url.split('/wikis/', 1)
+        segments = space_path.split('/')
+        wiki = segments[0]
+        spaces = [unquote(segments[i + 1]) for i, segment in enumerate(segments[:-1]) if segment == 'spaces']
+        space_reference = '.'.join(space.replace('\\', '\\\\').replace('.', '\\.') for space in spaces)
+        space_reference = space_reference.replace("'", "''")
+        # pages below the space are <space>.<article>.WebHome, pages nested below them <space>.<article>.<page>.WebHome
+        query = f"where doc.fullName like '{space_reference}.%.WebHome'"
+        if depth:
+            query += f" and doc.fullName not like '{space_reference}{'.%' * (depth + 1)}.WebHome'"
+        if since is not None:
+            since_date = datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            query += f" and doc.date >= '{since_date}'"
+        query += " order by doc.creationDate"
+
+        search_results = []
+        start = 0
+        while True:
+            response = self.transport.get(f"{rest_root}/wikis/{wiki}/query", phase="query",
+                                          params={'q': query, 'type': 'xwql',
+                                                  'start': start, 'number': self.query_page_size})
+            with self.metrics.timer("parse"):
+                root = ET.fromstring(response.text)
+            results_page = root.findall('.//xwiki:searchResult', self.ns)
+            search_results.extend(results_page)
+            if len(results_page) < self.query_page_size:
+                break
+            start += self.query_page_size
+        print(f"Query for {space_url} returned {len(search_results)} articles")
+        return search_results
+
+    def _fetch_space_with_query(self, space_url, max_workers=None, since=None, depth=1) -> list:
+        """
+        The "query" backend of fetch_and_process_xwiki_data: title, URL, version and last modification date
+        of the whole space come from a few paginated query requests instead of two requests per article.
+        Search results carry no creation data, so created and creator are taken from the metadata cache
+        (they never change once known) and only articles never seen before cost one page request.
+
+        Args:
+            space_url (str): The children pages URL of the XWiki space to fetch data from.
+            max_workers (int): Max number of concurrent page requests for articles missing from the cache.
+            since (int): Only return the articles modified at or after this epoch, see _query_space_pages.
+            depth (int): Levels of nested pages listed, see _query_space_pages.
+
+        Returns:
+            The same sorted list fetch_and_process_xwiki_data returns.
         """
+        records = []
+        for search_result in self._query_space_pages(space_url, since, depth):
+            page_href = None
+            for link in search_result.findall('xwiki:link', self.ns):
+                if re.search(r'pages/WebHome$', link.get('href')):
+                    page_href = link.get('href')
+            if page_href is None:
+                continue
+            page_url = self._rest_page_to_view_url(page_href)
+            # same restricted symbols check as for the children listing
+            if "xwiki-sup" in self.url_classifier.clear_page_url(page_url):
+                continue
+            author = search_result.findtext('xwiki:author', '', self.ns)
+            records.append(ArticleRecord(search_result.findtext('xwiki:title', None, self.ns), page_url,
+                                         search_result.findtext('xwiki:version', None, self.ns),
+                                         metadata_href=page_href,
+                                         modified=xwiki_timestamp_to_epoch(
+                                             search_result.findtext('xwiki:modified', None, self.ns)),
+                                         modifier=author.replace("XWiki.", "").replace("xwiki:", "")))
+
+        def fetch_metadata(record):
+            try:
+                return self._fetch_article_page_metadata(record.metadata_href)
+            except TransportError as error:
+                self._report_failure("metadata", space_url, record.page_url, error)
+                return None
+
+        missing = [record for record in records if self.metadata_cache.get_any(record.page_url) is None]
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            fetched = dict(zip((record.page_url for record in missing), executor.map(fetch_metadata, missing)))
+
         articles_in_space = {}
-        dictionaries_of_articles = self._create_articles_dictionaries_to_process(space_url)
-        for article_dict in dictionaries_of_articles:
-            print(f"Processing {article_dict['page_url']}")
-            if "xwiki-sup" in article_dict['page_url']:
-                print(f"Skipping {article_dict['page_url']} due to the broken link")
-            if "xwiki-sup" not in article_dict['page_url']:
-                for link in article_dict["links"]:
-                    href = link.get('href')
-                    # find metadata page for an article
-                    if re.search(r'pages/WebHome$', href):
-                        metadata_text_to_parse = self._get_xml(href)
-                        metadata_root = ET.fromstring(metadata_text_to_parse)
-                        created = metadata_root.find('xwiki:created', self.ns).text
-                    # find history page for an article
-                    if "WebHome/history" in href:
-                        modified_timestamps = []
-                        hist_text_to_parse = self._get_xml(href)
-                        history_root = ET.fromstring(hist_text_to_parse)
-                        for history_record in history_root.findall('.//xwiki:historySummary', self.ns):
-                            modified = history_record.find('xwiki:modified', self.ns).text
-                            modified_timestamps.append(modified)
-                            latest_modified = modified_timestamps[0]
-                            creator = history_record.find('xwiki:modifier', self.ns).text
-                            creator_without_prefix = creator.replace("XWiki.", "").replace("xwiki:", "")
-                        articles_in_space[article_dict["title"]] = {"page_url": article_dict["page_url"],
-                                                                    "created": created,
-                                                                    "latest_modified": latest_modified,
-                                                                    "creator_without_prefix": creator_without_prefix}
+        for record in records:
+            if record.page_url in fetched:
+                if fetched[record.page_url] is None:
+                    continue
+                created, _, creator, _ = fetched[record.page_url]
+            else:
+                known = self.metadata_cache.get_any(record.page_url)
+                created, creator = known["created"], known["creator"]
+            record.set_metadata(created, record.modified, creator, record.modifier)
+            self.metadata_cache.put(record.page_url, record.version, record.metadata())
+            articles_in_space[record.title if depth == 1 else record.page_url] = record
+        self.metadata_cache.save()
         # Sort by created
-        sorted_historical_data = sorted(articles_in_space.items(), key=lambda x: x[1]["created"], reverse=False)
-        return sorted_historical_data
+        return sorted(articles_in_space.values(), key=attrgetter('created'))
+
+    def space_urls(self):
+        """Returns the children pages URLs of all configured spaces, in inventory order"""
+        return [self.gk_children_pages_url, self.how_to_children_pages_url, self.configure_children_pages_url]
 
     @suppress_insecure_and_resource_warnings
-    def create_html_for_all_spaces(self):
-        list_of_urls = [self.gk_children_pages_url, self.how_to_children_pages_url,
-                        self.configure_children_pages_url]
-        resulting_html = r"""
-        <style>
-            table {
-                border-collapse: separate;
-                border-spacing: 1px;
-            }
-        
-            table th, table td {
-                border: 1px solid #999999;
-                padding: 5px;
-            }
-        </style>
-        <body>
+    def fetch_all_spaces(self, space_urls, parallel=None, incremental=None) -> list:
         """
-        str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
-        for urL_space in list_of_urls:
-            # extract space name from URL
-            parsed_url = urlparse(urL_space)
-            # Extract the path and split it into segments
-            path_segments = parsed_url.path.split('/')
-            # Find the namespace segment
-            namespace_segment = path_segments[-4]
-            space_name = namespace_segment.replace('-', ' ')
-
-            articles = self.fetch_and_process_xwiki_data(urL_space)
-            resulting_html += f"""<h1>Articles in {space_name} space as of {transform_datetime(str_now)}</h1>
-                <table>
-                    <tr>
-                        <th><b>Article</b></th>
-                        <th><b>Created</b></th>
-                        <th><b>Modified</b></th>
-                        <th><b>Creator</b></th>
-                    </tr>
-                """
-            for article in articles:
-                resulting_html += f"""<tr>
-                        <td><a href="{article[1]['page_url']}">{article[0]}</a></td>
-                        <td>{transform_datetime(article[1]['created'])}</td>
-                        <td>{transform_datetime(article[1]['latest_modified'])}</td>
-                        <td>{article[1]['creator_without_prefix']}</td>
-                    </tr>
-                """
-            resulting_html += "</table>"
-        resulting_html += "</body>"
-        html_filename = f"outputs/articles_in_all_spaces.html"
-        if not os.path.exists(html_filename):
-            with open(html_filename, 'w') as f:
-                f.write(resulting_html)
-            print(f"Created HTML file: {html_filename}\n")
+        Runs fetch_and_process_xwiki_data for every space. With parallel on, all spaces are crawled at the same
+        time over the shared connection pool, still bounded by the global max_in_flight request budget,
+        so the whole crawl takes about as long as the slowest space.
+
+        Args:
+            space_urls (list): The URLs of the XWiki spaces to fetch data from.
+            parallel (bool): Crawl the spaces concurrently, defaults to the "parallel_spaces" setting.
+            incremental (bool): See fetch_and_process_xwiki_data, defaults to the "incremental" setting.
+
+        Returns:
+            list: The result of fetch_and_process_xwiki_data for every space, in the order of space_urls.
+            A space whose listing failed keeps its articles of the latest snapshot of the inventory store,
+            none if there are none, so the other spaces are still crawled and published.
+            The results are also recorded as a new snapshot of the inventory store.
+        """
+        if parallel is None:
+            parallel = self.parallel_spaces
+        def fetch_space(space_url):
+            try:
+                return self.fetch_and_process_xwiki_data(space_url, incremental=incremental)
+            except TransportError as error:
+                self._report_failure("listing", space_url, space_url, error)
+                space = self._space_name_from_url(space_url)
+                stored = self.articles_from_store(space) or []
+                print(f"Keeping the {len(stored)} stored articles of {space}")
+                return stored
+
+        if not parallel or len(space_urls) < 2:
+            spaces_articles = [fetch_space(space_url) for space_url in space_urls]
         else:
-            print("HTML file already exists: " + html_filename)
+            with ThreadPoolExecutor(max_workers=len(space_urls)) as executor:
+                spaces_articles = list(executor.map(fetch_space, space_urls))
+        if self.inventory_store is not None:
+            snapshot = self.inventory_store.record_snapshot(
+                {self._space_name_from_url(space_url): articles
+                 for space_url, articles in zip(space_urls, spaces_articles)})
+            print(f"Recorded inventory snapshot {snapshot}")
+        return spaces_articles
+
+    def select_space_urls(self, space_names):
+        """
+        Returns the children pages URLs of the configured spaces with the given names, in inventory order.
+
+        Raises:
+            ValueError: If a name is not one of the configured spaces.
+        """
+        space_urls = {self._space_name_from_url(space_url): space_url for space_url in self.space_urls()}
+        unknown = [name for name in space_names if name not in space_urls]
+        if unknown:
+            raise ValueError(f"Unknown space {', '.join(unknown)}, expected one of {', '.join(space_urls)}")
+        return [space_url for name, space_url in space_urls.items() if name in space_names]
+
+    def articles_from_store(self, space_name):
+        """Returns the articles of the latest snapshot of a space in the inventory store, None if there is none"""
+        if self.inventory_store is None:
+            return None
+        rows = self.inventory_store.find_articles(space=space_name)
+        if not rows:
+            return None
+        return [ArticleRecord(row["title"], row["page_url"], row["version"], created=row["created"],
+                              modified=row["modified"], creator=row["creator"] or '', modifier=row["modifier"] or '')
+                for row in rows]
+
+    def _matching_articles(self, patterns, articles_by_space, space_names):
+        """
+        Returns the page URLs of the known articles of the given spaces whose page URL or title matches one of
+        the fnmatch patterns, keyed by space. A pattern without wildcards naming an article not known yet
+        is taken as the page URL of a new article of the space found in its path.
+        """
+        matches = {}
+        for pattern in patterns:
+            matched = False
+            for space in space_names:
+                for article in articles_by_space.get(space) or ():
+                    if fnmatch.fnmatchcase(article.page_url, pattern) or fnmatch.fnmatchcase(article.title, pattern):
+                        matches.setdefault(space, set()).add(article.page_url)
+                        matched = True
+            if not matched and not any(char in pattern for char in '*?[') and '/bin/view/' in pattern:
+                for space in space_names:
+                    if f"/{space}/" in pattern:
+                        matches.setdefault(space, set()).add(pattern)
+                        matched = True
+                        break
+            if not matched:
+                print(f"No article matches {pattern}")
+        return matches
+
+    @suppress_insecure_and_resource_warnings
+    def refresh(self, space_urls=None, articles=None, since=None, known=None) -> dict:
+        """
+        Refreshes part of the inventory and returns the whole of it, so a fix to one space or article is
+        published in seconds instead of a crawl of the whole wiki. The spaces out of space_urls are taken
+        from the latest snapshot of the inventory store and only crawled when the store has none of them.
+        The refreshed spaces are crawled in full, unless articles or since narrow the refresh:
+        - articles refetches only the matching articles, one page request each.
+        - since lists only the articles modified since then with the query endpoint and refetches those.
+          Articles deleted in the meantime stay in the inventory until the next full crawl of their space.
+        Narrowed refreshes of the spaces are recorded as a new snapshot of the inventory store.
+
+        Args:
+            space_urls (list): The children pages URLs of the spaces to refresh, defaults to all of them.
+            articles (list): Page URLs of articles, or fnmatch patterns matched against the page URL and title
+                             of the articles known in the refreshed spaces, e.g. "*/How-to/Configure-*".
+            since (int): Epoch, only refresh the articles modified at or after it.
+            known (dict): Articles of the spaces already at hand, keyed by space name, used instead of
+                          the inventory store, e.g. the inventory kept in memory by inventory_daemon.py.
+
+        Returns:
+            dict: The articles of every configured space, keyed by space name, in inventory order.
+        """
+        if space_urls is None:
+            space_urls = self.space_urls()
+        narrowed = bool(articles) or since is not None
+        articles_by_space = {}
+        to_crawl = []
+        for space_url in self.space_urls():
+            space = self._space_name_from_url(space_url)
+            # an empty space at hand is known all the same, only a missing one is taken from the store
+            if known is not None and space in known:
+                articles_by_space[space] = known[space]
+            else:
+                articles_by_space[space] = self.articles_from_store(space)
+            if articles_by_space[space] is None:
+                print(f"No stored inventory of {space}, crawling it")
+                to_crawl.append(space_url)
+            elif space_url in space_urls and not narrowed:
+                to_crawl.append(space_url)
+        if to_crawl:
+            for space_url, crawled in zip(to_crawl, self.fetch_all_spaces(to_crawl)):
+                articles_by_space[self._space_name_from_url(space_url)] = crawled
+
+        # spaces crawled above are up to date already
+        narrowed_urls = [space_url for space_url in space_urls if space_url not in to_crawl]
+        refreshed = {}
+        if since is not None:
+            for space_url in narrowed_urls:
+                space = self._space_name_from_url(space_url)
+                try:
+                    with self.metrics.timer("crawl", self.transport.space_key(space_url)):
+                        refreshed[space] = self._fetch_space_with_query(space_url, since=since,
+                                                                         depth=self.crawl_depth)
+                except TransportError as error:
+                    self._report_failure("query", space_url, space_url, error)
+                    continue
+                print(f"{len(refreshed[space])} articles of {space} modified since "
+                      f"{datetime.fromtimestamp(since, timezone.utc):%Y-%m-%d %H:%M:%S} UTC")
+        if articles:
+            matches = self._matching_articles(articles, articles_by_space,
+                                              [self._space_name_from_url(space_url) for space_url in narrowed_urls])
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for space, page_urls in matches.items():
+                    results = list(executor.map(self._try_fetch_article_record, sorted(page_urls)))
+                    records = [record for record in results if isinstance(record, ArticleRecord)]
+                    refreshed.setdefault(space, []).extend(records)
+                    failed = sum(isinstance(record, TransportError) for record in results)
+                    print(f"Refetched {len(records)} articles of {space}, "
+                          f"{len(page_urls) - len(records) - failed} not found, {failed} failed")
+            self.metadata_cache.save()
+
+        for space, records in refreshed.items():
+            merged = {article.page_url: article for article in articles_by_space[space]}
+            merged.update((record.page_url, record) for record in records)
+            articles_by_space[space] = sorted(merged.values(), key=attrgetter('created'))
+        if refreshed and self.inventory_store is not None:
+            snapshot = self.inventory_store.record_snapshot({space: articles_by_space[space] for space in refreshed})
+            print(f"Recorded inventory snapshot {snapshot}")
+        self.last_inventory = articles_by_space
+        return articles_by_space
+
+    def _fetch_modifications(self, since):
+        """
+        Reads the wiki modifications feed, newest first, feed_page_size entries per request.
+
+        Args:
+            since (int): Epoch, only the modifications made after it are read.
+
+        Returns:
+            list: Dicts with page_href (REST URL of the modified page), version and modified (epoch),
+                  or None if the feed could not be read.
+        """
+        wiki_root = self.gk_children_pages_url.split('/spaces/', 1)[0]
+        history_summary_tag = f"{{{self.ns['xwiki']}}}historySummary"
+        modifications = []
+        start = 0
+        while True:
+            try:
+                response = self.transport.get(f"{wiki_root}/modifications", phase="feed",
+                                              params={'start': start, 'number': self.feed_page_size,
+                                                      'date': since * 1000})
+            except TransportError as error:
+                print(f"Failed to read the modifications feed: {error}")
+                return None
+            if response.status_code != 200:
+                print(f"Failed to read the modifications feed: {response.status_code}")
+                return None
+            with self.metrics.timer("parse"):
+                summaries = ET.fromstring(response.text).findall(f".//{history_summary_tag}")
+                for summary in summaries:
+                    page_href = None
+                    for link in summary.findall('xwiki:link', self.ns):
+                        # the page, or one of its revisions, .../pages/WebHome/history/2.1
+                        match = re.match(r'(.*/pages/[^/]+)(/history/[^/]+)?$', link.get('href', ''))
+                        if match:
+                            page_href = match.group(1)
+                    modified = summary.findtext('xwiki:modified', None, self.ns)
+                    if page_href is not None and modified is not None:
+                        modifications.append({'page_href': page_href,
+                                              'version': summary.findtext('xwiki:version', None, self.ns),
+                                              'modified': xwiki_timestamp_to_epoch(modified)})
+            if len(summaries) < self.feed_page_size:
+                return modifications
+            start += self.feed_page_size
+
+    def _apply_modifications(self, articles_by_space, modifications):
+        """
+        Patches articles_by_space in place with the modifications of the feed made to the configured spaces,
+        see update_from_feed.
+
+        Returns:
+            dict: The number of articles created, updated, deleted, moved and failed, the names of the changed
+                  spaces and retry_from, the earliest modification of a failed article or None, so the feed
+                  is read again from there.
+        """
+        space_names = {self._rest_page_to_view_url(space_url.rsplit('/children', 1)[0]):
+                       self._space_name_from_url(space_url) for space_url in self.space_urls()}
+        # the latest version of every article modified, the feed is newest first
+        latest = {}
+        for modification in modifications:
+            if not modification['page_href'].endswith('/pages/WebHome'):
+                continue
+            page_url = self._rest_page_to_view_url(modification['page_href'])
+            space = None
+            for space_prefix, name in space_names.items():
+                # nested pages count as deep as the spaces are crawled, see _crawl_space
+                level = page_url[len(space_prefix):].rstrip('/').count('/') + 1
+                if (page_url.startswith(space_prefix) and page_url != space_prefix
+                        and (not self.crawl_depth or level <= self.crawl_depth)):
+                    space = name
+                    break
+            if space is None or page_url in latest:
+                continue
+            if "xwiki-sup" in self.url_classifier.clear_page_url(page_url):
+                continue
+            latest[page_url] = (space, modification['version'], modification['modified'])
+
+        by_url = {space: {article.page_url: article for article in articles or ()}
+                  for space, articles in articles_by_space.items()}
+        to_fetch = [(space, page_url) for page_url, (space, version, _) in latest.items()
+                    if by_url[space].get(page_url) is None or by_url[space][page_url].version != version]
+        counts = {"created": 0, "updated": 0, "deleted": 0, "moved": 0, "failed": 0, "changed_spaces": set(),
+                  "retry_from": None}
+        created = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            records = list(executor.map(lambda item: self._try_fetch_article_record(item[1]), to_fetch))
+            for (space, page_url), record in zip(to_fetch, records):
+                if isinstance(record, TransportError):
+                    # the known article, if any, is kept until its modification is read again
+                    counts["failed"] += 1
+                    modified = latest[page_url][2]
+                    counts["retry_from"] = min(counts["retry_from"] or modified, modified)
+                    continue
+                if record is None:
+                    if by_url[space].pop(page_url, None) is None:
+                        continue
+                    counts["deleted"] += 1
+                elif page_url in by_url[space]:
+                    by_url[space][page_url] = record
+                    counts["updated"] += 1
+                else:
+                    by_url[space][page_url] = record
+                    created.append(record)
+                counts["changed_spaces"].add(space)
+
+            # a moved article keeps its creation date and creator, its page at the old URL is gone
+            if created:
+                origins = {}
+                for space, articles in by_url.items():
+                    for article in articles.values():
+                        if article.page_url not in latest:
+                            origins.setdefault((article.created, article.creator), []).append((space, article))
+                candidates = [(record.page_url, origin) for record in created
+                              for origin in origins.get((record.created, record.creator), ())]
+                moved = set()
+                for (page_url, (space, article)), found in zip(candidates, executor.map(
+                        lambda candidate: self._try_fetch_article_record(candidate[1][1].page_url), candidates)):
+                    if found is None:
+                        by_url[space].pop(article.page_url, None)
+                        counts["changed_spaces"].add(space)
+                        moved.add(page_url)
+                counts["moved"] = len(moved)
+            counts["created"] = len(created) - counts["moved"]
+        self.metadata_cache.save()
+
+        for space in counts["changed_spaces"]:
+            articles_by_space[space] = sorted(by_url[space].values(), key=attrgetter('created'))
+        return counts
+
+    @suppress_insecure_and_resource_warnings
+    def update_from_feed(self, known=None, reconcile=None) -> dict:
+        """
+        Brings the inventory up to date from the wiki modifications feed, so the cost of an update follows the rate
+        of change rather than the size of the wiki: only the modifications made since the high-water mark of
+        the previous update are read, and only the articles of the configured spaces they touch are refetched.
+        Created and updated articles are fetched, articles whose page is gone are removed as deleted, and a new
+        article with the creation date and creator of a known article whose page is gone is counted as moved.
+        The feed only lists pages that still exist, so pages deleted or moved out of the spaces without a later
+        modification are caught by the reconciliation: when there is no high-water mark yet, when the feed
+        cannot be read and every reconcile_interval seconds, every space is listed again in incremental mode,
+        which refetches the articles whose version changed and drops the articles no longer listed.
+
+        Args:
+            known (dict): Articles of the spaces already at hand, keyed by space name, used instead of
+                          the inventory store, e.g. the inventory kept in memory by inventory_daemon.py.
+            reconcile (bool): Reconcile (True) or not (False) whether due or not, defaults to when due.
+
+        Returns:
+            dict: The articles of every configured space, keyed by space name, in inventory order.
+            Changed spaces are recorded as a new snapshot of the inventory store.
+        """
+        now = int(datetime.now(timezone.utc).timestamp())
+        space_urls = self.space_urls()
+        articles_by_space = {}
+        for space_url in space_urls:
+            space = self._space_name_from_url(space_url)
+            if known is not None and space in known:
+                articles_by_space[space] = known[space]
+            else:
+                articles_by_space[space] = self.articles_from_store(space)
+        if reconcile is None:
+            reconcile = (self.feed_state.is_reconciliation_due(now, self.reconcile_interval)
+                         or any(articles is None for articles in articles_by_space.values()))
+
+        modifications = None
+        if not reconcile:
+            with self.metrics.timer("feed"):
+                modifications = self._fetch_modifications(self.feed_state.high_water_mark - self.feed_overlap)
+        if modifications is None:
+            print("Reconciling the inventory with a listing of every space")
+            spaces_articles = self.fetch_all_spaces(space_urls, incremental=True)
+            articles_by_space = {self._space_name_from_url(space_url): articles
+                                 for space_url, articles in zip(space_urls, spaces_articles)}
+            # modifications made during the crawl are read again by the next update
+            self.feed_state.advance(now, reconciled_at=now)
+        else:
+            counts = self._apply_modifications(articles_by_space, modifications)
+            print(f"{len(modifications)} modifications since the last update: {counts['created']} created, "
+                  f"{counts['updated']} updated, {counts['deleted']} deleted, {counts['moved']} moved, "
+                  f"{counts['failed']} failed")
+            if counts["changed_spaces"] and self.inventory_store is not None:
+                snapshot = self.inventory_store.record_snapshot(
+                    {space: articles_by_space[space] for space in counts["changed_spaces"]})
+                print(f"Recorded inventory snapshot {snapshot}")
+            high_water_mark = max((modification['modified'] for modification in modifications),
+                                  default=self.feed_state.high_water_mark)
+            if counts["retry_from"] is not None:
+                # the failed articles are fetched again by the next update
+                high_water_mark = min(high_water_mark, counts["retry_from"] - 1)
+            self.feed_state.advance(high_water_mark)
+        self.last_inventory = articles_by_space
+        return articles_by_space
+
+    @suppress_insecure_and_resource_warnings
+    def create_html_for_all_spaces(self, articles_by_space=None):
+        """
+        Crawls all configured spaces and streams one HTML table per space to html_file,
+        outputs/articles_in_all_spaces.html. Nothing is crawled if the file already exists, it is published as is,
+        unless replaying a capture: a replay always replays the crawl.
+
+        Args:
+            articles_by_space (dict): Optional articles of every space keyed by space name, e.g. from refresh().
+                                      They are rendered instead of crawling, the file is overwritten if it exists.
+
+        Returns:
+            str: The name of the HTML file.
+        """
+        html_filename = self.html_file
+        if articles_by_space is None:
+            if os.path.exists(html_filename) and not self.transport.replaying:
+                print("HTML file already exists: " + html_filename)
+                return html_filename
+            list_of_urls = self.space_urls()
+            spaces_articles = self.fetch_all_spaces(list_of_urls)
+            articles_by_space = {self._space_name_from_url(space_url): articles
+                                 for space_url, articles in zip(list_of_urls, spaces_articles)}
+
+        str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
+        self.last_inventory = articles_by_space
+        os.makedirs(os.path.dirname(html_filename), exist_ok=True)
+        with self.metrics.timer("render"), self.profiler.phase("render"), open(html_filename, 'w') as f:
+            f.write(renderer.HTML_STYLE)
+            f.write("<body>\n")
+            for space_name, articles in articles_by_space.items():
+                renderer.write_html_table(f, f"Articles in {space_name.replace('-', ' ')} space as of "
+                                             f"{transform_datetime(str_now)}",
+                                          articles, format_date=renderer.long_datetime)
+            f.write("</body>")
+        print(f"Created HTML file: {html_filename}\n")
 
         return html_filename
 
     @suppress_insecure_and_resource_warnings
-    def update_article(self, article_url):
-        headers = {
-            'Content-Type': 'text/plain',
-            'Authorization': f"{get_value_from_secret_file_json('bearer_token')}"
-        }
+    def update_article(self, article_url, force=False):
+        """
+        Publishes the HTML file to the given page, unless its content hash equals the hash of the content
+        last published there. When the spaces were crawled in this run, the added, removed and modified articles
+        of every space since the last publish are reported as well.
 
-        if os.path.exists(self.html_file):
-            with open(self.html_file, 'r') as f:
-                data = "{{html}}"
-                data += f.read()
-                data += "{{/html}}"
-            response = requests.put(article_url, headers=headers, data=data, verify=False)
-
-            if response.status_code == 202:
-                print('Page updated successfully.')
-                self._clean_up()
+        Args:
+            article_url (str): The REST URL of the inventory page.
+            force (bool): Publish even if the content is unchanged.
+
+        Returns:
+            dict: The per-space delta, see publish_state.inventory_delta, or None if nothing was crawled in this run.
+        """
+        if not os.path.exists(self.html_file):
+            return None
+        with open(self.html_file, 'r') as f:
+            content = f.read()
+
+        delta = None
+        inventory = self.publish_state.inventory(article_url)
+        if self.last_inventory is not None:
+            delta, inventory = self._report_delta(article_url, self.last_inventory)
+
+        # a replay publishes nothing, there is nothing to archive or clean up either
+        if self._publish_page(article_url, content, force, inventory) not in ("failed", "replayed"):
+            self._clean_up()
+        return delta
+
+    def _report_delta(self, article_url, articles_by_space):
+        """
+        Prints the added, removed and modified articles of every space since the last publish to article_url.
+
+        Returns:
+            tuple: The per-space delta and the inventory of articles_by_space, see publish_state.
+        """
+        inventory = inventory_of(articles_by_space)
+        delta = inventory_delta(self.publish_state.inventory(article_url), inventory)
+        for space, changes in delta.items():
+            print(f"{space}: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+                  f"{len(changes['modified'])} modified since the last publish")
+        return delta, inventory
+
+    @suppress_insecure_and_resource_warnings
+    def _publish_page(self, page_url, content, force=False, inventory=None):
+        """
+        Wraps the HTML content in the html macro and PUTs it to the page, unless the content hash equals
+        the hash of the content last published there. The new hash is recorded once the page is updated.
+        Nothing is published while replaying a capture.
+
+        Args:
+            page_url (str): The REST URL of the page, created if missing.
+            content (str): The HTML content of the page.
+            force (bool): Publish even if the content is unchanged.
+            inventory (dict): Inventory recorded along with the hash, see publish_state.inventory_of.
+
+        Returns:
+            str: "unchanged", "published", "replayed" or "failed".
+        """
+        if self.transport.replaying:
+            print(f'Replaying a capture, {page_url} is not updated.')
+            return "replayed"
+        with self.profiler.phase("publish"):
+            digest = content_hash(content)
+            if not force and self.publish_state.is_unchanged(page_url, digest):
+                print(f'Content of {page_url} is unchanged since the last publish, skipping the update.')
+                return "unchanged"
+
+            headers = {
+                'Content-Type': 'text/plain',
+                'Authorization': f"{self.transport.get_secret('bearer_token')}"
+            }
+            data = "{{html}}"
+            data += content
+            data += "{{/html}}"
+            response = self.transport.put(page_url, headers=headers, data=data)
+
+            # 201 when the page was created, 202 when an existing page was updated
+            if response.status_code in (201, 202):
+                print(f'Page {page_url} updated successfully.')
+                self.publish_state.record(page_url, digest, inventory)
+                return "published"
+            print(f'Failed to update page {page_url}. Status code: {response.status_code}')
+            print('Response content:', response.content)
+            return "failed"
+
+    @staticmethod
+    def _shard_page_url(article_url, shard_name):
+        """
+        Returns the REST URL of a shard page of the inventory page, a child page of a non-terminal page
+        or a sibling page of a terminal one, e.g.
+        .../spaces/VB365/spaces/Inventory/pages/WebHome -> .../spaces/VB365/spaces/Inventory/spaces/How-to/pages/WebHome
+        .../spaces/VB365/pages/Inventory -> .../spaces/VB365/pages/Inventory-How-to
+        """
+        prefix, page = article_url.rsplit('/pages/', 1)
+        if page == 'WebHome':
+            return f"{prefix}/spaces/{shard_name}/pages/WebHome"
+        return f"{prefix}/pages/{page}-{shard_name}"
+
+    @staticmethod
+    def _shard_name(space, part):
+        """Returns the name of a shard page of a space, e.g. "How-to" for its first part and "How-to-2" for the next"""
+        return space if part == 1 else f"{space}-{part}"
+
+    def _inventory_shards(self, articles_by_space):
+        """
+        Splits the articles of every space into shards of at most shard_rows articles.
+        Articles are sorted by creation, so new articles only ever change the last shard of their space.
+
+        Returns:
+            list: (shard_name, space_name, part, parts, articles) tuples, e.g. ("How-to-2", "How-to", 2, 3, [...]).
+        """
+        shards = []
+        for space, articles in articles_by_space.items():
+            parts = max(1, -(-len(articles) // self.shard_rows))
+            for part in range(parts):
+                shards.append((self._shard_name(space, part + 1), space, part + 1, parts,
+                               articles[part * self.shard_rows:(part + 1) * self.shard_rows]))
+        return shards
+
+    @suppress_insecure_and_resource_warnings
+    def publish_sharded(self, article_url, force=False, articles_by_space=None):
+        """
+        Crawls all configured spaces and publishes one page per space, split every shard_rows articles,
+        plus an index page at article_url linking the shards. The shards are uploaded in parallel over the pooled
+        connections and only the shards whose content changed since the last publish are uploaded at all,
+        so publish time and page size follow the changed shard rather than the whole inventory.
+        The shards left over from a space that shrank, or is gone, are blanked and forgotten.
+
+        Args:
+            article_url (str): The REST URL of the index page.
+            force (bool): Publish every shard, changed or not.
+            articles_by_space (dict): Optional articles of every space keyed by space name, e.g. from refresh(),
+                                      published instead of crawling.
+
+        Returns:
+            dict: The per-space delta since the last publish, see publish_state.inventory_delta.
+        """
+        as_of = transform_datetime(datetime.now(timezone.utc).strftime("%Y_%m_%d"))
+        if articles_by_space is None:
+            list_of_urls = self.space_urls()
+            spaces_articles = self.fetch_all_spaces(list_of_urls)
+            articles_by_space = {self._space_name_from_url(space_url): articles
+                                 for space_url, articles in zip(list_of_urls, spaces_articles)}
+        self.last_inventory = articles_by_space
+        delta, inventory = self._report_delta(article_url, self.last_inventory)
+
+        with self.metrics.timer("render"), self.profiler.phase("render"):
+            pages = []
+            index_rows = []
+            for shard_name, space, part, parts, articles in self._inventory_shards(self.last_inventory):
+                shard_url = self._shard_page_url(article_url, shard_name)
+                title = space.replace('-', ' ')
+                if parts > 1:
+                    title += f", part {part} of {parts}"
+                out = io.StringIO()
+                out.write(renderer.HTML_STYLE)
+                out.write("<body>\n")
+                renderer.write_html_table(out, f"Articles in {title} space as of {as_of}", articles,
+                                          format_date=renderer.long_datetime)
+                out.write("</body>")
+                pages.append((shard_url, out.getvalue()))
+                index_rows.append((title, self._rest_page_to_view_url(shard_url), len(articles)))
+
+        shards = {}
+        for _, space, _, parts, _ in self._inventory_shards(self.last_inventory):
+            shards[space] = parts
+        stale = [(self._shard_page_url(article_url, self._shard_name(space, part)), space)
+                 for space, parts in self.publish_state.shards(article_url).items()
+                 for part in range(shards.get(space, 0) + 1, parts + 1)]
+        blank = (f"{renderer.HTML_STYLE}<body>\n<p>No longer part of the inventory, see "
+                 f"<a href=\"{self._rest_page_to_view_url(article_url)}\">the index page</a>.</p>\n</body>")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda page: self._publish_page(*page, force=force), pages))
+            blanked = list(executor.map(lambda shard: self._publish_page(shard[0], blank, force=True), stale))
+        print(f"Shards: {results.count('published')} published, {results.count('unchanged')} unchanged, "
+              f"{results.count('failed')} failed, {blanked.count('published')} blanked")
+        for (shard_url, space), result in zip(stale, blanked):
+            if result == "published":
+                self.publish_state.forget(shard_url)
             else:
-                print(f'Failed to update page. Status code: {response.status_code}')
-                print('Response content:', response.content)
+                # blanked again by the next publish
+                shards[space] = max(shards.get(space, 0), self.publish_state.shards(article_url)[space])
+        self.publish_state.record_shards(article_url, shards)
+
+        out = io.StringIO()
+        out.write(renderer.HTML_STYLE)
+        out.write("<body>\n")
+        renderer.write_html_index(out, f"Articles in all spaces as of {as_of}", index_rows)
+        out.write("</body>")
+        # the inventory is only updated with every shard in place, the next delta is reported against the last one
+        if self._publish_page(article_url, out.getvalue(), force,
+                              inventory if "failed" not in results else None) != "replayed":
+            self._clean_up()
+        return delta
+
+    def publish(self, articles_by_space=None, force=False):
+        """
+        Publishes the inventory to inventory_resulting_article in the configured publish_mode.
+
+        Args:
+            articles_by_space (dict): Optional articles of every space keyed by space name, e.g. from refresh(),
+                                      all spaces are crawled when missing.
+            force (bool): Publish even if the content is unchanged.
+
+        Returns:
+            dict: The per-space delta since the last publish, see publish_state.inventory_delta.
+        """
+        if self.publish_mode == "sharded":
+            return self.publish_sharded(self.inventory_resulting_article, force=force,
+                                        articles_by_space=articles_by_space)
+        self.create_html_for_all_spaces(articles_by_space)
+        return self.update_article(self.inventory_resulting_article, force=force)
 
     def _clean_up(self):
-        """Adds timestamp to HTML file and renames it so that it is not used for the next update"""
+        """
+        Archives the inventory crawled in this run, applies the archive retention policy and removes
+        the published HTML file so that it is not used for the next update.
+        """
+        if self.archive is not None and self.last_inventory is not None:
+            snapshot = self.archive.add(self.last_inventory)
+            deleted_snapshots, deleted_chunks = self.archive.prune()
+            print(f"Archived inventory snapshot {snapshot}, pruned {deleted_snapshots} snapshots "
+                  f"and {deleted_chunks} chunks")
+        if os.path.exists(self.html_file):
+            os.remove(self.html_file)
+            print(f"Removed HTML file {self.html_file}")
+
+    def write_metrics(self):
+        """Writes the run report to metrics_report and the Prometheus textfile to metrics_textfile, if set"""
+        if self.metrics_report:
+            self.metrics.write_report(self.metrics_report)
+            print(f"Run report written to {self.metrics_report}")
+        if self.metrics_textfile:
+            self.metrics.write_prometheus(self.metrics_textfile)
+
+    def close(self):
+        """
+        Releases the pooled connections, persists the session cookies for the next run and writes the run metrics
+        """
+        self.transport.close()
         try:
-            self.html_file = self.html_file.replace(".html",
-                                                    f"_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.html")
-            os.rename("outputs/articles_in_all_spaces.html", self.html_file)
-            print(f"Renamed HTML file to {self.html_file}")
-        except Exception as e:
-            print("Failed to rename HTML file")
+            self.write_metrics()
+            self.profiler.write()
+        finally:
+            if self.inventory_store is not None:
+                self.inventory_store.close()
+
 
+def _parse_since(value):
+    """Parses --since: an epoch, an ISO 8601 date or date and time (UTC unless an offset is given) or an age, e.g. 2h"""
+    age = re.fullmatch(r'(\d+)([mhd])', value)
+    if age:
+        unit = {'m': 60, 'h': 3600, 'd': 86400}[age.group(2)]
+        return int(datetime.now(timezone.utc).timestamp()) - int(age.group(1)) * unit
+    if value.isdigit():
+        return int(value)
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timestamp {value!r}, expected e.g. 1683705600, "
+                                         f"2023-05-10, 2023-05-10T08:00:00Z or 12h")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
 
-def main():
-    xwiki_fetcher = XWikiAPIFetcher()
-    xwiki_fetcher.create_html_for_all_spaces()
-    html_article = xwiki_fetcher.inventory_resulting_article
-    xwiki_fetcher.update_article(html_article)
+
+def main(argv=None):
+    """
+    Command line entry point. Without arguments every space is crawled and the inventory page is published, e.g.
+        python main.py
+        python main.py --space How-to --since 2h
+        python main.py --article '*/How-to/Configure-*' --sinks json md --no-publish
+        python main.py --space General-Knowledge --max-in-flight 4 --pool-size 4 --publish-mode sharded
+        python main.py --feed
+    Selecting spaces or articles, or passing --since, refreshes only these, the rest of the inventory comes from
+    the latest snapshot of the inventory store, see XWikiAPIFetcher.refresh.
+    """
+    parser = argparse.ArgumentParser(description="Inventory the XWiki knowledge base spaces and publish the result")
+    selection = parser.add_argument_group("selection")
+    selection.add_argument("--space", action="append", dest="spaces", metavar="NAME",
+                           help="refresh only this space, e.g. How-to, may be repeated")
+    selection.add_argument("--article", action="append", dest="articles", metavar="URL_OR_GLOB",
+                           help="refresh only the articles with this page URL, or whose page URL or title match "
+                                "this glob, may be repeated")
+    selection.add_argument("--since", type=_parse_since, metavar="TIMESTAMP",
+                           help="refresh only the articles modified since TIMESTAMP: epoch, ISO date or date and time "
+                                "(UTC by default) or age such as 30m, 12h, 7d")
+    selection.add_argument("--feed", action="store_true",
+                           help="apply the modifications of the wiki since the last update, reconciling when due")
+    selection.add_argument("--reconcile", action="store_true",
+                           help="list every space again and reset the modifications feed high-water mark")
+    tuning = parser.add_argument_group("tuning, overriding the settings of configs/api_secret.json")
+    tuning.add_argument("--max-in-flight", type=int, help="requests in flight across all spaces, at start")
+    tuning.add_argument("--max-in-flight-ceiling", type=int, help="upper bound of the adaptive in flight budget")
+    tuning.add_argument("--max-workers", type=int, help="threads per space fetching article metadata")
+    tuning.add_argument("--pool-size", type=int, help="keep-alive connections kept per host")
+    tuning.add_argument("--serial-spaces", action="store_true", help="crawl the spaces one after the other")
+    tuning.add_argument("--backend", choices=["rest", "query"])
+    tuning.add_argument("--history-mode", choices=["lean", "deep"])
+    tuning.add_argument("--depth", type=int, help="levels of nested pages crawled per space, 0 for no limit")
+    tuning.add_argument("--incremental", action="store_true", default=None,
+                        help="refetch only the articles whose version changed")
+    tuning.add_argument("--profile", action="store_true", help="profile the phases of the run to outputs/profile_*")
+    output = parser.add_argument_group("output")
+    output.add_argument("--sinks", nargs="+", choices=sorted(SPACE_SINKS),
+                        help="also write the files of the selected spaces in these formats")
+    output.add_argument("--no-publish", dest="publish", action="store_false",
+                        help="do not publish the inventory, only write it to outputs/articles_in_all_spaces.html "
+                             "unless --sinks is given")
+    output.add_argument("--publish-mode", choices=["single", "sharded"])
+    output.add_argument("--force", action="store_true", help="publish even if the content is unchanged")
+    args = parser.parse_args(argv)
+
+    settings = {name: value for name, value in (("max_in_flight", args.max_in_flight),
+                                                ("max_in_flight_ceiling", args.max_in_flight_ceiling),
+                                                ("max_workers", args.max_workers), ("pool_size", args.pool_size),
+                                                ("backend", args.backend), ("history_mode", args.history_mode),
+                                                ("crawl_depth", args.depth),
+                                                ("incremental", args.incremental),
+                                                ("publish_mode", args.publish_mode)) if value is not None}
+    if args.serial_spaces:
+        settings["parallel_spaces"] = False
+    if args.profile:
+        settings["profile"] = True
+
+    xwiki_fetcher = XWikiAPIFetcher(settings)
+    try:
+        try:
+            space_urls = xwiki_fetcher.select_space_urls(args.spaces) if args.spaces else xwiki_fetcher.space_urls()
+        except ValueError as error:
+            parser.error(str(error))
+        articles_by_space = None
+        if args.feed or args.reconcile:
+            if args.spaces or args.articles or args.since is not None:
+                parser.error("--feed and --reconcile update every space, they exclude --space, --article and --since")
+            articles_by_space = xwiki_fetcher.update_from_feed(reconcile=True if args.reconcile else None)
+        elif args.spaces or args.articles or args.since is not None or args.sinks or not args.publish:
+            articles_by_space = xwiki_fetcher.refresh(space_urls if args.spaces else None, args.articles, args.since)
+        if args.sinks:
+            for space_url in space_urls:
+                space_name = xwiki_fetcher._space_name_from_url(space_url)
+                process_space(space_url, space_name, xwiki_fetcher, articles_by_space[space_name], sinks=args.sinks)
+        if args.publish:
+            xwiki_fetcher.publish(articles_by_space, force=args.force)
+        elif not args.sinks:
+            # the run still has an output
+            xwiki_fetcher.create_html_for_all_spaces(articles_by_space)
+    finally:
+        xwiki_fetcher.close()
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -2,6 +2,117 @@ import json
 import os
 from datetime import datetime, timezone
 
+import renderer
+from article_record import ArticleRecord
+
+
+class JsonSink:
+    def __init__(self, space_name):
+        """
+        Streams the articles of a space to articles_in_<space>_space_as_of_<date>.json, one article at a time.
+        The file holds the same [title, metadata] list json.dump would write for the whole space.
+
+        Args:
+            space_name (str): The name of the XWiki space.
+
+        Returns:
+            None
+        """
+        str_now = datetime.now(timezone.utc).strftime("%m_%d_%Y")
+        self.filename = f"articles_in_{space_name}_space_as_of_{str_now}.json"
+        self._file = None
+        self._count = 0
+
+    def begin(self):
+        """Opens the JSON file, returns False if the file already exists"""
+        if os.path.exists(self.filename):
+            print("File already exists: " + self.filename)
+            return False
+        self._file = open(self.filename, 'w')
+        self._file.write("[")
+        return True
+
+    def write(self, article):
+        """Appends one ArticleRecord to the JSON list"""
+        if self._file is not None:
+            if self._count:
+                self._file.write(", ")
+            json.dump(article.to_json_item(), self._file)
+            self._count += 1
+
+    def end(self):
+        """Closes the JSON list and the file and returns the name of the JSON file"""
+        if self._file is not None:
+            self._file.write("]")
+            self._file.close()
+            self._file = None
+            print("Created json file: " + self.filename)
+        return self.filename
+
+
+class MarkdownSink:
+    def __init__(self, space_name):
+        """
+        Streams the markdown table of a space to articles_in_<space>_as_of_<date>.md, one article at a time.
+
+        Args:
+            space_name (str): The name of the XWiki space.
+
+        Returns:
+            None
+        """
+        self.str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
+        self.space_name = space_name
+        self.filename = f"articles_in_{space_name}_as_of_{self.str_now}.md"
+        self._file = None
+
+    def begin(self):
+        """Opens the markdown file and writes the table header, returns False if the file already exists"""
+        if os.path.exists(self.filename):
+            print("Md already exists: " + self.filename)
+            return False
+        self._file = open(self.filename, 'w')
+        renderer.write_md_table_head(self._file, f"Xwiki articles in <b>{self.space_name}<b> space as of "
+                                                 f"{self.str_now}:", user_column="Modifier")
+        return True
+
+    def write(self, article):
+        """Writes the row of one ArticleRecord"""
+        if self._file is not None:
+            renderer.write_md_row(self._file, article, user_field="modifier")
+
+    def end(self):
+        """Closes the file and returns the name of the markdown file"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            print(f"Created md file: {self.filename}\n")
+        return self.filename
+
+
+def _run_sink(sink, articles):
+    if sink.begin():
+        for article in articles:
+            sink.write(article)
+    return sink.end()
+
+
+def load_articles_json_file(articles_json_file):
+    """
+    Reads an articles JSON file written by create_articles_json_file back into a list of ArticleRecord.
+
+    Args:
+        articles_json_file (str): The path to the JSON file containing the articles data.
+
+    Returns:
+        list: The ArticleRecord objects stored in the file.
+
+    Raises:
+        FileNotFoundError: If the articles_json_file does not exist.
+    """
+    with open(articles_json_file, 'r') as f:
+        return ArticleRecord.from_json_items(json.load(f))
+
 
 def create_articles_json_file(space_name, list_of_articles):
     """
@@ -11,25 +122,12 @@ def create_articles_json_file(space_name, list_of_articles):
 
     Args:
         space_name (str): The name of the XWiki space.
-        list_of_articles (list): A list of dictionaries representing articles in the space.
+        list_of_articles (list): A list of ArticleRecord representing articles in the space.
 
     Returns:
         str: The name of the created or existing JSON file.
     """
-    str_now = datetime.now(timezone.utc).strftime("%m_%d_%Y")
-    temp_file_name = f"articles_in_{space_name}_space_as_of_{str_now}.json"
-
-    output_file_name = None  # define the variable before the if statement
-    if not os.path.exists(temp_file_name):
-        with open(temp_file_name, 'w') as output_file:
-            json.dump(list_of_articles, output_file)
-        print("Created json file: " + temp_file_name)
-        output_file_name = output_file.name
-    else:
-        print("File already exists: " + temp_file_name)
-        # set output_file_name to the existing file name
-        output_file_name = temp_file_name
-    return output_file_name
+    return _run_sink(JsonSink(space_name), list_of_articles)
 
 
 def create_md(space_name, articles_json_file):
@@ -46,37 +144,8 @@ def create_md(space_name, articles_json_file):
     Raises:
         FileNotFoundError: If the articles_json_file does not exist.
     """
-    str_now = datetime.now(timezone.utc).strftime("%Y_%m_%d")
-    resulting_md = f"Xwiki articles in <b>{space_name}<b> space as of {str_now}:\n"
-    resulting_md = resulting_md + ' | <b>Article</b> | <b>Created</b> | <b>Modified</b> | <b>Modifier</b> |\n'
-    resulting_md = resulting_md + ' | ---- | ------ | ---- | ---- |\n'
-
-    with open(articles_json_file, 'r') as f:
-        articles_data = json.load(f)
-
-    for article in articles_data:
-        article_name = article[0]
-        article_metadata = article[1]
-        page_url = article_metadata['page_url']
-        created = article_metadata['created']
-        latest_modified = article_metadata['latest_modified']
-        modifier = article_metadata['modifier_without_prefix']
-
-        created_date = datetime.strptime(created, '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')
-        latest_modified_date = datetime.strptime(latest_modified, '%Y-%m-%dT%H:%M:%SZ').strftime('%Y-%m-%d')
-
-        resulting_md = resulting_md + f" | [{article_name}]({page_url}) | {created_date}" \
-                                      f" | {latest_modified_date}" \
-                                      f" | {modifier} |\n"
-
-
-    md_filename = f"articles_in_{space_name}_as_of_{str_now}.md"
-
-    if not os.path.exists(md_filename):
-        with open(md_filename, 'w') as f:
-            f.write(resulting_md)
-        print(f"Created md file: {md_filename}\n")
-    else:
-        print("Md already exists: " + md_filename)
-
-    return resulting_md
+    sink = MarkdownSink(space_name)
+    if sink.begin():
+        for article in load_articles_json_file(articles_json_file):
+            sink.write(article)
+    return sink.end()
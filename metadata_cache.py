@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+
+
+class ArticleMetadataCache:
+    def __init__(self, cache_file):
+        """
+        Persistent per-article metadata cache keyed by article page_url.
+        Each entry holds created and modified (epoch seconds), creator, modifier and the page version
+        the metadata was fetched for, so that unchanged articles do not have to be fetched again.
+
+        Args:
+            cache_file (str): Path to the JSON file the cache is stored in.
+
+        Returns:
+            None
+        """
+        self.cache_file = cache_file
+        self.entries = {}
+        self._dirty = False
+        # spaces may be crawled concurrently and share the cache
+        self._lock = threading.Lock()
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"Failed to load metadata cache {cache_file}, starting with an empty one")
+
+    def get(self, page_url, version):
+        """
+        Returns the cached metadata of an article if it was fetched for the given version.
+
+        Args:
+            page_url (str): The URL of the article.
+            version (str): The current version of the article, as reported by the space listing.
+
+        Returns:
+            dict: The cached entry, or None if the article is unknown, the version is unknown or it has changed.
+        """
+        entry = self.get_any(page_url)
+        if entry is None or version is None or entry.get("version") != version:
+            return None
+        return entry
+
+    def get_any(self, page_url):
+        """
+        Returns the cached metadata of an article whatever version it was fetched for.
+        Useful for the data that never changes once an article exists, like its creation date and creator.
+
+        Args:
+            page_url (str): The URL of the article.
+
+        Returns:
+            dict: The cached entry, or None if the article is unknown.
+        """
+        entry = self.entries.get(page_url)
+        # entries written before timestamps were stored as epochs are refetched
+        if entry is None or not isinstance(entry.get("modified"), int):
+            return None
+        return entry
+
+    def put(self, page_url, version, metadata):
+        """
+        Stores the metadata of an article fetched for the given version.
+
+        Args:
+            page_url (str): The URL of the article.
+            version (str): The version of the article the metadata belongs to.
+            metadata (dict): created, modified and creator of the article, see ArticleRecord.metadata.
+        """
+        entry = dict(metadata, version=version)
+        with self._lock:
+            if self.entries.get(page_url) != entry:
+                self.entries[page_url] = entry
+                self._dirty = True
+
+    def save(self):
+        """Writes the cache to disk if anything has changed since it was loaded"""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            temp_file = self.cache_file + '.tmp'
+            with open(temp_file, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_file, self.cache_file)
+            self._dirty = False
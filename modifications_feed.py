@@ -0,0 +1,43 @@
+import json
+import os
+
+
+class FeedState:
+    def __init__(self, state_file):
+        """
+        Persisted progress of XWikiAPIFetcher.update_from_feed: the high-water mark, the epoch up to which
+        the modifications of the wiki have been applied to the inventory, and the epoch of the last full
+        reconciliation of every space.
+
+        Args:
+            state_file (str): Path to the JSON file the state is stored in.
+
+        Returns:
+            None
+        """
+        self.state_file = state_file
+        self.high_water_mark = None
+        self.reconciled_at = None
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    state = json.load(f)
+                self.high_water_mark = state.get("high_water_mark")
+                self.reconciled_at = state.get("reconciled_at")
+            except (OSError, ValueError):
+                print(f"Failed to load feed state {state_file}, the inventory will be reconciled")
+
+    def is_reconciliation_due(self, now, interval):
+        """Returns True if there is no high-water mark yet or the last reconciliation is interval seconds old"""
+        return self.high_water_mark is None or self.reconciled_at is None or now - self.reconciled_at >= interval
+
+    def advance(self, high_water_mark, reconciled_at=None):
+        """Moves the high-water mark forward, never back, records the reconciliation if given and saves the state"""
+        self.high_water_mark = max(high_water_mark, self.high_water_mark or 0)
+        if reconciled_at is not None:
+            self.reconciled_at = reconciled_at
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({"high_water_mark": self.high_water_mark, "reconciled_at": self.reconciled_at}, f)
+        os.replace(temp_file, self.state_file)
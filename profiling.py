@@ -0,0 +1,229 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# returned by Profiler.phase while profiling is off, so a disabled profiler costs a call and an attribute check
+_DISABLED = nullcontext()
+# Python 3.12+ profiles through sys.monitoring: a profile sees every thread and only one can be enabled at a time
+_PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    def __init__(self, enabled=False, output_dir='outputs', memory_samples=5, top=20):
+        """
+        Opt-in CPU and memory profiling of the pipeline phases (listing, metadata, history, render, publish).
+        Every thread keeps one cProfile profile per phase, enabled only while the thread is in the phase,
+        and the profiles of all threads are merged per phase when written. On Python 3.12+, where a profile
+        covers the whole process, there is one profile per phase instead, enabled from the first thread entering
+        the phase until the last one leaves it; a phase entered while another phase is being profiled is only
+        counted. Memory is traced with tracemalloc
+        during the first memory_samples entries of a phase only, one entry at a time, which gives the peak
+        and the top allocating lines of the phase. Allocations of other threads running at the same time are
+        counted too, so the memory figures are indicative. A phase entered while another one is active
+        in the same thread is accounted to the outer phase.
+
+        Args:
+            enabled (bool): Profile at all. When off, phase() and iterate() add next to no overhead.
+            output_dir (str): The profile_<timestamp> directory with the results is created here.
+            memory_samples (int): The number of entries of every phase bracketed with tracemalloc snapshots.
+            top (int): The number of functions and allocating lines listed per phase in the summary.
+
+        Returns:
+            None
+        """
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.memory_samples = memory_samples
+        self.top = top
+        self._profiles = []
+        self._entries = {}
+        self._allocations = {}
+        self._peaks = {}
+        self._memory_sampled = {}
+        self._sampling = False
+        # memory is only traced during the sampled entries, unless tracemalloc was already started by the caller
+        self._external_tracing = tracemalloc.is_tracing()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Python 3.12+: the profile of every phase, and the phase being profiled with its number of threads
+        self._process_profiles = {}
+        self._process_phase = None
+        self._process_threads = 0
+
+    def phase(self, name):
+        """Returns a context manager profiling its with block as part of the phase name"""
+        if not self.enabled:
+            return _DISABLED
+        return self._profile(name)
+
+    def iterate(self, name, iterable):
+        """Profiles the production of every item of iterable, e.g. a generator parsing a listing, as phase name"""
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iterable)
+
+    def _iterate(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self._profile(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def _enable_thread_profile(self, name):
+        profiles = getattr(self._local, 'profiles', None)
+        if profiles is None:
+            profiles = self._local.profiles = {}
+        if name not in profiles:
+            profiles[name] = cProfile.Profile()
+            with self._lock:
+                self._profiles.append((name, profiles[name]))
+        profiles[name].enable()
+        return profiles[name]
+
+    def _enable_process_profile(self, name):
+        with self._lock:
+            if self._process_phase is None:
+                profile = self._process_profiles.get(name) or cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    # another profiler, e.g. the caller's, is running
+                    return None
+                if name not in self._process_profiles:
+                    self._process_profiles[name] = profile
+                    self._profiles.append((name, profile))
+                self._process_phase = name
+            elif self._process_phase != name:
+                return None
+            self._process_threads += 1
+            return self._process_profiles[name]
+
+    def _disable_process_profile(self, profile):
+        with self._lock:
+            self._process_threads -= 1
+            if self._process_threads == 0:
+                profile.disable()
+                self._process_phase = None
+
+    @contextmanager
+    def _profile(self, name):
+        if getattr(self._local, 'phase', None) is not None:
+            yield
+            return
+        memory_sample = self._start_memory_sample(name)
+        self._local.phase = name
+        if _PROCESS_WIDE:
+            profile = self._enable_process_profile(name)
+        else:
+            profile = self._enable_thread_profile(name)
+        try:
+            yield
+        finally:
+            if profile is not None and _PROCESS_WIDE:
+                self._disable_process_profile(profile)
+            elif profile is not None:
+                profile.disable()
+            self._local.phase = None
+            with self._lock:
+                self._entries[name] = self._entries.get(name, 0) + 1
+            if memory_sample is not None:
+                self._end_memory_sample(name, memory_sample)
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__)))
+
+    def _start_memory_sample(self, name):
+        with self._lock:
+            if self._sampling or self._memory_sampled.get(name, 0) >= self.memory_samples:
+                return None
+            self._sampling = True
+            self._memory_sampled[name] = self._memory_sampled.get(name, 0) + 1
+        if self._external_tracing:
+            tracemalloc.reset_peak()
+            return self._snapshot(), tracemalloc.get_traced_memory()[0]
+        tracemalloc.start()
+        return None, 0
+
+    def _end_memory_sample(self, name, memory_sample):
+        start_snapshot, start_size = memory_sample
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot = self._snapshot()
+        if start_snapshot is None:
+            tracemalloc.stop()
+            statistics = snapshot.statistics('lineno')
+        else:
+            statistics = snapshot.compare_to(start_snapshot, 'lineno')
+        with self._lock:
+            allocations = self._allocations.setdefault(name, {})
+            for statistic in statistics:
+                size = statistic.size if start_snapshot is None else statistic.size_diff
+                if size > 0:
+                    line = str(statistic.traceback[0])
+                    allocations[line] = allocations.get(line, 0) + size
+            self._peaks[name] = max(self._peaks.get(name, 0), peak - start_size)
+            self._sampling = False
+
+    def write(self):
+        """
+        Writes a <phase>.pstats file per phase, loadable with pstats or snakeviz, and summary.txt with the top
+        functions by own and cumulative time and the top allocating lines of every phase,
+        to a new profile_<timestamp> directory in output_dir, and prints the top offender of every phase.
+
+        Returns:
+            str: The path of summary.txt, or None if profiling is off.
+        """
+        if not self.enabled:
+            return None
+        profile_dir = os.path.join(self.output_dir, f"profile_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}")
+        os.makedirs(profile_dir, exist_ok=True)
+        summary = io.StringIO()
+        offenders = []
+        with self._lock:
+            merged = {}
+            for name, profile in self._profiles:
+                # a profile enabled for an entry that did not call anything holds no stats, pstats rejects it
+                profile.create_stats()
+                if not profile.stats:
+                    continue
+                if name in merged:
+                    merged[name].add(profile)
+                else:
+                    merged[name] = pstats.Stats(profile)
+            for name in sorted(self._entries):
+                summary.write(f"=== {name}: {self._entries[name]} entries")
+                if name in self._peaks:
+                    summary.write(f", peak +{self._peaks[name] / 2 ** 20:.2f} MB over "
+                                  f"{self._memory_sampled[name]} sampled entries")
+                summary.write(" ===\n")
+                stats = merged.get(name)
+                if stats is not None:
+                    stats.dump_stats(os.path.join(profile_dir, f"{name}.pstats"))
+                    stats.stream = summary
+                    stats.sort_stats('tottime').print_stats(self.top)
+                    stats.sort_stats('cumulative').print_stats(self.top)
+                    (file, line, function), timing = max(stats.stats.items(), key=lambda item: item[1][2])
+                    offenders.append(f"{name}: {function} ({os.path.basename(file)}:{line}) "
+                                     f"{timing[2]:.3f}s own time")
+                allocations = sorted(self._allocations.get(name, {}).items(), key=lambda item: -item[1])
+                if allocations:
+                    summary.write("Top allocating lines:\n")
+                    for line, size in allocations[:self.top]:
+                        summary.write(f"    {size / 1024:10.1f} KiB  {line}\n")
+                summary.write("\n")
+        summary_file = os.path.join(profile_dir, 'summary.txt')
+        with open(summary_file, 'w') as f:
+            f.write(summary.getvalue())
+        print(f"Profile written to {profile_dir}, top offender per phase:")
+        for offender in offenders:
+            print(f"    {offender}")
+        return summary_file
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+# the "as of <date>" part of the headings changes every day while the inventory itself may not
+VOLATILE_HEADING = re.compile(r' as of [^<]*</h1>')
+
+
+def content_hash(content):
+    """
+    Returns a stable SHA-256 hex digest of rendered inventory content.
+    The dates of the headings are left out, so the hash only changes when the articles or the spaces change.
+    """
+    return hashlib.sha256(VOLATILE_HEADING.sub('</h1>', content).encode('utf-8')).hexdigest()
+
+
+def inventory_delta(previous, current):
+    """
+    Compares two inventories as stored by PublishState.
+
+    Args:
+        previous (dict): {space: {page_url: [title, modified]}} of the last publish.
+        current (dict): The same structure for the content about to be published.
+
+    Returns:
+        dict: {space: {"added": [page_url], "removed": [page_url], "modified": [page_url]}} for every space
+              of either inventory.
+    """
+    delta = {}
+    for space in list(current) + [space for space in previous if space not in current]:
+        before = previous.get(space, {})
+        after = current.get(space, {})
+        delta[space] = {"added": sorted(url for url in after if url not in before),
+                        "removed": sorted(url for url in before if url not in after),
+                        "modified": sorted(url for url in after if url in before and after[url] != before[url])}
+    return delta
+
+
+def inventory_of(articles_by_space):
+    """Returns the {space: {page_url: [title, modified]}} structure PublishState stores for lists of ArticleRecord"""
+    return {space: {article.page_url: [article.title, article.modified] for article in articles}
+            for space, articles in articles_by_space.items()}
+
+
+class PublishState:
+    def __init__(self, state_file):
+        """
+        Remembers, per published page URL, the hash of the last successfully published content and
+        the inventory it was rendered from, so unchanged content is not published again.
+
+        Args:
+            state_file (str): Path to the JSON file the state is stored in.
+
+        Returns:
+            None
+        """
+        self.state_file = state_file
+        self.pages = {}
+        # shards of a page may be published concurrently
+        self._lock = threading.Lock()
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, 'r') as f:
+                    self.pages = json.load(f)
+            except (OSError, ValueError):
+                print(f"Failed to load publish state {state_file}, everything will be published")
+
+    def is_unchanged(self, page_url, digest):
+        """Returns True if digest is the hash of the content last published to page_url"""
+        return self.pages.get(page_url, {}).get("hash") == digest
+
+    def inventory(self, page_url):
+        """Returns the inventory last published to page_url, or an empty one"""
+        return self.pages.get(page_url, {}).get("inventory", {})
+
+    def shards(self, page_url):
+        """Returns the number of shard pages of every space last published below the index page_url"""
+        return self.pages.get(page_url, {}).get("shards", {})
+
+    def record(self, page_url, digest, inventory=None):
+        """
+        Stores the hash and the inventory of content successfully published to page_url and saves the state.
+        Without an inventory the one recorded before is kept, so the next delta is still reported against it.
+        """
+        with self._lock:
+            previous = self.pages.get(page_url, {})
+            entry = {"hash": digest}
+            if inventory is None:
+                inventory = previous.get("inventory")
+            if inventory is not None:
+                entry["inventory"] = inventory
+            if "shards" in previous:
+                entry["shards"] = previous["shards"]
+            self.pages[page_url] = entry
+            self._save()
+
+    def record_shards(self, page_url, shards):
+        """Stores the number of shard pages of every space now published below the index page_url"""
+        with self._lock:
+            self.pages.setdefault(page_url, {})["shards"] = shards
+            self._save()
+
+    def forget(self, page_url):
+        """Drops the state of a page no longer published, e.g. a shard of a space that shrank"""
+        with self._lock:
+            if self.pages.pop(page_url, None) is not None:
+                self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.pages, f)
+        os.replace(temp_file, self.state_file)
@@ -0,0 +1,168 @@
+import time
+from functools import lru_cache
+
+# table style of the pages published to XWiki
+HTML_STYLE = """
+        <style>
+            table {
+                border-collapse: separate;
+                border-spacing: 1px;
+            }
+
+            table th, table td {
+                border: 1px solid #999999;
+                padding: 5px;
+            }
+        </style>
+"""
+
+HTML_TABLE_HEAD = """<h1>{heading}</h1>
+    <table>
+        <tr>
+            <th><b>Article</b></th>
+            <th><b>Created</b></th>
+            <th><b>Modified</b></th>
+            <th><b>{user_column}</b></th>
+        </tr>
+"""
+
+HTML_ROW = """        <tr>
+            <td><a href="{page_url}">{title}</a></td>
+            <td>{created}</td>
+            <td>{modified}</td>
+            <td>{user}</td>
+        </tr>
+"""
+
+HTML_INDEX_HEAD = """<h1>{heading}</h1>
+    <table>
+        <tr>
+            <th><b>Page</b></th>
+            <th><b>Articles</b></th>
+        </tr>
+"""
+
+HTML_INDEX_ROW = """        <tr>
+            <td><a href="{page_url}">{title}</a></td>
+            <td>{articles}</td>
+        </tr>
+"""
+
+MD_TABLE_HEAD = """{heading}
+ | <b>Article</b> | <b>Created</b> | <b>Modified</b> | <b>{user_column}</b> |
+ | ---- | ------ | ---- | ---- |
+"""
+
+MD_ROW = " | [{title}]({page_url}) | {created} | {modified} | {user} |\n"
+
+
+@lru_cache(maxsize=8192)
+def _format_day(day):
+    return time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+
+
+@lru_cache(maxsize=65536)
+def _format_minute(minute):
+    return time.strftime('%b, %d, %Y. %H:%M', time.gmtime(minute * 60))
+
+
+def iso_date(epoch):
+    """Formats epoch seconds as 2023-05-10, memoized per day"""
+    return _format_day(epoch // 86400)
+
+
+def long_datetime(epoch):
+    """Formats epoch seconds as May, 10, 2023. 08:03, like utilities.transform_datetime, memoized per minute"""
+    return _format_minute(epoch // 60)
+
+
+def _write_row(out, row_template, article, format_date, user_field):
+    out.write(row_template.format(title=article.title,
+                                  page_url=article.page_url,
+                                  created=format_date(article.created),
+                                  modified=format_date(article.modified),
+                                  user=getattr(article, user_field)))
+
+
+def write_html_table_head(out, heading, user_column="Creator"):
+    """Writes the heading and the header row of an HTML table, see write_html_table"""
+    out.write(HTML_TABLE_HEAD.format(heading=heading, user_column=user_column))
+
+
+def write_html_row(out, article, format_date=iso_date, user_field="creator"):
+    """Writes the HTML table row of one ArticleRecord, see write_html_table"""
+    _write_row(out, HTML_ROW, article, format_date, user_field)
+
+
+def write_html_table_end(out):
+    """Closes an HTML table, see write_html_table"""
+    out.write("    </table>\n")
+
+
+def write_html_index(out, heading, pages):
+    """
+    Writes the table of an index page linking the pages of a sharded inventory.
+
+    Args:
+        out (file): A text file or buffer (e.g. io.StringIO) to write to.
+        heading (str): The text of the h1 heading written above the table.
+        pages (iterable): (title, page_url, number of articles) tuples, one per linked page.
+
+    Returns:
+        None
+    """
+    out.write(HTML_INDEX_HEAD.format(heading=heading))
+    for title, page_url, articles in pages:
+        out.write(HTML_INDEX_ROW.format(title=title, page_url=page_url, articles=articles))
+    write_html_table_end(out)
+
+
+def write_md_table_head(out, heading, user_column="Creator"):
+    """Writes the heading and the header row of a markdown table, see write_md_table"""
+    out.write(MD_TABLE_HEAD.format(heading=heading, user_column=user_column))
+
+
+def write_md_row(out, article, format_date=iso_date, user_field="creator"):
+    """Writes the markdown table row of one ArticleRecord, see write_md_table"""
+    _write_row(out, MD_ROW, article, format_date, user_field)
+
+
+def write_html_table(out, heading, articles, format_date=iso_date, user_column="Creator", user_field="creator"):
+    """
+    Streams an HTML table of articles to out, one row at a time, so the document is never held in memory.
+
+    Args:
+        out (file): A text file or buffer (e.g. io.StringIO) to write to.
+        heading (str): The text of the h1 heading written above the table.
+        articles (iterable): ArticleRecord objects as returned by XWikiAPIFetcher.fetch_and_process_xwiki_data.
+        format_date (function): Formats the created and modified epochs of an article.
+        user_column (str): The header of the last column.
+        user_field (str): The ArticleRecord attribute shown in the last column, "creator" or "modifier".
+
+    Returns:
+        None
+    """
+    write_html_table_head(out, heading, user_column)
+    for article in articles:
+        write_html_row(out, article, format_date, user_field)
+    write_html_table_end(out)
+
+
+def write_md_table(out, heading, articles, format_date=iso_date, user_column="Creator", user_field="creator"):
+    """
+    Streams a markdown table of articles to out, one row at a time, see write_html_table.
+
+    Args:
+        out (file): A text file or buffer (e.g. io.StringIO) to write to.
+        heading (str): The line written above the table.
+        articles (iterable): ArticleRecord objects as returned by XWikiAPIFetcher.fetch_and_process_xwiki_data.
+        format_date (function): Formats the created and modified epochs of an article.
+        user_column (str): The header of the last column.
+        user_field (str): The ArticleRecord attribute shown in the last column, "creator" or "modifier".
+
+    Returns:
+        None
+    """
+    write_md_table_head(out, heading, user_column)
+    for article in articles:
+        write_md_row(out, article, format_date, user_field)
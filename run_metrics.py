@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = "xwiki_inventory"
+
+
+def _new_totals():
+    return {"requests": 0, "bytes": 0, "retries": 0, "failures": 0, "statuses": {}, "latencies": [], "time_s": 0.0}
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunMetrics:
+    def __init__(self):
+        """
+        Thread-safe instrumentation of an inventory run.
+        Requests are recorded per phase (listing, metadata, history, query, publish) and per space with their
+        latency, bytes received, status code and retries, and timer() measures the time spent in phases
+        without requests of their own (parse, render) or spanning many requests (crawl, the whole
+        fetch_and_process_xwiki_data of a space). The results are exported as a JSON run report and
+        as a Prometheus textfile.
+
+        Returns:
+            None
+        """
+        self.started_at = time.time()
+        self.phases = {}
+        self.spaces = {}
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Starts a new run, e.g. the next refresh cycle of inventory_daemon.py, dropping everything recorded"""
+        with self._lock:
+            self.started_at = time.time()
+            self.phases = {}
+            self.spaces = {}
+            self.failures = []
+
+    def _totals(self, phase, space):
+        phase_totals = self.phases.setdefault(phase, _new_totals())
+        space_totals = self.spaces.setdefault(space, _new_totals()) if space is not None else None
+        return phase_totals, space_totals
+
+    def observe_request(self, phase, space, latency, size, status):
+        """
+        Records one request attempt.
+
+        Args:
+            phase (str): The phase the request belongs to, e.g. "metadata".
+            space (str): The space the request belongs to, see XWikiTransport.space_key.
+            latency (float): Seconds until the response headers, or the error, were received.
+            size (int): Bytes of the response body, 0 for streamed responses, see observe_bytes.
+            status (int or str): The status code, or the name of the error raised.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for totals in self._totals(phase, space):
+                if totals is not None:
+                    totals["requests"] += 1
+                    totals["bytes"] += size
+                    totals["statuses"][str(status)] = totals["statuses"].get(str(status), 0) + 1
+                    totals["latencies"].append(latency)
+
+    def observe_bytes(self, phase, space, size):
+        """Adds the bytes of a streamed response once it has been read"""
+        with self._lock:
+            for totals in self._totals(phase, space):
+                if totals is not None:
+                    totals["bytes"] += size
+
+    def observe_failure(self, phase, space, url, error):
+        """Records a page or listing left out of the inventory because its requests failed for good"""
+        with self._lock:
+            for totals in self._totals(phase, space):
+                if totals is not None:
+                    totals["failures"] += 1
+            self.failures.append({"phase": phase, "space": space, "url": url, "error": str(error)})
+
+    def observe_retry(self, phase, space):
+        with self._lock:
+            for totals in self._totals(phase, space):
+                if totals is not None:
+                    totals["retries"] += 1
+
+    def observe_time(self, phase, space, elapsed):
+        """Adds elapsed seconds to phase, and to space if given, e.g. time measured across the yields of a generator"""
+        with self._lock:
+            for totals in self._totals(phase, space):
+                if totals is not None:
+                    totals["time_s"] += elapsed
+
+    @contextmanager
+    def timer(self, phase, space=None):
+        """Adds the time spent in the with block to phase, and to space if given"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_time(phase, space, time.perf_counter() - started)
+
+    @staticmethod
+    def _summary(totals):
+        latencies = sorted(totals["latencies"])
+        summary = {"requests": totals["requests"], "bytes": totals["bytes"], "retries": totals["retries"],
+                   "failures": totals["failures"], "statuses": dict(totals["statuses"]),
+                   "time_s": round(totals["time_s"], 4)}
+        if latencies:
+            buckets = {}
+            for bound in LATENCY_BUCKETS:
+                buckets[str(bound)] = bisect_left(latencies, bound + 1e-12)
+            buckets["+Inf"] = len(latencies)
+            summary["latency_s"] = {"count": len(latencies), "sum": round(sum(latencies), 4),
+                                    "min": round(latencies[0], 4), "p50": round(_percentile(latencies, 0.5), 4),
+                                    "p90": round(_percentile(latencies, 0.9), 4),
+                                    "p99": round(_percentile(latencies, 0.99), 4), "max": round(latencies[-1], 4),
+                                    "buckets": buckets}
+        return summary
+
+    def report(self):
+        """
+        Returns the run report.
+
+        Returns:
+            dict: started_at, finished_at and duration_s of the run, the totals of every phase and space:
+                  requests, bytes, retries, failures, statuses, time_s (of the timers) and, when requests were
+                  sent, latency_s with percentiles and the cumulative histogram buckets, and the failures,
+                  the phase, space, URL and error of every page left out after failed requests.
+        """
+        finished_at = time.time()
+        with self._lock:
+            return {"started_at": int(self.started_at), "finished_at": int(finished_at),
+                    "duration_s": round(finished_at - self.started_at, 3),
+                    "phases": {phase: self._summary(totals) for phase, totals in self.phases.items()},
+                    "spaces": {space: self._summary(totals) for space, totals in self.spaces.items()},
+                    "failures": list(self.failures)}
+
+    def write_report(self, report_file):
+        """Writes the run report as JSON"""
+        _write_atomically(report_file, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, textfile):
+        """
+        Writes the run report in the Prometheus text format, for the textfile collector of node_exporter.
+        The file is replaced atomically, so the collector never reads a partial file.
+        """
+        report = self.report()
+        lines = []
+
+        def metric(name, metric_type, help_text, samples, suffix=""):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} {metric_type}")
+            sample(name, samples, suffix)
+
+        def sample(name, samples, suffix=""):
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_label(label)}"' for key, label in labels)
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{suffix}{{{label_text}}} {value}" if label_text
+                             else f"{PROMETHEUS_PREFIX}_{name}{suffix} {value}")
+
+        phases = report["phases"]
+        spaces = report["spaces"]
+        latencies = [(phase, summary["latency_s"]) for phase, summary in phases.items() if "latency_s" in summary]
+        metric("request_duration_seconds", "histogram", "Request latency by phase",
+               [((("phase", phase), ("le", bound)), count) for phase, latency in latencies
+                for bound, count in latency["buckets"].items()], "_bucket")
+        sample("request_duration_seconds", [((("phase", phase),), latency["sum"]) for phase, latency in latencies],
+               "_sum")
+        sample("request_duration_seconds", [((("phase", phase),), latency["count"]) for phase, latency in latencies],
+               "_count")
+        metric("requests_total", "counter", "Requests by phase and status",
+               [((("phase", phase), ("status", status)), count) for phase, summary in phases.items()
+                for status, count in summary["statuses"].items()])
+        metric("response_bytes_total", "counter", "Bytes received by phase",
+               [((("phase", phase),), summary["bytes"]) for phase, summary in phases.items()])
+        metric("retries_total", "counter", "Retried requests by phase",
+               [((("phase", phase),), summary["retries"]) for phase, summary in phases.items()])
+        metric("failures_total", "counter", "Pages left out after failed requests by phase",
+               [((("phase", phase),), summary["failures"]) for phase, summary in phases.items()])
+        metric("phase_duration_seconds", "gauge", "Time spent in the timed phases of the last run",
+               [((("phase", phase),), summary["time_s"]) for phase, summary in phases.items() if summary["time_s"]])
+        metric("space_duration_seconds", "gauge", "Wall time of fetch_and_process_xwiki_data by space",
+               [((("space", space),), summary["time_s"]) for space, summary in spaces.items()])
+        metric("space_requests_total", "counter", "Requests by space",
+               [((("space", space),), summary["requests"]) for space, summary in spaces.items()])
+        metric("space_response_bytes_total", "counter", "Bytes received by space",
+               [((("space", space),), summary["bytes"]) for space, summary in spaces.items()])
+        metric("run_duration_seconds", "gauge", "Duration of the last run", [((), report["duration_s"])])
+        metric("last_run_timestamp_seconds", "gauge", "End of the last run", [((), report["finished_at"])])
+        _write_atomically(textfile, "\n".join(lines) + "\n")
+
+
+def _write_atomically(path, content):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write(content)
+    os.replace(temp_file, path)
@@ -0,0 +1,234 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+from article_record import ArticleRecord
+from publish_state import inventory_delta
+from renderer import iso_date
+
+
+def _row(article):
+    return [article.title, article.page_url, article.version, article.created, article.modified, article.creator,
+            article.modifier]
+
+
+def _record(row):
+    title, page_url, version, created, modified, creator, modifier = row
+    return ArticleRecord(title, page_url, version, created=created, modified=modified, creator=creator,
+                         modifier=modifier)
+
+
+class SnapshotArchive:
+    def __init__(self, archive_dir, chunk_rows=64, keep_last=30, keep_daily=90):
+        """
+        Content-addressed archive of the inventory of every run.
+        The articles of a space are cut into chunks of about chunk_rows rows, every chunk is stored once as a gzip
+        blob named after the SHA-256 of its content and a snapshot is a small manifest listing the chunks
+        of every space. Chunk boundaries depend on the page URLs only, so an added, removed or modified article
+        changes a single chunk and the archive grows with the churn of the inventory, not with the number of runs.
+
+        Args:
+            archive_dir (str): Directory of the archive, created if missing.
+            chunk_rows (int): Average number of articles per chunk.
+            keep_last (int): prune keeps at least this many of the latest snapshots.
+            keep_daily (int): prune also keeps the latest snapshot of each of this many latest days.
+
+        Returns:
+            None
+        """
+        self.archive_dir = archive_dir
+        self.objects_dir = os.path.join(archive_dir, 'objects')
+        self.manifests_dir = os.path.join(archive_dir, 'manifests')
+        self.chunk_rows = chunk_rows
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    def _chunks(self, articles):
+        """Cuts the articles into chunks ending after every article whose URL hash is a multiple of chunk_rows"""
+        chunk = []
+        for article in articles:
+            chunk.append(_row(article))
+            if zlib.crc32(article.page_url.encode('utf-8')) % self.chunk_rows == 0:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:] + '.json.gz')
+
+    def _store_chunk(self, chunk):
+        """Stores a chunk unless a chunk with the same content is already stored, returns its digest"""
+        data = json.dumps(chunk, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_file = path + '.tmp'
+            with open(temp_file, 'wb') as f:
+                # mtime=0 keeps the blob of a chunk identical across runs
+                f.write(gzip.compress(data, mtime=0))
+            os.replace(temp_file, path)
+        return digest
+
+    def _load_chunk(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return json.loads(gzip.decompress(f.read()))
+
+    def add(self, articles_by_space, taken_at=None):
+        """
+        Archives a new snapshot.
+
+        Args:
+            articles_by_space (dict): Lists of ArticleRecord keyed by space name.
+            taken_at (int): Epoch of the snapshot, defaults to now.
+
+        Returns:
+            str: The id of the new snapshot, e.g. 20230510T080312Z.
+        """
+        taken_at = int(taken_at or time.time())
+        snapshot = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(taken_at))
+        with self._lock:
+            # two runs within the same second
+            if os.path.exists(os.path.join(self.manifests_dir, snapshot + '.json')):
+                snapshot += f"-{len([name for name in os.listdir(self.manifests_dir) if name.startswith(snapshot)])}"
+            manifest = {"taken_at": taken_at,
+                        "spaces": {space: [self._store_chunk(chunk) for chunk in self._chunks(articles)]
+                                   for space, articles in articles_by_space.items()}}
+            temp_file = os.path.join(self.manifests_dir, snapshot + '.json.tmp')
+            with open(temp_file, 'w') as f:
+                json.dump(manifest, f)
+            os.replace(temp_file, os.path.join(self.manifests_dir, snapshot + '.json'))
+        return snapshot
+
+    def snapshots(self):
+        """Returns the ids of the archived snapshots, oldest first"""
+        return sorted(name[:-len('.json')] for name in os.listdir(self.manifests_dir) if name.endswith('.json'))
+
+    def manifest(self, snapshot):
+        """
+        Returns the manifest of a snapshot, a dict with taken_at and spaces, the chunk digests of every space.
+
+        Raises:
+            FileNotFoundError: If there is no such snapshot.
+        """
+        with open(os.path.join(self.manifests_dir, snapshot + '.json'), 'r') as f:
+            return json.load(f)
+
+    def load(self, snapshot):
+        """Returns the articles of a snapshot as lists of ArticleRecord keyed by space name"""
+        return {space: [_record(row) for digest in digests for row in self._load_chunk(digest)]
+                for space, digests in self.manifest(snapshot)["spaces"].items()}
+
+    def diff(self, old_snapshot, new_snapshot):
+        """
+        Compares two snapshots. Chunks both snapshots share hold the same articles and are not even read,
+        so the cost of a diff follows the churn between the snapshots, not the size of the inventory.
+
+        Args:
+            old_snapshot (str): The id of the older snapshot.
+            new_snapshot (str): The id of the newer snapshot.
+
+        Returns:
+            dict: {space: {"added": [page_url], "removed": [page_url], "modified": [page_url]}}, see
+                  publish_state.inventory_delta.
+        """
+        old_spaces = self.manifest(old_snapshot)["spaces"]
+        new_spaces = self.manifest(new_snapshot)["spaces"]
+        previous = {}
+        current = {}
+        for space in set(old_spaces) | set(new_spaces):
+            old_digests = set(old_spaces.get(space, []))
+            new_digests = set(new_spaces.get(space, []))
+            previous[space] = {row[1]: row for digest in old_digests - new_digests
+                               for row in self._load_chunk(digest)}
+            current[space] = {row[1]: row for digest in new_digests - old_digests
+                              for row in self._load_chunk(digest)}
+        return inventory_delta(previous, current)
+
+    def prune(self, now=None):
+        """
+        Applies the retention policy: keeps the keep_last latest snapshots and the latest snapshot of each
+        of the keep_daily latest days, deletes the other snapshots and then every chunk no snapshot refers to.
+
+        Returns:
+            tuple: The number of deleted snapshots and of deleted chunks.
+        """
+        with self._lock:
+            snapshots = self.snapshots()
+            keep = set(snapshots[-self.keep_last:]) if self.keep_last else set()
+            oldest_day = time.strftime('%Y%m%d', time.gmtime((now or time.time()) - self.keep_daily * 86400))
+            latest_of_day = {}
+            for snapshot in snapshots:
+                latest_of_day[snapshot[:8]] = snapshot
+            keep.update(snapshot for day, snapshot in latest_of_day.items() if day > oldest_day)
+
+            deleted_snapshots = 0
+            for snapshot in snapshots:
+                if snapshot not in keep:
+                    os.remove(os.path.join(self.manifests_dir, snapshot + '.json'))
+                    deleted_snapshots += 1
+
+            referenced = set()
+            for snapshot in keep:
+                for digests in self.manifest(snapshot)["spaces"].values():
+                    referenced.update(digests)
+            deleted_chunks = 0
+            for prefix in os.listdir(self.objects_dir):
+                for name in os.listdir(os.path.join(self.objects_dir, prefix)):
+                    if prefix + name[:-len('.json.gz')] not in referenced:
+                        os.remove(os.path.join(self.objects_dir, prefix, name))
+                        deleted_chunks += 1
+        return deleted_snapshots, deleted_chunks
+
+
+def main(argv=None):
+    """
+    Command line access to the snapshot archive, e.g.
+        python snapshot_archive.py list
+        python snapshot_archive.py diff 20230510T080312Z 20230517T080255Z
+        python snapshot_archive.py prune
+    """
+    parser = argparse.ArgumentParser(description="Browse the archived XWiki inventory snapshots")
+    parser.add_argument("--archive", default=os.path.join(os.getcwd(), 'cache', 'archive'),
+                        help="path to the snapshot archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the archived snapshots")
+    diff = commands.add_parser("diff", help="list the articles added, removed and modified between two snapshots")
+    diff.add_argument("old_snapshot")
+    diff.add_argument("new_snapshot", nargs="?", help="defaults to the latest snapshot")
+    prune = commands.add_parser("prune", help="apply the retention policy and delete unreferenced chunks")
+    prune.add_argument("--keep-last", type=int, default=30)
+    prune.add_argument("--keep-daily", type=int, default=90)
+    args = parser.parse_args(argv)
+
+    if args.command == "prune":
+        archive = SnapshotArchive(args.archive, keep_last=args.keep_last, keep_daily=args.keep_daily)
+        print("Deleted {} snapshots and {} chunks".format(*archive.prune()))
+        return 0
+    archive = SnapshotArchive(args.archive)
+    if args.command == "list":
+        for snapshot in archive.snapshots():
+            manifest = archive.manifest(snapshot)
+            print(f"{snapshot}\t{iso_date(manifest['taken_at'])}\t"
+                  f"{sum(len(digests) for digests in manifest['spaces'].values())} chunks")
+        return 0
+    new_snapshot = args.new_snapshot or archive.snapshots()[-1]
+    for space, changes in archive.diff(args.old_snapshot, new_snapshot).items():
+        for change in ("added", "removed", "modified"):
+            for page_url in changes[change]:
+                print(f"{space}\t{change}\t{page_url}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
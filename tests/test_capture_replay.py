@@ -0,0 +1,77 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+
+REAL_HTML = "<body>published by the last real run</body>"
+
+
+class TestRecordThenReplay(unittest.TestCase):
+    """A run recorded against the local mock server and replayed without it never touches the real outputs"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=6, restricted_every=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None}), f)
+        self.capture_file = os.path.join(self.work_dir, 'cache', 'http_capture.sqlite3')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def _run(self, capture_mode):
+        fetcher = XWikiAPIFetcher(settings={"capture_mode": capture_mode, "capture_file": self.capture_file})
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fetcher.publish()
+            return fetcher, fetcher.metrics.report()
+        finally:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fetcher.close()
+
+    def test_replay_keeps_the_real_html_and_replays_the_crawl(self):
+        _, recorded = self._run("record")
+        self.assertEqual(self.server.stats["statuses"].get("503", 0), 0)
+        published = self.server.stats["requests"]
+        self.assertGreater(published, 0)
+        # the HTML file of the next real run, waiting to be published
+        with open(os.path.join('outputs', 'articles_in_all_spaces.html'), 'w') as f:
+            f.write(REAL_HTML)
+        self.server.shutdown()
+
+        for _ in range(2):
+            replayer, replayed = self._run("replay")
+            self.assertEqual(replayed["phases"]["listing"]["requests"], recorded["phases"]["listing"]["requests"])
+            self.assertNotIn("publish", replayed["phases"])
+            with open(replayer.html_file) as f:
+                self.assertEqual(f.read().count("/bin/view/VB365/How-to/Article-"), 6)
+
+        self.assertEqual(os.path.dirname(replayer.html_file), os.path.splitext(self.capture_file)[0] + '_replay')
+        with open(os.path.join('outputs', 'articles_in_all_spaces.html')) as f:
+            self.assertEqual(f.read(), REAL_HTML)
+        self.assertEqual(self.server.stats["requests"], published)
+
+
+if __name__ == '__main__':
+    unittest.main()
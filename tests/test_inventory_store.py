@@ -0,0 +1,55 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from article_record import ArticleRecord
+from inventory_store import InventoryStore
+
+SPACE_URL = "https://xwiki.example.com/xwiki/bin/view/VB365"
+
+
+def _article(space, i, modifier="bob"):
+    return ArticleRecord(f"Article {i}", f"{SPACE_URL}/{space}/Article-{i}/", "1.1", created=1683705600 + i * 60,
+                         modified=1683705600 + i * 60, creator="alice", modifier=modifier)
+
+
+def _page_urls(rows):
+    return [row["page_url"] for row in rows]
+
+
+class TestInventoryStore(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.store = InventoryStore(os.path.join(self.work_dir, 'inventory.sqlite3'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.work_dir)
+
+    def test_find_articles_reads_the_latest_snapshot_of_every_space(self):
+        first = self.store.record_snapshot({"How-to": [_article("How-to", i) for i in range(3)],
+                                            "General-Knowledge": [_article("General-Knowledge", 0)]})
+        # How-to is refreshed alone, Article-2 is gone, General-Knowledge keeps its first snapshot
+        self.store.record_snapshot({"How-to": [_article("How-to", i, modifier="carol") for i in range(2)]})
+
+        self.assertEqual(_page_urls(self.store.find_articles(space="How-to")),
+                         [f"{SPACE_URL}/How-to/Article-{i}/" for i in range(2)])
+        self.assertEqual(sorted(_page_urls(self.store.find_articles())),
+                         sorted([f"{SPACE_URL}/How-to/Article-{i}/" for i in range(2)]
+                                + [f"{SPACE_URL}/General-Knowledge/Article-0/"]))
+        self.assertEqual(_page_urls(self.store.find_articles(modifier="bob")),
+                         [f"{SPACE_URL}/General-Knowledge/Article-0/"])
+        self.assertEqual(len(self.store.find_articles(space="How-to", snapshot=first)), 3)
+        self.assertEqual(len(self.store.find_articles(space="How-to", snapshot=0)), 3)
+        self.assertEqual(len(self.store.find_articles(limit=1)), 1)
+
+    def test_latest_snapshot_is_found_with_the_space_index(self):
+        self.store.record_snapshot({"How-to": [_article("How-to", i) for i in range(3)]})
+        plan = " ".join(row["detail"] for row in self.store._connection.execute(
+            "EXPLAIN QUERY PLAN SELECT space, MAX(last_snapshot) FROM articles GROUP BY space"))
+        self.assertIn("articles_space_last_snapshot", plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+from article_record import ArticleRecord  # noqa: E402
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+
+
+class TestApplyModifications(unittest.TestCase):
+    """XWikiAPIFetcher._apply_modifications against the feed and the pages of the local mock server"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=8, restricted_every=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None}), f)
+        self.fetcher = XWikiAPIFetcher()
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def _article_url(self, i):
+        return f"{self.server.base_url}/bin/view/VB365/How-to/Article-{i}/"
+
+    def test_created_updated_deleted_and_moved(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            crawled = {article.page_url: article
+                       for article in self.fetcher.fetch_and_process_xwiki_data(self.fetcher.how_to_children_pages_url)}
+            modifications = [modification for modification in self.fetcher._fetch_modifications(0)
+                             if '/spaces/How-to/' in modification['page_href']]
+        self.assertEqual(len(crawled), 8)
+        self.assertEqual(len(modifications), 8)
+
+        updated, moved, created, deleted = (self._article_url(i) for i in (3, 4, 5, 7))
+        known = [article for page_url, article in crawled.items() if page_url not in (moved, created)]
+        # known at an older version
+        known[3] = ArticleRecord(known[3].title, updated, '0.1', created=known[3].created,
+                                 modified=known[3].modified, creator=known[3].creator)
+        # known under its URL before it was moved, same creation date and creator
+        known.append(ArticleRecord("Old title", self._article_url(40), crawled[moved].version,
+                                   created=crawled[moved].created, modified=crawled[moved].modified,
+                                   creator=crawled[moved].creator))
+        # deleted after the feed was read, its page is gone when refetched
+        known[-2] = ArticleRecord(known[-2].title, deleted, '0.1', created=known[-2].created,
+                                  modified=known[-2].modified, creator=known[-2].creator)
+        self.server.wiki.articles = 7
+        articles_by_space = {"How-to": known, "General-Knowledge": [], "How-to-configure-VBO365": []}
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            counts = self.fetcher._apply_modifications(articles_by_space, modifications)
+
+        self.assertEqual(counts, {"created": 1, "updated": 1, "deleted": 1, "moved": 1, "failed": 0,
+                                  "changed_spaces": {"How-to"}, "retry_from": None})
+        how_to = articles_by_space["How-to"]
+        self.assertEqual([article.page_url for article in how_to], [self._article_url(i) for i in range(7)])
+        self.assertEqual(how_to[3].version, crawled[updated].version)
+        self.assertEqual(how_to[4].title, crawled[moved].title)
+        self.assertEqual(articles_by_space["General-Knowledge"], [])
+
+    def test_unchanged_versions_are_not_refetched(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            known = self.fetcher.fetch_and_process_xwiki_data(self.fetcher.how_to_children_pages_url)
+            modifications = [modification for modification in self.fetcher._fetch_modifications(0)
+                             if '/spaces/How-to/' in modification['page_href']]
+            self.server.reset_stats()
+            articles_by_space = {"How-to": known, "General-Knowledge": [], "How-to-configure-VBO365": []}
+            counts = self.fetcher._apply_modifications(articles_by_space, modifications)
+
+        self.assertEqual(counts, {"created": 0, "updated": 0, "deleted": 0, "moved": 0, "failed": 0,
+                                  "changed_spaces": set(), "retry_from": None})
+        self.assertIs(articles_by_space["How-to"], known)
+        self.assertEqual(self.server.stats["requests"], 0)
+
+    def test_known_empty_spaces_are_not_crawled(self):
+        known = {"How-to": [], "General-Knowledge": [], "How-to-configure-VBO365": []}
+        with contextlib.redirect_stdout(io.StringIO()):
+            articles_by_space = self.fetcher.refresh(space_urls=[], known=known)
+        self.assertEqual(articles_by_space, known)
+        self.assertNotIn("listing", self.fetcher.metrics.report()["phases"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+
+
+class TestNestedCrawl(unittest.TestCase):
+    """XWikiAPIFetcher._crawl_space against the nested spaces of the local mock server"""
+
+    def setUp(self):
+        # 20 articles, 2 of them with 3 children, 2 of these with 3 children again
+        self.server = MockXWikiServer(port=0, articles=20, restricted_every=0, nested_depth=3)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None}), f)
+        self.fetcher = XWikiAPIFetcher()
+        self.space_url = self.fetcher.how_to_children_pages_url
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def _page_urls(self, depth):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [article.page_url for article in self.fetcher.fetch_and_process_xwiki_data(self.space_url,
+                                                                                               depth=depth)]
+
+    def _view_url(self, *path):
+        return f"{self.server.base_url}/bin/view/VB365/How-to/{'/'.join(path)}/"
+
+    def test_depth_limits(self):
+        for depth, expected in ((1, 20), (2, 26), (3, 32), (0, 32)):
+            with self.subTest(depth=depth):
+                page_urls = self._page_urls(depth)
+                self.assertEqual(len(page_urls), expected)
+                self.assertEqual(len(set(page_urls)), expected)
+        self.assertIn(self._view_url("Article-10", "Article-50", "Article-190"), page_urls)
+        self.assertNotIn(self._view_url("Article-10", "Article-50"), self._page_urls(1))
+        self.assertNotIn(self._view_url("Article-10", "Article-50", "Article-190"), self._page_urls(2))
+
+    def test_page_reachable_twice_is_listed_once(self):
+        wiki = self.server.wiki
+        children = wiki.children
+
+        def children_linking_back(space, start, number, parent=()):
+            # every nested listing links Article-1 of the space again, e.g. a page moved while being crawled
+            listing = children(space, start, number, parent)
+            if not parent:
+                return listing
+            summary = children(space, 1, 1)
+            summary = summary[summary.index('<pageSummary>'):summary.index('</pages>')]
+            return listing.replace('</pages>', summary + '</pages>')
+
+        wiki.children = children_linking_back
+        page_urls = self._page_urls(0)
+        self.assertEqual(len(page_urls), 32)
+        self.assertEqual(page_urls.count(self._view_url("Article-1")), 1)
+        # the listings of the space and of each of its 32 pages, Article-1 is not listed again
+        phases = self.fetcher.metrics.report()["phases"]
+        self.assertEqual(phases["listing"]["requests"], 1 + 32)
+        self.assertEqual(phases["metadata"]["requests"], 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
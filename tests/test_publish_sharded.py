@@ -0,0 +1,77 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+
+
+class TestPublishSharded(unittest.TestCase):
+    """XWikiAPIFetcher.publish_sharded against the local mock server"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=7, restricted_every=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None, "publish_mode": "sharded",
+                                                        "shard_rows": 3}), f)
+        self.fetcher = XWikiAPIFetcher()
+        self.index_url = self.fetcher.inventory_resulting_article
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def _publish(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.fetcher.publish()
+        return out.getvalue()
+
+    def _shard_url(self, shard_name):
+        return self.fetcher._shard_page_url(self.index_url, shard_name)
+
+    def test_shards_of_a_shrunk_space_are_blanked_and_forgotten(self):
+        self._publish()
+        self.assertEqual(self.fetcher.publish_state.shards(self.index_url),
+                         {"General-Knowledge": 3, "How-to": 3, "How-to-configure-VBO365": 3})
+        self.assertIn(self._shard_url("How-to-3"), self.fetcher.publish_state.pages)
+
+        self.server.wiki.articles = 4
+        output = self._publish()
+
+        self.assertEqual(self.fetcher.publish_state.shards(self.index_url),
+                         {"General-Knowledge": 2, "How-to": 2, "How-to-configure-VBO365": 2})
+        for space in ("General-Knowledge", "How-to", "How-to-configure-VBO365"):
+            with self.subTest(space=space):
+                self.assertIn(f"Page {self._shard_url(f'{space}-3')} updated successfully.", output)
+                self.assertNotIn(self._shard_url(f"{space}-3"), self.fetcher.publish_state.pages)
+                self.assertIn(self._shard_url(f"{space}-2"), self.fetcher.publish_state.pages)
+        self.assertIn("0 failed, 3 blanked", output)
+
+        # nothing left to blank
+        self.assertIn("0 failed, 0 blanked", self._publish())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+import renderer  # noqa: E402
+from article_record import ArticleRecord  # noqa: E402
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+from publish_state import content_hash  # noqa: E402
+
+SPACE_URL = "https://xwiki.example.com/xwiki/bin/view/VB365/How-to"
+
+
+def _render(as_of, articles):
+    out = io.StringIO()
+    out.write(renderer.HTML_STYLE)
+    out.write("<body>\n")
+    renderer.write_html_table(out, f"Articles in How to space as of {as_of}", articles,
+                              format_date=renderer.long_datetime)
+    out.write("</body>")
+    return out.getvalue()
+
+
+def _articles(title="Configure a proxy"):
+    return [ArticleRecord(title, f"{SPACE_URL}/Configure-a-proxy/", "1.1", created=1683705600,
+                          modified=1683705600, creator="alice", modifier="bob")]
+
+
+class TestContentHash(unittest.TestCase):
+    def test_only_the_date_of_the_headings_is_left_out(self):
+        self.assertEqual(content_hash(_render("May 10, 2023", _articles())),
+                         content_hash(_render("May 11, 2023", _articles())))
+        self.assertNotEqual(content_hash(_render("May 10, 2023", _articles())),
+                            content_hash(_render("May 10, 2023", _articles("Configure a proxy server"))))
+
+
+class TestSkipIfUnchanged(unittest.TestCase):
+    """XWikiAPIFetcher._publish_page against the local mock server"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=1, restricted_every=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None}), f)
+        self.fetcher = XWikiAPIFetcher()
+        self.page_url = self.fetcher.inventory_resulting_article
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def _publish(self, content, force=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.fetcher._publish_page(self.page_url, content, force)
+
+    def _sent(self):
+        return self.fetcher.metrics.report()["phases"]["publish"]["requests"]
+
+    def test_a_new_date_alone_is_not_published_a_changed_row_is(self):
+        self.assertEqual(self._publish(_render("May 10, 2023", _articles())), "published")
+        self.assertEqual(self._publish(_render("May 11, 2023", _articles())), "unchanged")
+        self.assertEqual(self._sent(), 1)
+
+        self.assertEqual(self._publish(_render("May 11, 2023", _articles("Configure a proxy server"))), "published")
+        self.assertEqual(self._publish(_render("May 12, 2023", _articles("Configure a proxy server")), force=True),
+                         "published")
+        self.assertEqual(self._sent(), 3)
+
+        # the state survives the run
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.fetcher = XWikiAPIFetcher()
+        self.assertEqual(self._publish(_render("May 13, 2023", _articles("Configure a proxy server"))), "unchanged")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from article_record import ArticleRecord
+from snapshot_archive import SnapshotArchive
+
+CHUNK_ROWS = 8
+SPACE_URL = "https://xwiki.example.com/xwiki/bin/view/VB365/How-to"
+
+
+def _article(i, modified=None):
+    return ArticleRecord(f"Article {i}", f"{SPACE_URL}/Article-{i}/", "1.1", created=1683705600 + i * 60,
+                         modified=modified or 1683705600 + i * 60, creator="alice", modifier="bob")
+
+
+def _ends_chunk(article):
+    return zlib.crc32(article.page_url.encode('utf-8')) % CHUNK_ROWS == 0
+
+
+class TestSnapshotArchive(unittest.TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.archive = SnapshotArchive(self.archive_dir, chunk_rows=CHUNK_ROWS, keep_last=1, keep_daily=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_dir)
+
+    def _stored_chunks(self):
+        return sum(len(names) for _, _, names in os.walk(self.archive.objects_dir))
+
+    def _chunk_of(self, articles):
+        """Returns the index of the chunk of every article, as cut by SnapshotArchive._chunks"""
+        chunks = []
+        chunk = 0
+        for article in articles:
+            chunks.append(chunk)
+            if _ends_chunk(article):
+                chunk += 1
+        return chunks
+
+    def test_diff_and_prune_follow_the_churn(self):
+        articles = [_article(i) for i in range(200)]
+        old_snapshot = self.archive.add({"How-to": articles}, taken_at=1683705600)
+        old_digests = self.archive.manifest(old_snapshot)["spaces"]["How-to"]
+        self.assertEqual(self._stored_chunks(), len(set(old_digests)))
+
+        # one modified, one removed and one appended article, none ending a chunk and each in its own chunk
+        chunks = self._chunk_of(articles)
+        candidates = [i for i in range(len(articles)) if not _ends_chunk(articles[i]) and chunks[i] < chunks[-1]]
+        modified = candidates[0]
+        removed = next(i for i in candidates if chunks[i] > chunks[modified])
+        added = next(_article(i) for i in range(200, 400) if not _ends_chunk(_article(i)))
+        new_articles = [_article(i, modified=1700000000) if i == modified else article
+                        for i, article in enumerate(articles) if i != removed] + [added]
+        new_snapshot = self.archive.add({"How-to": new_articles}, taken_at=1683792000)
+
+        self.assertEqual(self.archive.diff(old_snapshot, new_snapshot),
+                         {"How-to": {"added": [added.page_url], "removed": [articles[removed].page_url],
+                                     "modified": [articles[modified].page_url]}})
+        new_digests = self.archive.manifest(new_snapshot)["spaces"]["How-to"]
+        self.assertEqual(len(set(new_digests) - set(old_digests)), 3)
+        self.assertEqual(self._stored_chunks(), len(set(old_digests)) + 3)
+        self.assertEqual([article.page_url for article in self.archive.load(new_snapshot)["How-to"]],
+                         [article.page_url for article in new_articles])
+
+        self.assertEqual(self.archive.prune(now=1683792000), (1, 3))
+        self.assertEqual(self.archive.snapshots(), [new_snapshot])
+        self.assertEqual(self._stored_chunks(), len(set(new_digests)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from url_classifier import DEFAULT_CLASSIFIER
+from url_classifier import UrlClassification
+from url_classifier import UrlClassifier
+
+VIEW_URL = "https://xwiki.example.com/xwiki/bin/view/VB365"
+
+
+class TestUrlClassifier(unittest.TestCase):
+    def test_classify_splits_space_and_leaf(self):
+        classification = DEFAULT_CLASSIFIER.classify(f"{VIEW_URL}/How-to/Configure-a-proxy/")
+        self.assertEqual(classification, UrlClassification("How-to", "Configure-a-proxy/", None))
+
+    def test_classify_finds_restricted_sequence_in_leaf_case_insensitively(self):
+        classification = DEFAULT_CLASSIFIER.classify(f"{VIEW_URL}/General-Knowledge/Error-%3a-Access-denied/")
+        self.assertEqual(classification.space, "General-Knowledge")
+        self.assertEqual(classification.restricted, "%3a")
+
+    def test_restricted_sequence_outside_leaf_is_ignored(self):
+        # only the part after the space splitter identifies the article
+        page_url = "https://xwiki.example.com/xwiki/bin/view/VB%5B365%5D/How-to/Back-up-a-mailbox/"
+        self.assertIsNone(DEFAULT_CLASSIFIER.classify(page_url).restricted)
+        self.assertEqual(DEFAULT_CLASSIFIER.clear_page_url(page_url), page_url)
+
+    def test_url_without_splitter(self):
+        page_url = f"{VIEW_URL}/Release-notes/Article-%5B1%5D/"
+        self.assertEqual(DEFAULT_CLASSIFIER.classify(page_url), UrlClassification(None, "", None))
+        self.assertFalse(DEFAULT_CLASSIFIER.is_restricted(page_url))
+        self.assertEqual(DEFAULT_CLASSIFIER.clear_page_url(page_url), page_url)
+
+    def test_leaf_of_restricted_url_is_not_carried_over(self):
+        # the listing used to keep the leaf of the previous page when a page matched no splitter
+        restricted_url = f"{VIEW_URL}/How-to/Article-%60quoted%60/"
+        unsplit_url = f"{VIEW_URL}/Release-notes/Article/"
+        cleared = [DEFAULT_CLASSIFIER.clear_page_url(page_url) for page_url in (restricted_url, unsplit_url)]
+        self.assertEqual(cleared, [restricted_url.replace("xwiki", "xwiki-sup"), unsplit_url])
+
+    def test_clear_page_url_marks_restricted_url(self):
+        page_url = f"{VIEW_URL}/How-to/Article-%5B1%5D/"
+        self.assertEqual(DEFAULT_CLASSIFIER.clear_page_url(page_url),
+                         "https://xwiki-sup.example.com/xwiki-sup/bin/view/VB365/How-to/Article-%5B1%5D/")
+
+    def test_clear_page_url_checks_given_leaf(self):
+        page_url = f"{VIEW_URL}/How-to/Article/"
+        self.assertIn("xwiki-sup", DEFAULT_CLASSIFIER.clear_page_url(page_url, "Article-%5B1%5D/"))
+        self.assertEqual(DEFAULT_CLASSIFIER.clear_page_url(page_url, "Article/"), page_url)
+
+    def test_longer_splitter_is_not_shadowed_by_its_prefix(self):
+        # "/How-to/" is a prefix of "/How-to/Advanced/" at the same position
+        classifier = UrlClassifier(["/How-to/", "/How-to/Advanced/"], ["%5B"])
+        classification = classifier.classify(f"{VIEW_URL}/How-to/Advanced/Tuning/")
+        self.assertEqual(classification, UrlClassification("How-to/Advanced", "Tuning/", None))
+        self.assertEqual(classifier.classify(f"{VIEW_URL}/How-to/Tuning/").space, "How-to")
+
+    def test_from_settings_adds_configured_spaces(self):
+        classifier = UrlClassifier.from_settings({"space_splitters": ["/How-to/"], "restricted_sequences": ["%25"]},
+                                                 ["How-to", "Patch-notes"])
+        self.assertEqual(classifier.space_splitters, ("/How-to/", "/Patch-notes/"))
+        self.assertTrue(classifier.is_restricted(f"{VIEW_URL}/Patch-notes/100%25-done/"))
+        self.assertFalse(classifier.is_restricted(f"{VIEW_URL}/Patch-notes/Article-%5B1%5D/"))
+
+    def test_empty_configuration_matches_nothing(self):
+        classifier = UrlClassifier([], [])
+        self.assertEqual(classifier.classify(f"{VIEW_URL}/How-to/Article-%5B1%5D/"),
+                         UrlClassification(None, "", None))
+
+
+if __name__ == '__main__':
+    unittest.main()
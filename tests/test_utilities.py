@@ -0,0 +1,51 @@
+import calendar
+import time
+import unittest
+
+from utilities import epoch_to_xwiki_timestamp
+from utilities import xwiki_timestamp_to_epoch
+
+XWIKI_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _strptime_epoch(datetime_str):
+    return calendar.timegm(time.strptime(datetime_str, XWIKI_FORMAT))
+
+
+class TestXWikiTimestamps(unittest.TestCase):
+    TIMESTAMPS = ["1970-01-01T00:00:00Z", "2000-02-29T23:59:59Z", "2023-05-10T08:03:21Z", "2023-12-31T12:00:00Z",
+                  "2024-02-29T00:00:01Z", "2038-01-19T03:14:08Z"]
+
+    def test_timestamp_to_epoch_matches_strptime(self):
+        for datetime_str in self.TIMESTAMPS:
+            with self.subTest(datetime_str=datetime_str):
+                self.assertEqual(xwiki_timestamp_to_epoch(datetime_str), _strptime_epoch(datetime_str))
+
+    def test_round_trip(self):
+        for datetime_str in self.TIMESTAMPS:
+            with self.subTest(datetime_str=datetime_str):
+                self.assertEqual(epoch_to_xwiki_timestamp(xwiki_timestamp_to_epoch(datetime_str)), datetime_str)
+
+    def test_epoch_to_timestamp_matches_strftime(self):
+        # two days around the leap day of 2000, just under an hour apart, and a few odd seconds
+        epochs = list(range(951696000, 951868800, 3599)) + [0, 59, 86399, 1683705801]
+        for epoch in epochs:
+            with self.subTest(epoch=epoch):
+                self.assertEqual(epoch_to_xwiki_timestamp(epoch), time.strftime(XWIKI_FORMAT, time.gmtime(epoch)))
+                self.assertEqual(xwiki_timestamp_to_epoch(epoch_to_xwiki_timestamp(epoch)), epoch)
+
+    def test_fallback_for_unpadded_timestamps(self):
+        # not 20 characters long, parsed by strptime rather than sliced
+        for datetime_str in ["2023-5-10T08:03:21Z", "2023-05-10T8:3:21Z", "2023-12-1T00:00:00Z"]:
+            with self.subTest(datetime_str=datetime_str):
+                self.assertEqual(xwiki_timestamp_to_epoch(datetime_str), _strptime_epoch(datetime_str))
+
+    def test_fallback_rejects_malformed_timestamps(self):
+        for datetime_str in ["2023-05-10 08:03:21", "2023-05-10T08:03:21+02:00", ""]:
+            with self.subTest(datetime_str=datetime_str):
+                with self.assertRaises(ValueError):
+                    xwiki_timestamp_to_epoch(datetime_str)
+
+
+if __name__ == '__main__':
+    unittest.main()
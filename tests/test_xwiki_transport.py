@@ -0,0 +1,200 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchmarks'))
+
+from main import XWikiAPIFetcher  # noqa: E402
+from mock_xwiki import MockXWikiServer  # noqa: E402
+from mock_xwiki import api_secret  # noqa: E402
+from run_metrics import RunMetrics  # noqa: E402
+from xwiki_transport import AdaptiveLimiter  # noqa: E402
+from xwiki_transport import CircuitBreaker  # noqa: E402
+from xwiki_transport import TransportError  # noqa: E402
+from xwiki_transport import XWikiTransport  # noqa: E402
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_overload_halves_the_limit_down_to_the_minimum(self):
+        limiter = AdaptiveLimiter(8, minimum=2)
+        limiter.on_overload()
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(3):
+            limiter.on_overload()
+        self.assertEqual(limiter.limit, 2)
+
+    def test_healthy_responses_grow_the_limit_up_to_the_ceiling(self):
+        limiter = AdaptiveLimiter(4, ceiling=6)
+        for _ in range(100):
+            limiter.on_success(0.01)
+        self.assertEqual(limiter.limit, 6)
+
+    def test_rising_latency_shrinks_the_limit(self):
+        limiter = AdaptiveLimiter(4, ceiling=8)
+        for _ in range(20):
+            limiter.on_success(0.01)
+        grown = limiter.limit
+        limiter._last_decrease = 0.0
+        for _ in range(10):
+            limiter.on_success(1.0)
+        self.assertLess(limiter.limit, grown)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_consecutive_failures_pause_the_key(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=0.2)
+        for _ in range(2):
+            breaker.record_failure("xwiki/VB365/How-to")
+        breaker.record_success("xwiki/VB365/How-to")
+        for _ in range(2):
+            breaker.record_failure("xwiki/VB365/How-to")
+        started = time.monotonic()
+        breaker.wait("xwiki/VB365/How-to")
+        self.assertLess(time.monotonic() - started, 0.1)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            breaker.record_failure("xwiki/VB365/How-to")
+        started = time.monotonic()
+        breaker.wait("xwiki/VB365/General-Knowledge")
+        self.assertLess(time.monotonic() - started, 0.1)
+        breaker.wait("xwiki/VB365/How-to")
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+        # half-open after the pause, one more failure opens the circuit again
+        with contextlib.redirect_stdout(io.StringIO()):
+            breaker.record_failure("xwiki/VB365/How-to")
+        started = time.monotonic()
+        breaker.wait("xwiki/VB365/How-to")
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+
+class TestTransportAgainstMock(unittest.TestCase):
+    """XWikiTransport.get against the local mock server, with its error injection on"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=4, restricted_every=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.work_dir = tempfile.mkdtemp()
+        self.creds_file = os.path.join(self.work_dir, 'secret_creds.json')
+        with open(self.creds_file, 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        self.metrics = RunMetrics()
+        self.transport = XWikiTransport(self.creds_file, max_retries=2, backoff=0.01, breaker_threshold=100,
+                                        metrics=self.metrics)
+        self.page_url = (f"{self.server.base_url}/rest/wikis/xwiki/spaces/VB365/spaces/How-to/spaces/Article-0"
+                         f"/pages/WebHome")
+
+    def tearDown(self):
+        self.transport.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.work_dir)
+
+    def test_retries_run_out_with_a_transport_error(self):
+        self.server.error_rate = 1.0
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(TransportError) as raised:
+            self.transport.get(self.page_url, phase="metadata")
+        self.assertEqual(raised.exception.response.status_code, 503)
+        self.assertEqual(self.server.stats["statuses"], {"503": 3})
+        self.assertEqual(self.metrics.report()["phases"]["metadata"]["retries"], 2)
+        self.assertLess(self.transport.limiter.limit, 10)
+
+    def test_retried_request_recovers(self):
+        self.server.error_rate = 0.5
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(10):
+                try:
+                    response = self.transport.get(self.page_url, phase="metadata")
+                except TransportError:
+                    continue
+                self.assertEqual(response.status_code, 200)
+        statuses = self.server.stats["statuses"]
+        self.assertGreater(statuses.get("503", 0), 0)
+        self.assertEqual(self.metrics.report()["phases"]["metadata"]["retries"],
+                         statuses["503"] - (10 - statuses.get("200", 0)))
+
+    def test_missing_page_is_returned_without_retries(self):
+        response = self.transport.get(self.page_url.replace("Article-0", "Article-40"))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.server.stats["statuses"], {"404": 1})
+
+    def test_open_circuit_pauses_the_space(self):
+        self.transport.breaker = CircuitBreaker(failure_threshold=2, cooldown=0.3)
+        self.transport.max_retries = 1
+        self.server.error_rate = 1.0
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(TransportError):
+            self.transport.get(self.page_url)
+        self.server.error_rate = 0.0
+        started = time.monotonic()
+        self.assertEqual(self.transport.get(self.page_url).status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+
+class TestCrawlWithErrors(unittest.TestCase):
+    """A crawl of the mock server failing a share of the requests skips the failed pages instead of crashing"""
+
+    def setUp(self):
+        self.server = MockXWikiServer(port=0, articles=20, restricted_every=0, error_rate=0.35, seed=1)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cwd = os.getcwd()
+        self.work_dir = tempfile.mkdtemp()
+        os.chdir(self.work_dir)
+        os.makedirs('configs')
+        os.makedirs('outputs')
+        with open(os.path.join('configs', 'secret_creds.json'), 'w') as f:
+            json.dump({"bearer_token": "token"}, f)
+        with open(os.path.join('configs', 'api_secret.json'), 'w') as f:
+            json.dump(api_secret(self.server.base_url, {"metrics_report": None, "max_retries": 1,
+                                                        "breaker_cooldown": 0.05}), f)
+        self.fetcher = XWikiAPIFetcher()
+        self.fetcher.transport.backoff = 0.01
+
+    def tearDown(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.work_dir)
+
+    def test_failed_articles_are_skipped_and_reported(self):
+        space_urls = self.fetcher.space_urls()
+        stored = {}
+        for backend in ("rest", "query"):
+            with self.subTest(backend=backend):
+                self.fetcher.backend = backend
+                self.fetcher.metrics.reset()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    spaces_articles = self.fetcher.fetch_all_spaces(space_urls)
+                failures = self.fetcher.metrics.report()["failures"]
+                if backend == "rest":
+                    self.assertTrue(failures)
+                for space_url, articles in zip(space_urls, spaces_articles):
+                    space_failures = [failure for failure in failures
+                                      if failure["space"] == self.fetcher.transport.space_key(space_url)]
+                    if any(failure["url"] == space_url for failure in space_failures):
+                        # the listing of the space failed for good, it keeps the articles of the previous crawl
+                        self.assertEqual([article.page_url for article in articles], stored.get(space_url, []))
+                    else:
+                        self.assertEqual(len(articles) + len(space_failures), 20)
+                    stored[space_url] = [article.page_url for article in articles]
+
+    def test_space_whose_listing_fails_keeps_its_stored_articles(self):
+        self.server.error_rate = 0.0
+        with contextlib.redirect_stdout(io.StringIO()):
+            stored = self.fetcher.fetch_all_spaces([self.fetcher.how_to_children_pages_url])[0]
+            self.server.error_rate = 1.0
+            articles = self.fetcher.fetch_all_spaces([self.fetcher.how_to_children_pages_url])[0]
+        self.assertEqual([article.page_url for article in articles], [article.page_url for article in stored])
+        self.assertEqual([failure["phase"] for failure in self.fetcher.metrics.report()["failures"]], ["listing"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import re
+from collections import namedtuple
+
+# the path segments separating the space of an article from the article itself in its URL
+DEFAULT_SPACE_SPLITTERS = ("/How-to/", "/General-Knowledge/", "/How-to-configure-VBO365/", "/Patch-notes/")
+# problematic_units.json: articles whose URL holds these encoded characters cannot be fetched
+DEFAULT_RESTRICTED_SEQUENCES = ("%5B", "%3A", "%60")
+
+UrlClassification = namedtuple('UrlClassification', ['space', 'leaf', 'restricted'])
+UrlClassification.__doc__ = """
+The classification of an article URL: the space it is in (e.g. "How-to", None if no splitter matches),
+its leaf (the part after the space splitter, "" if no splitter matches) and the first restricted sequence
+of the leaf (None if there is none).
+"""
+
+
+class UrlClassifier:
+    def __init__(self, space_splitters=DEFAULT_SPACE_SPLITTERS, restricted_sequences=DEFAULT_RESTRICTED_SEQUENCES):
+        """
+        Classifies article URLs with two precompiled alternations, one of all the space splitters and one of all
+        the restricted sequences. The restricted sequences are searched from where the splitter match ends,
+        so a URL is scanned once whatever the number of spaces and sequences, and adding a space is a matter
+        of configuration. The leftmost splitter of a URL wins and restricted sequences are matched in the leaf
+        only, case-insensitively as percent-encoding is.
+
+        Args:
+            space_splitters (list): Path segments such as "/How-to/", the space of an article URL is the first
+                                    one found in it.
+            restricted_sequences (list): Encoded characters such as "%5B" marking an article URL as restricted.
+
+        Returns:
+            None
+        """
+        self.space_splitters = tuple(space_splitters)
+        self.restricted_sequences = tuple(restricted_sequences)
+        # longest first, so a splitter that is a prefix of another one does not shadow it at the same position
+        splitters = '|'.join(re.escape(splitter) for splitter in sorted(self.space_splitters, key=len, reverse=True))
+        restricted = '|'.join(re.escape(sequence) for sequence in self.restricted_sequences)
+        # (?!) never matches, for an empty list
+        self._splitter = re.compile(splitters or '(?!)')
+        self._restricted = re.compile(restricted or '(?!)', re.IGNORECASE)
+
+    @classmethod
+    def from_settings(cls, settings, space_names=()):
+        """
+        Creates the classifier of the "space_splitters" and "restricted_sequences" settings,
+        with a splitter added for every name of space_names, e.g. the spaces configured by URL.
+        """
+        splitters = list(settings.get("space_splitters", DEFAULT_SPACE_SPLITTERS))
+        splitters += [f"/{name}/" for name in space_names if f"/{name}/" not in splitters]
+        return cls(splitters, settings.get("restricted_sequences", DEFAULT_RESTRICTED_SEQUENCES))
+
+    def classify(self, page_url):
+        """Returns the UrlClassification of an article URL"""
+        splitter = self._splitter.search(page_url)
+        if splitter is None:
+            return UrlClassification(None, "", None)
+        restricted = self._restricted.search(page_url, splitter.end())
+        return UrlClassification(splitter.group().strip('/'), page_url[splitter.end():],
+                                 restricted.group() if restricted else None)
+
+    def is_restricted(self, page_url):
+        """Returns True if the leaf of an article URL holds a restricted sequence, the fast path of classify"""
+        splitter = self._splitter.search(page_url)
+        return splitter is not None and self._restricted.search(page_url, splitter.end()) is not None
+
+    def clear_page_url(self, page_url, article_url_leaf=None):
+        """
+        Returns page_url, or page_url marked with "xwiki-sup" if it is restricted, so that it is skipped
+        as a broken link. The leaf checked is the one of the classification, unless article_url_leaf is given.
+        """
+        if article_url_leaf is None:
+            restricted = self.is_restricted(page_url)
+        else:
+            restricted = self._restricted.search(article_url_leaf) is not None
+        if not restricted:
+            return page_url
+        print(f"Skipping {page_url} due to the restricted symbols in URL")
+        return page_url.replace("xwiki", "xwiki-sup")
+
+
+DEFAULT_CLASSIFIER = UrlClassifier()
@@ -1,6 +1,9 @@
-import os
+import calendar
+import time
 from datetime import datetime
-import json
+from functools import lru_cache
+
+from url_classifier import DEFAULT_CLASSIFIER
 
 
 def transform_datetime(datetime_str):
@@ -13,39 +16,41 @@ def transform_datetime(datetime_str):
     return transformed_datetime
 
 
+@lru_cache(maxsize=8192)
+def _day_to_epoch(date_str):
+    return calendar.timegm((int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]), 0, 0, 0))
+
+
+@lru_cache(maxsize=8192)
+def _epoch_day_to_date(day):
+    return time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+
+
+def xwiki_timestamp_to_epoch(datetime_str):
+    """
+    Converts an XWiki timestamp (2023-05-10T08:03:21Z) to integer epoch seconds.
+    The date part is converted once per day and memoized, the time part is plain slicing, so no strptime call
+    is made for well-formed timestamps.
+    """
+    if len(datetime_str) == 20 and datetime_str[10] == 'T' and datetime_str[19] == 'Z':
+        return (_day_to_epoch(datetime_str[:10]) + int(datetime_str[11:13]) * 3600
+                + int(datetime_str[14:16]) * 60 + int(datetime_str[17:19]))
+    return calendar.timegm(time.strptime(datetime_str, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def epoch_to_xwiki_timestamp(epoch):
+    """Converts integer epoch seconds back to an XWiki timestamp (2023-05-10T08:03:21Z)"""
+    day, seconds = divmod(epoch, 86400)
+    return f"{_epoch_day_to_date(day)}T{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}Z"
+
 
-def split_leaf(page_url, splitter):
-    if splitter in page_url:
-        base_url, article_url_leaf = page_url.split(splitter, 1)
-    return article_url_leaf
+def split_leaf(page_url, splitter=None):
+    """Returns the part of page_url after splitter, or after its space splitter if none is given, "" if absent"""
+    if splitter is None:
+        return DEFAULT_CLASSIFIER.classify(page_url).leaf
+    return page_url.split(splitter, 1)[1] if splitter in page_url else ""
 
 
 def return_clear_page_url(article_url_leaf, page_url):
-    clear_page_url = page_url
-    # problematic_units.json: article-with-%5B
-    if "%5B" in article_url_leaf:
-        print(f"Skipping {page_url} due to the restricted symbols in URL")
-        clear_page_url = page_url.replace("xwiki", "xwiki-sup")
-
-    # problematic_units.json: article-with-%3A
-    if "%3A" in article_url_leaf:
-        print(f"Skipping {page_url} due to the restricted symbols in URL")
-        clear_page_url = page_url.replace("xwiki", "xwiki-sup")
-
-    # problematic_units.json: article-with-%60
-    if "%60" in article_url_leaf:
-        print(f"Skipping {page_url} due to the restricted symbols in URL")
-        clear_page_url = page_url.replace("xwiki", "xwiki-sup")
-    return clear_page_url
-
-
-def get_value_from_secret_file_json(key):
-    cwd = os.getcwd()
-    secret_file = os.path.join(cwd, 'configs', 'secret_creds.json')
-    with open(secret_file, 'r') as json_file:
-        data = json.load(json_file)
-
-        if key in data:
-            return data[key]
-        else:
-            return None
+    """Returns page_url, marked with "xwiki-sup" if article_url_leaf is restricted, see UrlClassifier"""
+    return DEFAULT_CLASSIFIER.clear_page_url(page_url, article_url_leaf)
@@ -0,0 +1,354 @@
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_capture import CaptureMiss
+
+# statuses of an overloaded or restarting server, worth a retry after a pause
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class TransportError(requests.RequestException):
+    """
+    A GET request that failed for good: its retries ran out, or the server answered with an error status other
+    than 404 that is not worth a retry. The last response, if any, is the response attribute.
+    """
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial, ceiling=None, minimum=1, latency_tolerance=2.0):
+        """
+        AIMD concurrency limiter shared by all requests.
+        The limit grows by about one request per round trip while the recent latency stays within
+        latency_tolerance times the long-term latency, and is halved on errors or throttling.
+        Rising latency shrinks it gently. With ceiling equal to initial it behaves like a plain semaphore.
+
+        Args:
+            initial (int): The number of concurrent requests allowed at start.
+            ceiling (int): The max number of concurrent requests, defaults to initial.
+            minimum (int): The number of concurrent requests always allowed.
+            latency_tolerance (float): How much slower than the long-term latency the recent requests may be
+                                       and still count as healthy.
+
+        Returns:
+            None
+        """
+        self.limit = float(initial)
+        self.ceiling = max(ceiling or initial, initial)
+        self.minimum = min(minimum, initial)
+        self.latency_tolerance = latency_tolerance
+        # exponential moving averages of the latency over the last ~5 and ~100 requests
+        self.recent_latency = None
+        self.baseline_latency = None
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        """Grows the limit additively, or backs off slightly if latency is rising, after a healthy response"""
+        with self._condition:
+            if self.baseline_latency is None:
+                self.recent_latency = self.baseline_latency = latency
+            self.recent_latency += 0.2 * (latency - self.recent_latency)
+            self.baseline_latency += 0.01 * (latency - self.baseline_latency)
+            if self.recent_latency <= self.baseline_latency * self.latency_tolerance:
+                self.limit = min(self.ceiling, self.limit + 1.0 / self.limit)
+            else:
+                self._decrease(0.9)
+            self._condition.notify_all()
+
+    def on_overload(self):
+        """Halves the limit after an error, a timeout or a throttling response"""
+        with self._condition:
+            self._decrease(0.5)
+
+    def _decrease(self, factor):
+        # one decrease per round trip, the requests already in flight report the same congestion
+        now = time.monotonic()
+        if now - self._last_decrease < (self.recent_latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        """
+        Per-key circuit breaker. After failure_threshold consecutive failures the key is paused for cooldown
+        seconds, every request for it waits until then instead of hammering the server. After the pause a single
+        further failure opens the circuit again.
+
+        Args:
+            failure_threshold (int): The number of consecutive failures opening the circuit.
+            cooldown (float): How long, in seconds, an open circuit pauses the requests of its key.
+
+        Returns:
+            None
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._lock = threading.Lock()
+
+    def wait(self, key):
+        """Blocks while the circuit of key is open"""
+        while True:
+            with self._lock:
+                remaining = self._open_until.get(key, 0.0) - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def record_success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def record_failure(self, key):
+        with self._lock:
+            failures = self._failures.get(key, 0) + 1
+            self._failures[key] = failures
+            if failures >= self.failure_threshold:
+                self._open_until[key] = time.monotonic() + self.cooldown
+                # half-open: the next failure after the pause opens the circuit again
+                self._failures[key] = self.failure_threshold - 1
+                print(f"Too many failures for {key}, pausing its requests for {self.cooldown} seconds")
+
+
+class XWikiTransport:
+    def __init__(self, secret_creds_file, pool_size=10, cookie_file=None, max_in_flight=None,
+                 max_in_flight_ceiling=None, timeout=30, max_retries=3, backoff=0.5, max_backoff=30.0,
+                 breaker_threshold=5, breaker_cooldown=30.0, breaker_space_depth=2, capture=None,
+                 metrics=None):
+        """
+        Shared HTTP layer for all requests sent to XWiki.
+        Credentials are loaded once, connections are kept alive in a pool and the auth cookies handed out
+        by the server are reused across requests and, when cookie_file is given, across runs.
+        Concurrency adapts to the server health (see AdaptiveLimiter), GET requests are retried with jittered
+        exponential backoff and a space whose requests keep failing is paused (see CircuitBreaker).
+
+        Args:
+            secret_creds_file (str): Path to the JSON file holding auth data.
+            pool_size (int): Max number of keep-alive connections kept per host.
+            cookie_file (str): Optional path of the JSON file the session cookies are persisted to.
+            max_in_flight (int): Global budget of concurrent requests shared by every caller at start,
+                                 defaults to pool_size.
+            max_in_flight_ceiling (int): The budget may grow up to this value while the server is healthy,
+                                         defaults to max_in_flight, i.e. a fixed budget.
+            timeout (float): Per-request timeout in seconds.
+            max_retries (int): The number of retries of a failed GET request.
+            backoff (float): Base delay, in seconds, of the exponential backoff between retries.
+            max_backoff (float): Max delay, in seconds, between retries.
+            breaker_threshold (int): The number of consecutive failures pausing a space.
+            breaker_cooldown (float): How long, in seconds, a failing space is paused.
+            breaker_space_depth (int): The number of leading spaces of a REST URL identifying the space
+                                       a request belongs to, e.g. 2 for VB365.General-Knowledge.
+            capture (HttpCapture): Optional capture every response is recorded to or, in replay mode,
+                                   served from instead of the network.
+            metrics (RunMetrics): Optional instrumentation every request attempt is recorded to.
+
+        Returns:
+            None
+
+        Raises:
+            FileNotFoundError: If the secret_creds_file does not exist.
+        """
+        with open(secret_creds_file) as secret_file:
+            self.creds = json.load(secret_file)
+        self.cookie_file = cookie_file
+
+        self.session = requests.Session()
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._load_cookies()
+
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker_space_depth = breaker_space_depth
+        self.limiter = AdaptiveLimiter(max_in_flight or pool_size, max_in_flight_ceiling)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self.capture = capture
+        self.metrics = metrics
+
+    def get_secret(self, key):
+        """Returns the value stored under key in the secret creds file, or None if there is no such key."""
+        return self.creds.get(key)
+
+    def get(self, url, phase="request", **kwargs):
+        """
+        Sends an authenticated GET request over the pooled session.
+        Connection errors, timeouts and the statuses in RETRY_STATUSES are retried up to max_retries times.
+        Other 5xx statuses are not retried, but they back off the limiter and count against the space too.
+        Only successful and 404 responses are returned, callers check for 404 where a page may be missing.
+        A request missing from a replayed capture fails at once, without counting against the server health.
+
+        Args:
+            url (str): The URL to which the authenticated GET request should be sent
+            phase (str): The phase the request is recorded under in metrics, e.g. "metadata".
+            **kwargs: Any extra keyword arguments accepted by requests.Session.get
+
+        Returns:
+            response (Response): A Response object containing the server's response to the request
+
+        Raises:
+            TransportError: If the last attempt failed, without a response or with an error status other than 404.
+            CaptureMiss: If the request is not in the replayed capture.
+        """
+        space_key = self.space_key(url)
+        for attempt in range(self.max_retries + 1):
+            self.breaker.wait(space_key)
+            response = error = None
+            with self.limiter:
+                started = time.monotonic()
+                try:
+                    response = self._send('GET', url, data=self.creds, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+                latency = time.monotonic() - started
+            if self.metrics is not None:
+                self._observe(phase, space_key, latency, response, error, kwargs.get('stream'))
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                # a 500 is not worth a retry, it usually fails the same way again, but is as much a sign of overload
+                if response.status_code >= 500:
+                    self.limiter.on_overload()
+                    self.breaker.record_failure(space_key)
+                else:
+                    self.limiter.on_success(latency)
+                    self.breaker.record_success(space_key)
+                if response.ok or response.status_code == 404:
+                    return response
+                response.close()
+                raise TransportError(f"GET {url} failed with status {response.status_code}", response=response)
+
+            self.limiter.on_overload()
+            self.breaker.record_failure(space_key)
+            if attempt == self.max_retries:
+                if response is not None:
+                    response.close()
+                    raise TransportError(f"GET {url} failed with status {response.status_code} after "
+                                         f"{self.max_retries} retries", response=response)
+                raise TransportError(f"GET {url} failed after {self.max_retries} retries: {error}") from error
+            if self.metrics is not None:
+                self.metrics.observe_retry(phase, space_key)
+            delay = self._retry_delay(attempt, response)
+            print(f"Retrying {url} in {delay:.1f}s ({response.status_code if response is not None else error})")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    def put(self, url, phase="publish", **kwargs):
+        """
+        Sends a PUT request over the pooled session, the caller is responsible for the auth headers.
+        PUT requests are never replayed, a run replayed from a capture publishes nothing, see replaying.
+
+        Args:
+            url (str): The URL to which the PUT request should be sent
+            phase (str): The phase the request is recorded under in metrics.
+            **kwargs: Any extra keyword arguments accepted by requests.Session.put
+
+        Returns:
+            response (Response): A Response object containing the server's response to the request
+
+        Raises:
+            CaptureMiss: If replaying a capture.
+        """
+        if self.replaying:
+            raise CaptureMiss(f"PUT {url} is not sent while replaying the capture {self.capture.capture_file}")
+        with self.limiter:
+            started = time.monotonic()
+            try:
+                response = self._send('PUT', url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as e:
+                if self.metrics is not None:
+                    self._observe(phase, self.space_key(url), time.monotonic() - started, None, e)
+                raise
+        if self.metrics is not None:
+            self._observe(phase, self.space_key(url), time.monotonic() - started, response, None)
+        return response
+
+    def _observe(self, phase, space_key, latency, response, error, stream=False):
+        # the body of a streamed response is not read yet, its reader reports the bytes with observe_bytes
+        size = 0 if response is None or stream else len(response.content)
+        self.metrics.observe_request(phase, space_key, latency, size,
+                                     response.status_code if response is not None else type(error).__name__)
+
+    @property
+    def replaying(self):
+        """True if the responses are served from a capture rather than the network"""
+        return self.capture is not None and self.capture.mode == "replay"
+
+    def _send(self, method, url, **kwargs):
+        """Sends a request over the pooled session, or replays it from the capture"""
+        if self.replaying:
+            return self.capture.replay(method, url, kwargs.get('params'))
+        started = time.monotonic()
+        response = self.session.request(method, url, **kwargs)
+        if self.capture is not None:
+            self.capture.record(method, url, kwargs.get('params'), response, started)
+        return response
+
+    def _retry_delay(self, attempt, response):
+        """Returns the Retry-After delay of the response if any, a full-jitter exponential backoff otherwise"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def space_key(self, url):
+        """Returns the circuit breaker key of a REST URL: its wiki and its first breaker_space_depth spaces"""
+        segments = urlparse(url).path.split('/')
+        key = []
+        for i, segment in enumerate(segments[:-1]):
+            if segment == 'wikis' and not key:
+                key.append(segments[i + 1])
+            elif segment == 'spaces' and 0 < len(key) <= self.breaker_space_depth:
+                key.append(segments[i + 1])
+        return '/'.join(key) or urlparse(url).netloc
+
+    def _load_cookies(self):
+        """Restores the cookies saved by a previous run, so that the server does not have to log us in again"""
+        if self.cookie_file and os.path.exists(self.cookie_file):
+            try:
+                with open(self.cookie_file, 'r') as f:
+                    self.session.cookies.update(requests.utils.cookiejar_from_dict(json.load(f)))
+            except (OSError, ValueError):
+                print(f"Failed to load session cookies from {self.cookie_file}")
+
+    def save_cookies(self):
+        """Persists the current session cookies to cookie_file, unless replaying, as no server handed any out"""
+        if self.replaying:
+            return
+        if self.cookie_file:
+            with open(self.cookie_file, 'w') as f:
+                json.dump(requests.utils.dict_from_cookiejar(self.session.cookies), f)
+
+    def close(self):
+        """Saves the session cookies, releases all pooled connections and closes the capture"""
+        self.save_cookies()
+        self.session.close()
+        if self.capture is not None:
+            self.capture.close()